@@ -0,0 +1,222 @@
+"""
+Timings of the app's core functions on a generated ledger.
+
+Generates a ledger with generate_ledger.py (or reuses the one in
+--data-dir), then calls the functions the menus are built on, without
+prompting, for a fixed sample of users and months:
+
+    monthly_spending    main.calculate_monthly_spending
+    budget_alerts       main.update_budget_alerts (formerly check_budget_alerts)
+    read_budget         main.read_user_budget
+    write_budget        main.write_user_budget
+    read_goals          main.get_user_savings_goals
+    write_goals         main.write_user_savings_goals
+    export              main.export_expenses, a full export each time
+    login_lookup        main.username_exists and the stored-hash lookup of
+                        main.check_password (without the hash itself)
+    edit_expense        what main.edit_delete_expense does to edit a chosen
+                        expense: find it by id and update it
+    delete_expense      the same, deleting it
+
+Each runs --repeats times with a different user and month, the same ones
+for a given seed. "first_ms" is the first call, which pays for reading the
+files and building caches; mean, p50, p95 and max cover every call. The
+results are printed as JSON and written to --output; --compare prints the
+change in mean time from an earlier results file and exits with status 1
+if any function got slower by more than --tolerance percent.
+
+Writes change a few rows per run; a reused --data-dir keeps the caches
+built by earlier runs, so use a fresh one for cold-start numbers.
+
+    python benchmarks/core_functions.py --scale 100k --output before.json
+    python benchmarks/core_functions.py --scale 100k --compare before.json
+    python benchmarks/core_functions.py --scale 10m --data-dir /data/pf-10m --backend sqlite
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from generate_ledger import DEFAULT_SEED, MONTHS, SCALES, generate, read_manifest, username  # noqa: E402
+from personal_finance import main as app  # noqa: E402
+from personal_finance.models import format_amount, to_paise  # noqa: E402
+from personal_finance.store import expense_id  # noqa: E402
+
+DEFAULT_REPEATS = 20
+DEFAULT_TOLERANCE = 20.0
+
+
+def timed(call, targets, prepare=None):
+    """
+    Call call(*target) for each target, after prepare(*target) if given
+    (not timed), and summarize the times in milliseconds.
+    """
+    times = []
+    for target in targets:
+        args = prepare(*target) if prepare else target
+        if args is None:
+            continue
+        start = time.perf_counter()
+        call(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    if not times:
+        return {"calls": 0}
+    ordered = sorted(times)
+    return {
+        "calls": len(times),
+        "first_ms": round(times[0], 3),
+        "mean_ms": round(statistics.mean(times), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def pick_expense(user, month):
+    """
+    (user, month, key, row) of the first expense of the month, or None.
+    """
+    for key, row in app.get_store().month_expenses(user, month):
+        return user, month, key, row
+    return None
+
+
+def find_and_edit(user, month, key, row):
+    month, key, row = app.find_expense(user, expense_id(month, key))
+    new_row = list(row)
+    new_row[1] = format_amount(to_paise(row[1]) + 100)
+    app.get_store().update_expense(user, month, key, new_row, expected=row)
+
+
+def find_and_delete(user, month, key, row):
+    month, key, row = app.find_expense(user, expense_id(month, key))
+    app.get_store().delete_expense(user, month, key, expected=row)
+
+
+def fresh_export(user, month):
+    """
+    Drop an earlier export of the user's, so the next one is a full export.
+    """
+    path = app.get_file_path(f"exported_expenses_{user}.csv")
+    for stale in (path, path.with_name(path.name + ".watermark")):
+        with contextlib.suppress(FileNotFoundError):
+            stale.unlink()
+    return user, month
+
+
+def quiet_export(user, month):
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.export_expenses(user)
+
+
+def login_lookup(user, month):
+    app.username_exists(user)
+    app.get_store().password_hash(user)
+
+
+def write_goals(user, month):
+    goals = app.get_user_savings_goals(user)
+    for goal in goals:
+        goal.saved += 100
+    app.write_user_savings_goals(user, goals)
+
+
+def run(users, seed, repeats):
+    rng = random.Random(seed + 1)
+    targets = [(username(rng.randrange(users)), rng.choice(MONTHS)) for _ in range(repeats)]
+    return {
+        "monthly_spending": timed(app.calculate_monthly_spending, targets),
+        "budget_alerts": timed(lambda u, m: app.update_budget_alerts(u, [(f"{m}-15", None)]), targets),
+        "read_budget": timed(app.read_user_budget, targets),
+        "write_budget": timed(lambda u, m: app.write_user_budget(u, m, 4000000), targets),
+        "read_goals": timed(lambda u, m: app.get_user_savings_goals(u), targets),
+        "write_goals": timed(write_goals, targets),
+        "export": timed(quiet_export, targets, fresh_export),
+        "login_lookup": timed(login_lookup, targets),
+        "edit_expense": timed(find_and_edit, targets, pick_expense),
+        "delete_expense": timed(find_and_delete, targets, pick_expense),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change in mean time per function; True if any is slower by
+    more than tolerance percent.
+    """
+    slower = False
+    for name, now in results["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("mean_ms") or "mean_ms" not in now:
+            continue
+        change = (now["mean_ms"] - before["mean_ms"]) / before["mean_ms"] * 100
+        flag = ""
+        if change > tolerance:
+            flag = "  SLOWER"
+            slower = True
+        print(f"{name:<18} {before['mean_ms']:>10.3f} ms -> {now['mean_ms']:>10.3f} ms  {change:+7.1f}%{flag}",
+              file=sys.stderr)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="calls per function")
+    parser.add_argument("--data-dir", help="generated ledger to use, generated there if missing "
+                                           "(default: a fresh temp dir)")
+    parser.add_argument("--output", "-o", help="also write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"percent slower that counts as a regression (default: {DEFAULT_TOLERANCE:g})")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix=f"pf-bench-{args.scale}-"))
+    manifest = read_manifest(data_dir)
+    if manifest is None or (manifest["scale"], manifest["seed"]) != (args.scale, args.seed):
+        manifest = generate(data_dir, args.scale, args.seed)
+
+    os.environ["PERSONAL_FINANCE_BACKEND"] = args.backend
+    app.DATA_DIR = data_dir
+    setup = {}
+    if args.backend == "sqlite" and not (data_dir / "finance.db").exists():
+        from personal_finance.sqlite_store import import_csv
+
+        start = time.perf_counter()
+        import_csv(data_dir)
+        setup["sqlite_import_seconds"] = round(time.perf_counter() - start, 2)
+
+    results = {
+        "scale": args.scale,
+        "seed": args.seed,
+        "backend": args.backend,
+        "repeats": args.repeats,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "generated": manifest,
+        "setup": setup,
+        "results": run(manifest["users"], args.seed, args.repeats),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
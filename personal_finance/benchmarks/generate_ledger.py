@@ -0,0 +1,174 @@
+"""
+Deterministic synthetic ledger for the benchmarks.
+
+Writes a data folder the app reads as is: password.csv, userdata.csv,
+budget.csv, savings.csv and the expenses, which live in per-user, per-month
+files (expenses/<user>/<YYYY-MM>.csv) rather than the old shared
+expenses.csv. The same scale and seed always give the same files.
+
+    scale   users   expenses      months
+    1k         10       1,000     24 (2023-01 .. 2024-12)
+    100k      300     100,000
+    10m     3,000  10,000,000
+
+Every user has a monthly budget and a Food budget for each month and three
+savings goals. Passwords are old-style SHA-256 hashes of "pw<i>", so a
+lookup costs no key derivation. A manifest.json records what was written.
+
+    python benchmarks/generate_ledger.py --scale 100k --data-dir /tmp/pf-100k
+"""
+import argparse
+import csv
+import hashlib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from personal_finance.models import format_amount  # noqa: E402
+from personal_finance.store import (BUDGET_HEADER, PARTITION_HEADER, PASSWORD_HEADER,  # noqa: E402
+                                    SAVINGS_HEADER, USERDATA_HEADER)
+
+
+SCALES = {
+    "1k": {"users": 10, "expenses": 1000},
+    "100k": {"users": 300, "expenses": 100000},
+    "10m": {"users": 3000, "expenses": 10000000},
+}
+DEFAULT_SEED = 2024
+FIRST_YEAR = 2023
+MONTHS = [f"{FIRST_YEAR + m // 12}-{m % 12 + 1:02d}" for m in range(24)]
+MANIFEST = "manifest.json"
+
+# category -> (weight, descriptions, typical amount in rupees)
+CATEGORIES = {
+    "Food": (40, ["Swiggy", "Zomato", "Grocery", "Cafe", "Momo stall", "Bakery"], 300),
+    "Travel": (20, ["Uber", "Ola", "Metro card", "Fuel", "IRCTC"], 400),
+    "Shopping": (15, ["Amazon", "Flipkart", "Myntra", "Decathlon"], 1500),
+    "Bills": (15, ["Electricity", "Mobile recharge", "Broadband", "Rent"], 2000),
+    "Other": (10, ["Gift", "Donation", "Medicine", "Haircut"], 500),
+}
+MODES = ["UPI", "Card", "Cash"]
+GOALS = [("Emergency fund", 10000000), ("Laptop", 8000000), ("Trip", 5000000)]
+
+
+def username(i):
+    return f"user{i}"
+
+
+def _writer(path):
+    f = open(path, "w", newline="")
+    return f, csv.writer(f)
+
+
+def generate(data_dir, scale="1k", seed=DEFAULT_SEED, users=None, expenses=None):
+    """
+    Write the ledger into data_dir and return its manifest.
+    """
+    size = dict(SCALES[scale])
+    if users:
+        size["users"] = users
+    if expenses is not None:
+        size["expenses"] = expenses
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    names = list(CATEGORIES)
+    weights = [CATEGORIES[c][0] for c in names]
+    start = time.perf_counter()
+
+    f, writer = _writer(data_dir / "password.csv")
+    with f:
+        writer.writerow(PASSWORD_HEADER)
+        for i in range(size["users"]):
+            writer.writerow([username(i), hashlib.sha256(f"pw{i}".encode()).hexdigest()])
+
+    f, writer = _writer(data_dir / "userdata.csv")
+    with f:
+        writer.writerow(USERDATA_HEADER)
+        for i in range(size["users"]):
+            writer.writerow(["Bench", f"User{i}", str(18 + i % 60), f"user{i}@example.com", username(i)])
+
+    f, writer = _writer(data_dir / "budget.csv")
+    with f:
+        writer.writerow(BUDGET_HEADER)
+        for i in range(size["users"]):
+            for month in MONTHS:
+                writer.writerow([username(i), month, "", format_amount(rng.randrange(20000, 60000) * 100),
+                                 "no", "0.00", "0"])
+                writer.writerow([username(i), month, "Food", format_amount(rng.randrange(5000, 15000) * 100),
+                                 "no", "0.00", "0"])
+
+    f, writer = _writer(data_dir / "savings.csv")
+    with f:
+        writer.writerow(SAVINGS_HEADER)
+        for i in range(size["users"]):
+            for goal_id, (name, target) in enumerate(GOALS, start=1):
+                writer.writerow([username(i), str(goal_id), name, format_amount(target),
+                                 format_amount(rng.randrange(0, target // 100) * 100), "2023-01-01"])
+
+    per_user, extra = divmod(size["expenses"], size["users"])
+    files = 0
+    for i in range(size["users"]):
+        months = {}
+        for _ in range(per_user + (i < extra)):
+            category = rng.choices(names, weights)[0]
+            _, descriptions, typical = CATEGORIES[category]
+            amount = max(100, int(rng.expovariate(1 / typical) * 100))
+            day = rng.randrange(1, 29)
+            months.setdefault(rng.choice(MONTHS), []).append(
+                (day, format_amount(amount), category, rng.choice(descriptions), rng.choice(MODES)))
+        folder = data_dir / "expenses" / username(i)
+        folder.mkdir(parents=True, exist_ok=True)
+        for month, rows in months.items():
+            rows.sort(key=lambda row: row[0])
+            f, writer = _writer(folder / f"{month}.csv")
+            with f:
+                writer.writerow(PARTITION_HEADER)
+                writer.writerows([f"{month}-{day:02d}", amount, category, description, mode, str(n)]
+                                 for n, (day, amount, category, description, mode) in enumerate(rows, start=1))
+            files += 1
+
+    manifest = {
+        "scale": scale,
+        "seed": seed,
+        "users": size["users"],
+        "expenses": size["expenses"],
+        "months": [MONTHS[0], MONTHS[-1]],
+        "budgets": size["users"] * len(MONTHS) * 2,
+        "goals": size["users"] * len(GOALS),
+        "expense_files": files,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(data_dir / MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(data_dir):
+    """
+    The manifest of a generated folder, or None if there isn't one.
+    """
+    try:
+        with open(Path(data_dir) / MANIFEST) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--users", type=int, help="override the scale's user count")
+    parser.add_argument("--expenses", type=int, help="override the scale's expense count")
+    parser.add_argument("--data-dir", required=True, help="folder to write (created if missing)")
+    args = parser.parse_args()
+    print(json.dumps(generate(args.data_dir, args.scale, args.seed, args.users, args.expenses), indent=2))
+
+
+if __name__ == "__main__":
+    main()
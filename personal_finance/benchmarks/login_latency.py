@@ -0,0 +1,119 @@
+"""
+Login latency with many registered users, and what the password hash cost buys.
+
+Writes a password.csv with --users accounts, then measures:
+
+  - the first lookup in a fresh process (parsing password.csv and building
+    the username index) and the mean/p99 of later lookups
+  - a linear scan of the records, as logins did before the index
+  - for each KDF setting in --costs, the time one login spends hashing and
+    the logins per second one core can verify
+
+    python benchmarks/login_latency.py --users 1000000
+    python benchmarks/login_latency.py --users 10000 --costs scrypt:12,scrypt:14,pbkdf2_sha256:600000
+"""
+import argparse
+import csv
+import hashlib
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from personal_finance import passwords  # noqa: E402
+from personal_finance.store import PASSWORD_HEADER, LedgerStore  # noqa: E402
+
+
+DEFAULT_COSTS = "scrypt:10,scrypt:12,scrypt:14,scrypt:15,pbkdf2_sha256:100000,pbkdf2_sha256:600000"
+PASSWORD = "Bench#2024"
+
+
+def write_users(data_dir, users):
+    """
+    password.csv with users user0..userN-1, each with an old-style SHA-256 hash.
+    """
+    with open(Path(data_dir) / "password.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(PASSWORD_HEADER)
+        for i in range(users):
+            writer.writerow([f"user{i}", hashlib.sha256(f"pw{i}".encode()).hexdigest()])
+
+
+def lookups(data_dir, users, count):
+    store = LedgerStore(data_dir)
+    start = time.perf_counter()
+    store.password_hash("user0")
+    first = time.perf_counter() - start
+
+    names = [f"user{random.randrange(users)}" for _ in range(count)]
+    times = []
+    for name in names:
+        start = time.perf_counter()
+        store.password_hash(name)
+        times.append(time.perf_counter() - start)
+    times.sort()
+
+    # the old login: walk the records until the username matches
+    records = store.table("password.csv").records
+    scans = []
+    for name in names[:20]:
+        start = time.perf_counter()
+        next((r["password"] for r in records if r is not None and r["username"] == name), None)
+        scans.append(time.perf_counter() - start)
+
+    return {
+        "first_lookup_ms": round(first * 1000, 1),
+        "lookup_mean_us": round(statistics.mean(times) * 1e6, 2),
+        "lookup_p99_us": round(times[int(len(times) * 0.99)] * 1e6, 2),
+        "linear_scan_mean_ms": round(statistics.mean(scans) * 1000, 2),
+    }
+
+
+def kdf_costs(settings, rounds):
+    results = []
+    for setting in settings:
+        scheme, cost = setting.split(":")
+        if scheme == passwords.SCRYPT and not hasattr(hashlib, "scrypt"):
+            continue
+        stored = passwords.hash_password(PASSWORD, scheme, int(cost))
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            passwords.verify_password(PASSWORD, stored)
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        results.append({
+            "scheme": scheme,
+            "cost": int(cost),
+            "verify_ms": round(seconds * 1000, 1),
+            "logins_per_sec_per_core": round(1 / seconds, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--costs", default=DEFAULT_COSTS,
+                        help=f"comma-separated scheme:cost settings (default: {DEFAULT_COSTS})")
+    parser.add_argument("--rounds", type=int, default=5, help="verifications timed per setting")
+    parser.add_argument("--data-dir", help="directory to use (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="pf-login-")
+    start = time.perf_counter()
+    write_users(data_dir, args.users)
+    result = {"users": args.users, "write_seconds": round(time.perf_counter() - start, 2)}
+    result.update(lookups(data_dir, args.users, args.lookups))
+    result["kdf"] = kdf_costs([s for s in args.costs.split(",") if s], args.rounds)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
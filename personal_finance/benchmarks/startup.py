@@ -0,0 +1,113 @@
+"""
+Startup time of the personal-finance entry point on a generated ledger.
+
+Starts a fresh Python process per call and times it from launch to exit:
+
+    interpreter     python -c pass, for reference
+    menu            the interactive menu, choosing Exit at the first prompt
+    menu_data_dir   the same with --data-dir (which goes through the
+                    command parser)
+    summary         personal-finance summary --user <a user>
+
+"first_ms" is the first call after the ledger is generated, before the data
+files' headers have been checked and cached; mean, p50, p95 and max cover
+every call. Results are printed as JSON and written to --output, --compare
+works as in core_functions.py, and the exit status is 1 if the menu's
+first start takes more than --target-ms.
+
+    python benchmarks/startup.py --scale 100k --output startup.json
+    python benchmarks/startup.py --scale 10m --data-dir /data/pf-10m --compare startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from core_functions import compare, timed
+from generate_ledger import DEFAULT_SEED, SCALES, generate, read_manifest, username
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+ENTRY_POINT = "import sys; from personal_finance.main import main; sys.exit(main(sys.argv[1:]))"
+DEFAULT_REPEATS = 20
+DEFAULT_TARGET_MS = 50.0
+
+
+def start(argv, env, stdin=""):
+    """
+    Run a Python process with argv, feeding it stdin; SystemExit if it fails.
+    """
+    result = subprocess.run([sys.executable] + argv, input=stdin, env=env, text=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode:
+        raise SystemExit(f"{' '.join(argv)} failed: {result.stderr.strip()}")
+
+
+def run(data_dir, users, repeats):
+    # the menu reads ~/.personal_finance_data, so give it a home holding the ledger
+    home = Path(tempfile.mkdtemp(prefix="pf-home-"))
+    (home / ".personal_finance_data").symlink_to(Path(data_dir).resolve(), target_is_directory=True)
+    env = dict(os.environ, HOME=str(home), PYTHONPATH=str(SRC))
+    entry = ["-c", ENTRY_POINT]
+    targets = [()] * repeats
+    return {
+        "interpreter": timed(lambda: start(["-c", "pass"], env), targets),
+        "menu": timed(lambda: start(entry, env, "3\n"), targets),
+        "menu_data_dir": timed(lambda: start(entry + ["--data-dir", str(data_dir)], env, "3\n"), targets),
+        "summary": timed(lambda: start(entry + ["--data-dir", str(data_dir), "summary",
+                                                "--user", username(users // 2)], env), targets),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="100k")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="starts per command")
+    parser.add_argument("--data-dir", help="generated ledger to use, generated there if missing "
+                                           "(default: a fresh temp dir)")
+    parser.add_argument("--output", "-o", help="also write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="percent slower that counts as a regression (default: 20)")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help=f"longest acceptable first menu start (default: {DEFAULT_TARGET_MS:g})")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix=f"pf-startup-{args.scale}-"))
+    manifest = read_manifest(data_dir)
+    if manifest is None or (manifest["scale"], manifest["seed"]) != (args.scale, args.seed):
+        manifest = generate(data_dir, args.scale, args.seed)
+
+    results = {
+        "scale": args.scale,
+        "seed": args.seed,
+        "repeats": args.repeats,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "generated": manifest,
+        "target_ms": args.target_ms,
+        "results": run(data_dir, manifest["users"], args.repeats),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    failed = False
+    if args.compare:
+        with open(args.compare) as f:
+            failed = compare(results, json.load(f), args.tolerance)
+    first = results["results"]["menu"]["first_ms"]
+    if first > args.target_ms:
+        print(f"The menu took {first:.1f} ms to start, more than the {args.target_ms:g} ms target.",
+              file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
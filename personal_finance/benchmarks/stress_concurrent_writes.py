@@ -0,0 +1,105 @@
+"""
+Multi-process stress test for concurrent writers.
+
+Starts several processes against one data directory. Each one appends
+expenses, increments a shared savings goal through a read-modify-write and
+upserts a budget. At the end every append and every increment must be
+present; anything missing is a lost update.
+
+    python benchmarks/stress_concurrent_writes.py --procs 8 --ops 200
+    python benchmarks/stress_concurrent_writes.py --backend sqlite
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from personal_finance.models import Budget, SavingsGoal, amount_value  # noqa: E402
+from personal_finance.store import LedgerStore  # noqa: E402
+
+
+USER = "stress"
+MONTH = "2025-01"
+
+
+def open_store(backend, data_dir):
+    if backend == "sqlite":
+        from personal_finance.sqlite_store import SqliteStore
+        return SqliteStore(data_dir)
+    return LedgerStore(data_dir)
+
+
+def increment_goal(goals):
+    for g in goals:
+        if g.goal_id == 1:
+            g.saved += 100
+
+
+def worker(backend, data_dir, worker_id, ops, results):
+    store = open_store(backend, data_dir)
+    start = time.perf_counter()
+    for i in range(ops):
+        store.add_expense(USER, [f"{MONTH}-01", "1.00", "Stress", f"w{worker_id}-{i}", "UPI"])
+        store.modify_goals(USER, increment_goal, "2025-01-01")
+        store.put_budget(USER, Budget(MONTH, 100000 + worker_id * 100))
+    results.put((worker_id, time.perf_counter() - start))
+
+
+def run(backend, procs, ops, data_dir):
+    store = open_store(backend, data_dir)
+    store.put_goals(USER, [SavingsGoal(1, "Stress", 10 ** 11, 0, "2025-01-01")], "2025-01-01")
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(backend, data_dir, w, ops, results))
+               for w in range(procs)]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    per_worker = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    store = open_store(backend, data_dir)
+    expected = procs * ops
+    expenses = sum(1 for _ in store.iter_expenses(USER))
+    goal = store.goals(USER)[0].saved // 100
+    return {
+        "backend": backend,
+        "procs": procs,
+        "ops_per_proc": ops,
+        "writes": expected * 3,
+        "seconds": round(elapsed, 3),
+        "writes_per_sec": round(expected * 3 / elapsed, 1),
+        "expenses_expected": expected,
+        "expenses_found": expenses,
+        "monthly_total": amount_value(store.monthly_total(USER, MONTH)),
+        "slowest_proc_seconds": round(max(t for _, t in per_worker), 3),
+        "goal_increments_expected": expected,
+        "goal_increments_found": goal,
+        "lost_updates": (expected - expenses) + (expected - goal),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("--data-dir", help="directory to use (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="pf-stress-")
+    result = run(args.backend, args.procs, args.ops, data_dir)
+    print(json.dumps(result, indent=2))
+    if result["lost_updates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Budget alerts.
+
+An alert is shown once for each threshold, in percent of a budget's
+available amount (its own plus any carried over), that the period's
+spending crosses; the budget's `alerted` field remembers the highest
+threshold shown. The thresholds default to 50, 80 and 100 and are set with
+"alert_thresholds" in config.json (a list, or "50,80,100,120") or
+PERSONAL_FINANCE_ALERT_THRESHOLDS. Which budgets an expense counts against,
+and what was spent against them, comes from budgets.BudgetEngine.
+
+The interactive session doesn't check budgets while the user waits: adding
+an expense hands (username, date, category) to an AlertWorker thread, which
+waits a moment for more events, checks each budget they touch once with its
+own store, and keeps the messages until the menu asks for them.
+"""
+import queue
+import threading
+import time
+
+from personal_finance.budgets import BudgetEngine, budget_scope
+
+DEFAULT_THRESHOLDS = (50, 80, 100)
+
+# How long the worker collects events after the first one before checking them.
+COALESCE_SECONDS = 0.05
+
+
+def parse_thresholds(value):
+    """
+    Sorted distinct percentages from a list or a comma-separated string;
+    ValueError unless they are all positive whole numbers.
+    """
+    if isinstance(value, str):
+        value = [v for v in value.replace(" ", "").split(",") if v]
+    thresholds = sorted({int(v) for v in value})
+    if not thresholds or thresholds[0] <= 0:
+        raise ValueError("alert thresholds must be positive percentages")
+    return tuple(thresholds)
+
+
+def alert_message(percent, budget):
+    scope = budget_scope(budget)
+    if percent == 100:
+        return f"You have EXCEEDED your {scope}!"
+    if percent > 100:
+        return f"You have spent {percent}% of your {scope}!"
+    return f"You have crossed {percent}% of your {scope}!"
+
+
+def crossed(budget, spent, thresholds):
+    """
+    Thresholds that spent (paise) has reached and that weren't alerted yet.
+    A budget with nothing available, after an overspend was carried over,
+    is exceeded by any spending.
+    """
+    available = budget.available
+    if available <= 0:
+        return [p for p in thresholds if p > budget.alerted and p >= 100] if spent > 0 else []
+    # compared in integers: spent / available >= percent / 100
+    return [p for p in thresholds if p > budget.alerted and spent * 100 >= available * p]
+
+
+def check_budgets(store, username, changes, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Record the thresholds newly crossed by the user's budgets that the
+    changes, (date, category) pairs, count against and return the alert
+    messages for them. A category of None stands for every budget in effect
+    on the date.
+    """
+    engine = BudgetEngine(store)
+    budgets = {}
+    for day, category in changes:
+        try:
+            found = engine.in_effect(username, day) if category is None else engine.affected(username, day, category)
+        except ValueError:  # an undated expense counts against no budget
+            continue
+        for budget in found:
+            budgets.setdefault((budget.period, budget.category), budget)
+    messages = []
+    for budget in budgets.values():
+        percents = crossed(budget, engine.spent(username, budget), thresholds)
+        # another session may have shown them first; then it says nothing here
+        if percents and engine.mark_alerted(username, budget, percents[-1]):
+            messages.extend(alert_message(p, budget) for p in percents)
+    return messages
+
+
+class AlertWorker:
+    """
+    Background thread that checks budgets for queued (username, date,
+    category) events. open_store() is called on the thread to get a store of its own,
+    since stores aren't shared between threads.
+    """
+
+    def __init__(self, open_store, thresholds=DEFAULT_THRESHOLDS):
+        self.open_store = open_store
+        self.thresholds = thresholds
+        self.events = queue.Queue()
+        self.messages = queue.Queue()
+        self.evaluations = 0
+        self.thread = threading.Thread(target=self._run, name="budget-alerts", daemon=True)
+        self.thread.start()
+
+    def notify(self, username, date, category=None):
+        self.events.put((username, date, category))
+
+    def take_messages(self):
+        """
+        The alert messages produced since the last call.
+        """
+        taken = []
+        while True:
+            try:
+                taken.append(self.messages.get_nowait())
+            except queue.Empty:
+                return taken
+
+    def flush(self):
+        """
+        Wait until every queued event has been checked.
+        """
+        self.events.join()
+
+    def stop(self):
+        self.flush()
+        self.events.put(None)
+        self.thread.join()
+
+    def _run(self):
+        store = None
+        while True:
+            event = self.events.get()
+            if event is None:
+                self.events.task_done()
+                return
+            batch = [event]
+            stop = False
+            deadline = time.monotonic() + COALESCE_SECONDS
+            try:
+                while True:
+                    more = self.events.get(timeout=max(0, deadline - time.monotonic()))
+                    if more is None:
+                        stop = True
+                        break
+                    batch.append(more)
+            except queue.Empty:
+                pass
+            try:
+                if store is None:
+                    store = self.open_store()
+                changes = {}
+                for username, date, category in dict.fromkeys(batch):
+                    changes.setdefault(username, []).append((date, category))
+                for username, user_changes in changes.items():
+                    self.evaluations += 1
+                    for message in check_budgets(store, username, user_changes, self.thresholds):
+                        self.messages.put(message)
+            except Exception as e:  # a failed check must not take the thread down
+                self.messages.put(f"Could not check budget alerts: {e}")
+            finally:
+                for _ in range(len(batch) + stop):
+                    self.events.task_done()
+            if stop:
+                return
@@ -0,0 +1,280 @@
+"""
+Budget periods and the engine that evaluates budgets against spending.
+
+A budget covers one period, for all spending or (with a category) for one
+category:
+
+    2024-W07    ISO week
+    2024-05     month
+    2024-Q2     quarter
+    2024        year
+
+The engine doesn't total expenses itself. The store's spending index keeps
+per-month and per-day totals that every expense write updates in place, so
+a budget's spending is a sum of at most a year's month totals or a month's
+day totals, however many expenses there are. A new expense only concerns the
+budgets whose period contains its date, for all spending or its category:
+at most two per period kind, found by key, so checking it costs the same
+with dozens of budgets as with one.
+
+A rollover budget carries what is left of it (or the overspend) into the
+next period of the same kind. When a period has no budget of its own, the
+engine looks back for a rollover budget and repeats it, with the carry,
+in each period up to the one asked for. That is worked out on every read
+and writes nothing, so the carry follows later changes to the periods
+before it until the period's budget is stored: by set_budget, when an alert
+for it is recorded (mark_alerted) or by the month-end job. From then on it
+is fixed.
+"""
+import re
+from datetime import date, timedelta
+
+from personal_finance.models import Budget, amount_value
+
+PERIOD_KINDS = ("week", "month", "quarter", "year")
+PERIOD_LABELS = {"week": "weekly", "month": "monthly", "quarter": "quarterly", "year": "yearly"}
+_PATTERNS = {
+    "week": re.compile(r"^(\d{4})-W(\d{2})$"),
+    "month": re.compile(r"^(\d{4})-(\d{2})$"),
+    "quarter": re.compile(r"^(\d{4})-Q([1-4])$"),
+    "year": re.compile(r"^(\d{4})$"),
+}
+
+# How many periods back the engine looks for a rollover budget to continue.
+MAX_ROLLOVER_GAP = 12
+
+
+def period_kind(period):
+    """
+    The kind of a period key; ValueError if it isn't one.
+    """
+    for kind, pattern in _PATTERNS.items():
+        if pattern.match(period):
+            try:
+                period_range(period, kind)
+            except ValueError:
+                break
+            return kind
+    raise ValueError(f"'{period}' is not a budget period (like 2024-W07, 2024-05, 2024-Q2 or 2024)")
+
+
+def period_for(day, kind):
+    """
+    The period of the given kind containing day (a date or YYYY-MM-DD).
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    if kind == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    if kind == "month":
+        return f"{day.year:04d}-{day.month:02d}"
+    if kind == "quarter":
+        return f"{day.year:04d}-Q{(day.month - 1) // 3 + 1}"
+    if kind == "year":
+        return f"{day.year:04d}"
+    raise ValueError(f"unknown period kind '{kind}' (use {', '.join(PERIOD_KINDS)})")
+
+
+def period_range(period, kind=None):
+    """
+    (first, last) YYYY-MM-DD dates of a period, both inclusive.
+    """
+    kind = kind or period_kind(period)
+    numbers = [int(n) for n in _PATTERNS[kind].match(period).groups()]
+    if kind == "week":
+        first = _iso_monday(numbers[0], numbers[1])
+        last = first + timedelta(days=6)
+    else:
+        year = numbers[0]
+        if kind == "month":
+            first_month, months = numbers[1], 1
+        elif kind == "quarter":
+            first_month, months = numbers[1] * 3 - 2, 3
+        else:
+            first_month, months = 1, 12
+        first = date(year, first_month, 1)
+        end_month = first_month + months
+        last = date(year + (end_month - 1) // 12, (end_month - 1) % 12 + 1, 1) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+
+def _iso_monday(year, week):
+    """
+    The Monday of an ISO week (date.fromisocalendar(year, week, 1), which
+    Python 3.7 lacks); ValueError if the year has no such week.
+    """
+    jan4 = date(year, 1, 4)
+    monday = jan4 - timedelta(days=jan4.isoweekday() - 1) + timedelta(weeks=week - 1)
+    if week < 1 or monday.isocalendar()[:2] != (year, week):
+        raise ValueError(f"{year} has no ISO week {week}")
+    return monday
+
+
+def previous_period(period):
+    kind = period_kind(period)
+    first, _ = period_range(period, kind)
+    return period_for(date.fromisoformat(first) - timedelta(days=1), kind)
+
+
+def next_period(period):
+    kind = period_kind(period)
+    _, last = period_range(period, kind)
+    return period_for(date.fromisoformat(last) + timedelta(days=1), kind)
+
+
+def budget_scope(budget):
+    """
+    How alerts name a budget: "monthly budget", "weekly Food budget", ...
+    """
+    label = PERIOD_LABELS[period_kind(budget.period)]
+    return f"{label} {budget.category} budget" if budget.category else f"{label} budget"
+
+
+class BudgetEngine:
+    """
+    Evaluates a user's budgets against the store's running spending totals.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def spent(self, username, budget):
+        """
+        Spending in paise that counts against budget.
+        """
+        first, last = period_range(budget.period)
+        return self.store.spending_between(username, first, last, budget.category or None)
+
+    def budget(self, username, period, category=""):
+        """
+        The user's Budget for period and category, continuing an earlier
+        rollover budget if the period has none of its own; None if neither.
+        """
+        found = self.store.budget(username, period, category)
+        if found is not None:
+            return found
+        earlier = period
+        for _ in range(MAX_ROLLOVER_GAP):
+            earlier = previous_period(earlier)
+            found = self.store.budget(username, earlier, category)
+            if found is not None:
+                return self._roll_forward(username, found, period) if found.rollover else None
+        return None
+
+    def period_budgets(self, username, period, by_period=None):
+        """
+        Every Budget the user has for period, rolled-over ones included: the
+        one for all spending first, then one per category. by_period is
+        store.user_budgets(username) if the caller already has it.
+        """
+        if by_period is None:
+            by_period = self.store.user_budgets(username)
+        found = {b.category: b for b in by_period.get(period, [])}
+        seen = set(found)
+        earlier = period
+        for _ in range(MAX_ROLLOVER_GAP):
+            earlier = previous_period(earlier)
+            for budget in by_period.get(earlier, []):
+                if budget.category in seen:
+                    continue
+                seen.add(budget.category)
+                if budget.rollover:
+                    found[budget.category] = self._roll_forward(username, budget, period)
+        return sorted(found.values(), key=lambda b: (b.category != "", b.category))
+
+    def affected(self, username, day, category):
+        """
+        The budgets an expense on day (YYYY-MM-DD) in category counts
+        against: per period kind, the one for all spending and the one for
+        category.
+        """
+        found = []
+        for kind in PERIOD_KINDS:
+            period = period_for(day, kind)
+            for cat in dict.fromkeys(("", category or "")):
+                budget = self.budget(username, period, cat)
+                if budget is not None:
+                    found.append(budget)
+        return found
+
+    def in_effect(self, username, day):
+        """
+        Every budget whose period contains day, weekly ones first.
+        """
+        by_period = self.store.user_budgets(username)
+        found = []
+        for kind in PERIOD_KINDS:
+            found.extend(self.period_budgets(username, period_for(day, kind), by_period))
+        return found
+
+    def carry(self, username, budget):
+        """
+        What budget passes on to the next period: the part of it left unspent,
+        negative if it was overspent.
+        """
+        return budget.available - self.spent(username, budget)
+
+    def set_budget(self, username, period, amount, category="", rollover=False):
+        """
+        Write the user's budget for period, carrying over from the period
+        before it if that one rolls over; returns the Budget.
+        """
+        carried = 0
+        before = self.budget(username, previous_period(period), category)
+        if before is not None and before.rollover:
+            carried = self.carry(username, before)
+        budget = Budget(period, amount, category, 0, rollover, carried)
+        self.store.put_budget(username, budget)
+        return budget
+
+    def mark_alerted(self, username, budget, alerted):
+        """
+        store.mark_alerted() for a budget from this engine. A rolled-over
+        budget that isn't stored yet is stored with alerted, fixing its
+        carry. Returns whether it was recorded.
+        """
+        if self.store.budget(username, budget.period, budget.category) is None:
+            stored = Budget(budget.period, budget.amount, budget.category, alerted, budget.rollover, budget.carried)
+            if self.store.put_budget(username, stored, replace=False):
+                return True
+        return self.store.mark_alerted(username, budget, alerted)
+
+    def store_budget(self, username, period, category=""):
+        """
+        Store the user's budget for period if it is only rolled over from an
+        earlier one, fixing its carry; returns the Budget, or None if there
+        is none.
+        """
+        stored = self.store.budget(username, period, category)
+        if stored is not None:
+            return stored
+        budget = self.budget(username, period, category)
+        # another session may have stored it meanwhile; then keep theirs
+        if budget is not None and not self.store.put_budget(username, budget, replace=False):
+            budget = self.store.budget(username, period, category)
+        return budget
+
+    def status(self, username, budget):
+        """
+        A record of budget with what was spent against it and what is left.
+        """
+        spent = self.spent(username, budget)
+        record = budget.to_record()
+        record.update(
+            kind=period_kind(budget.period),
+            available=amount_value(budget.available),
+            spent=amount_value(spent),
+            remaining=amount_value(budget.available - spent),
+        )
+        return record
+
+    def _roll_forward(self, username, budget, period):
+        """
+        Repeat a rollover budget in each period after it up to period and
+        return the one for period, without storing any of them.
+        """
+        while budget.period != period:
+            budget = Budget(next_period(budget.period), budget.amount, budget.category, 0, True,
+                            self.carry(username, budget))
+        return budget
@@ -0,0 +1,281 @@
+"""
+Automatic expense categories.
+
+An expense entered or imported without a category gets one from its
+description, payment mode and amount:
+
+1. The user's category rules (models.CategoryRule, kept in
+   category_rules.csv or the database's category_rules table), oldest
+   first. A rule's pattern is one or more words that have to appear in that
+   order in the description; a word ending in * also matches longer words
+   it starts ("amazon*" matches "amazonpay"). A rule can also require a
+   payment mode and an amount range.
+2. Otherwise, with "auto_category" set to "learn" (the default; "rules"
+   leaves it out, "off" turns all of this off), a naive Bayes classifier
+   learned from the categories the user gave their own recent expenses
+   (CategoryModel), if it is sure enough.
+
+Descriptions are compared as their lower-case words without accents
+(termindex.words). All the rules are compiled into one regular expression,
+so a description is scanned once however many rules there are. What only
+depends on the description, which rules' words it contains and the
+classifier's guess for each mode and amount band, is worked out once per
+distinct description and remembered. The classifier leaves out words with
+digits in them, which are mostly order and reference numbers, so "SWIGGY
+81734" and "SWIGGY 90211" share a guess: a statement repeats the same few
+thousand merchants, and a large import pays for each of them once.
+"""
+import math
+import re
+from collections import Counter
+
+from personal_finance.termindex import words
+
+AUTO_OFF = "off"
+AUTO_RULES = "rules"
+AUTO_LEARN = "learn"
+AUTO_CATEGORY_MODES = (AUTO_OFF, AUTO_RULES, AUTO_LEARN)
+# newest expenses the classifier learns from, taking whole months
+MAX_TRAINING_ROWS = 100000
+# categorized expenses it needs before it guesses at all
+MIN_TRAINING_ROWS = 20
+# the least probability it has to give a category to suggest it
+MIN_CONFIDENCE = 0.6
+# distinct descriptions remembered before the memo starts over
+MEMO_SIZE = 100000
+SOURCE_HISTORY = "history"
+NO_SUGGESTION = (None, None)
+_DIGIT_RE = re.compile(r"\d")
+
+
+def normalize(description):
+    """
+    A description as its words separated by single spaces.
+    """
+    return " ".join(words(description))
+
+
+def model_words(text):
+    """
+    The words of a normalized description the classifier looks at.
+    """
+    return {w for w in text.split(" ") if w and not _DIGIT_RE.search(w)}
+
+
+def pattern_source(pattern):
+    """
+    The regular expression for a rule's pattern, to search normalized
+    descriptions with; ValueError if the pattern has no words.
+    """
+    parts = []
+    for token in pattern.split():
+        found = words(token)
+        if found:
+            parts.append(" ".join(map(re.escape, found)) + ("[^ ]*" if token.endswith("*") else ""))
+    if not parts:
+        raise ValueError(f"'{pattern}' has no words to match")
+    return " ".join(parts)
+
+
+def check_rule(rule):
+    """
+    ValueError unless rule has a pattern with words, a category and a
+    sensible amount range.
+    """
+    pattern_source(rule.pattern)
+    if not rule.category.strip():
+        raise ValueError("a rule needs a category")
+    if rule.min_amount is not None and rule.max_amount is not None and rule.min_amount > rule.max_amount:
+        raise ValueError("the smallest amount is more than the largest")
+
+
+def amount_band(paise):
+    """
+    Which power-of-two band of rupees an amount falls in.
+    """
+    return (abs(paise) // 100).bit_length()
+
+
+class RuleMatcher:
+    """
+    Rules compiled into one expression that finds, at every word of a
+    description, the oldest rule whose pattern starts there. Rules whose
+    pattern has no words (edited by hand) are left out.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        sources = []
+        for rule in rules:
+            try:
+                sources.append(pattern_source(rule.pattern))
+            except ValueError:
+                continue
+            self.rules.append(rule)
+        # each rule on its own, for the rules hidden behind an older one at the same word
+        self._each = [re.compile(f"(?:{source})(?![^ ])") for source in sources]
+        self._any = None
+        if sources:
+            groups = "|".join(f"(?P<r{i}>{source})" for i, source in enumerate(sources))
+            self._any = re.compile(f"(?<![^ ])(?=(?:{groups})(?![^ ]))")
+
+    def matching(self, text):
+        """
+        The rules whose patterns a normalized description contains, oldest first.
+        """
+        if self._any is None:
+            return ()
+        found = set()
+        for match in self._any.finditer(text):
+            first = int(match.lastgroup[1:])
+            found.add(first)
+            start = match.start()
+            found.update(i for i in range(first + 1, len(self._each))
+                         if i not in found and self._each[i].match(text, start))
+        return tuple(self.rules[i] for i in sorted(found))
+
+
+class CategoryModel:
+    """
+    Naive Bayes over a description's words, the payment mode and the amount
+    band, from counts of the user's categorized expenses. Build with
+    CategoryModel.train().
+    """
+
+    def __init__(self):
+        self.categories = []
+        self._codes = {}
+        self.rows = []
+        self.word_totals = []
+        # feature -> [count for each category]
+        self.words = {}
+        self.modes = {}
+        self.bands = {}
+
+    def __len__(self):
+        return sum(self.rows)
+
+    @classmethod
+    def train(cls, store, username, limit=MAX_TRAINING_ROWS):
+        """
+        Learn from the user's newest months, up to about limit expenses.
+        """
+        model = cls()
+        seen = 0
+        descriptions = {}
+        for month in reversed(store.expense_months(username)):
+            if seen >= limit:
+                break
+            columns = store.expense_columns(username, month)
+            seen += len(columns)
+            counts = Counter(zip(columns.descriptions, columns.categories, columns.modes,
+                                 map(amount_band, columns.amounts)))
+            for (description, category, mode, band), n in counts.items():
+                text = columns.description_names[description]
+                found = descriptions.get(text)
+                if found is None:
+                    found = descriptions[text] = model_words(normalize(text))
+                model.add(found, columns.category_names[category], columns.mode_names[mode], band, n)
+        return model
+
+    def add(self, description_words, category, payment_mode, band, n=1):
+        """
+        Count n expenses of category with these words, mode and band.
+        """
+        category = category.strip()
+        if not category:
+            return
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self.categories)
+            self.categories.append(category)
+            self.rows.append(0)
+            self.word_totals.append(0)
+            for table in (self.words, self.modes, self.bands):
+                for counts in table.values():
+                    counts.append(0)
+        self.rows[code] += n
+        self.word_totals[code] += n * len(description_words)
+        for table, features in ((self.words, description_words), (self.modes, (payment_mode.strip().lower(),)),
+                                (self.bands, (band,))):
+            for feature in features:
+                counts = table.get(feature)
+                if counts is None:
+                    counts = table[feature] = [0] * len(self.categories)
+                counts[code] += n
+
+    def guess(self, description_words, payment_mode, band):
+        """
+        The most likely category and its probability, or (None, 0.0) if
+        none of the words has been seen before.
+        """
+        known = [self.words[w] for w in description_words if w in self.words]
+        if not known or not self.categories:
+            return None, 0.0
+        total = len(self)
+        vocabulary = len(self.words)
+        scores = []
+        mode_counts = self.modes.get(payment_mode.strip().lower())
+        band_counts = self.bands.get(band)
+        for code, rows in enumerate(self.rows):
+            score = math.log(rows / total)
+            denominator = self.word_totals[code] + vocabulary
+            for counts in known:
+                score += math.log((counts[code] + 1) / denominator)
+            for table, counts in ((self.modes, mode_counts), (self.bands, band_counts)):
+                score += math.log(((counts[code] if counts else 0) + 1) / (rows + len(table) + 1))
+            scores.append(score)
+        best = max(range(len(scores)), key=scores.__getitem__)
+        top = scores[best]
+        return self.categories[best], 1 / sum(math.exp(s - top) for s in scores)
+
+
+class Categorizer:
+    """
+    Suggests categories from a user's rules and, optionally, a CategoryModel.
+    """
+
+    def __init__(self, rules=(), model=None):
+        self.matcher = RuleMatcher(rules)
+        self.model = model if model is not None and len(model) >= MIN_TRAINING_ROWS else None
+        self._descriptions = {}
+        self._guesses = {}
+
+    @classmethod
+    def load(cls, store, username, learn=True):
+        return cls(store.category_rules(username), CategoryModel.train(store, username) if learn else None)
+
+    def suggest(self, description, payment_mode="", amount=0):
+        """
+        (category, source) for an expense, amount in paise: source is the id
+        of the rule that gave it or "history"; (None, None) if nothing does.
+        """
+        found = self._descriptions.get(description)
+        if found is None:
+            if len(self._descriptions) >= MEMO_SIZE:
+                self._descriptions.clear()
+                self._guesses.clear()
+            text = normalize(description)
+            found = self._descriptions[description] = (
+                self.matcher.matching(text),
+                " ".join(sorted(model_words(text))) if self.model is not None else "")
+        rules, text = found
+        for rule in rules:
+            if rule.allows(payment_mode, amount):
+                return rule.category, rule.rule_id
+        if not text:
+            return NO_SUGGESTION
+        # amount_band(), inline: this runs for every row of an import
+        key = (text, payment_mode, (abs(amount) // 100).bit_length())
+        found = self._guesses.get(key)
+        if found is None:
+            category, confidence = self.model.guess(text.split(" "), payment_mode, key[2])
+            found = self._guesses[key] = (category, SOURCE_HISTORY) if confidence >= MIN_CONFIDENCE \
+                else NO_SUGGESTION
+        return found
+
+    def category(self, description, payment_mode="", amount=0):
+        """
+        The suggested category, or None.
+        """
+        return self.suggest(description, payment_mode, amount)[0]
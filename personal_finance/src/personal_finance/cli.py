@@ -0,0 +1,758 @@
+"""
+Non-interactive commands for the personal-finance entry point.
+
+Running personal-finance with no arguments starts the interactive menus;
+any arguments are handled here. Commands never prompt: data goes to stdout
+as JSON (default) or CSV, and budget alerts and errors go to stderr, so the
+output can be piped straight into other tools.
+
+    personal-finance add-expense --user alice --amount 250 --category Food --mode UPI
+    personal-finance list --user alice --month 2024-05 --format csv
+    personal-finance delete-expense --user alice --id 2024-05/17
+    personal-finance summary --user alice
+    personal-finance search --user alice metro card --from 2024-01-01
+    personal-finance report --user alice --from 2022-01 --by month,payment_mode
+    personal-finance budget set --user alice --amount 20000
+    personal-finance budget set --user alice --category Food --amount 6000
+    personal-finance budget set --user alice --period week --amount 2500 --rollover
+    personal-finance goal add --user alice --name Laptop --target 60000
+    personal-finance export --user alice --output alice.csv
+    personal-finance export --user alice --format jsonl --output alice.jsonl.gz --incremental
+    personal-finance recurring add --user alice --amount 15000 --category Bills --description Rent --schedule monthly:1
+    personal-finance run-due
+    personal-finance category-rule add --user alice --match "swiggy*" --category Food
+    personal-finance categorize --user alice --description "UBER TRIP 4411" --mode Card
+    personal-finance provision team.csv --workers 8
+    personal-finance month-end --month 2024-05 --output month_end/
+    personal-finance --profile summary --user alice
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from personal_finance import main as app
+from personal_finance import profiling
+from personal_finance.budgets import PERIOD_KINDS, period_for, period_kind
+from personal_finance.models import Expense, amount_value, format_amount, to_paise
+from personal_finance.store import EXPENSE_HEADER, ConcurrentUpdateError, expense_id, split_expense_id
+
+EXPENSE_FIELDS = ["id"] + EXPENSE_HEADER
+SEARCH_FIELDS = EXPENSE_FIELDS + ["score"]
+SUMMARY_FIELDS = ["month", "spent", "budget", "remaining"]
+BUDGET_FIELDS = ["period", "category", "budget_amount", "rollover", "carried", "alerted"]
+BUDGET_STATUS_FIELDS = ["period", "kind", "category", "budget_amount", "rollover", "carried",
+                        "available", "spent", "remaining", "alerted"]
+GOAL_FIELDS = ["goal_id", "goal_name", "target_amount", "current_amount", "created_on"]
+RULE_FIELDS = ["rule_id", "amount", "category", "description", "payment_mode", "schedule",
+               "start", "end", "last_posted"]
+RUN_DUE_FIELDS = ["date", "rules", "expenses", "users", "months"]
+CATEGORY_RULE_FIELDS = ["rule_id", "pattern", "category", "payment_mode", "min_amount", "max_amount"]
+CATEGORIZE_FIELDS = ["description", "payment_mode", "amount", "category", "source"]
+MIGRATE_FIELDS = ["user", "expenses"]
+IMPORT_FIELDS = ["read", "imported", "duplicates", "skipped", "categorized", "dry_run"]
+PROVISION_FIELDS = ["read", "created", "rejected", "raced", "dry_run"]
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a YYYY-MM-DD date")
+
+
+def _month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a YYYY-MM month")
+
+
+def _period(value):
+    """
+    A budget period key, or the current period of a kind (week, month, ...).
+    """
+    if value in PERIOD_KINDS:
+        return period_for(datetime.now().date(), value)
+    try:
+        period_kind(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _expense_id(value):
+    try:
+        split_expense_id(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _group_fields(value):
+    from personal_finance.report import GROUP_FIELDS
+
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    fields = ["payment_mode" if f == "mode" else f for f in fields]
+    unknown = [f for f in fields if f not in GROUP_FIELDS]
+    if unknown or not fields:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(GROUP_FIELDS)}")
+    return fields
+
+
+def _positive_amount(value):
+    """
+    An amount argument as paise.
+    """
+    try:
+        amount = to_paise(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number")
+    if amount <= 0:
+        raise argparse.ArgumentTypeError("amount must be greater than zero")
+    return amount
+
+
+def _amount(value):
+    """
+    An amount limit as paise.
+    """
+    try:
+        return to_paise(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="personal-finance",
+        description="Personal finance manager. Run without arguments for the interactive menu."
+    )
+    parser.add_argument("--data-dir", help="data folder (default: ~/.personal_finance_data)")
+    parser.add_argument("--profile", action="store_true",
+                        help="write a trace of where the time goes to <data dir>/profiles "
+                             "(or set PERSONAL_FINANCE_PROFILE=1)")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="like --profile, also keeping a cProfile dump of each command or menu action")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=["json", "csv"], default="json",
+                        help="output format (default: json)")
+    user = argparse.ArgumentParser(add_help=False)
+    user.add_argument("--user", required=True, help="user to act for")
+
+    p = commands.add_parser("add-expense", parents=[user, output], help="record an expense")
+    p.add_argument("--amount", type=_positive_amount, required=True)
+    p.add_argument("--category", default="",
+                   help="e.g. Food/Travel/Shopping/Bills/Other (default: from the description, or Other)")
+    p.add_argument("--description", default="")
+    p.add_argument("--mode", default="Other", help="payment mode, e.g. Cash/UPI/Card")
+    p.add_argument("--date", type=_date, help="YYYY-MM-DD (default: today)")
+    p.set_defaults(handler=cmd_add_expense)
+
+    p = commands.add_parser("edit-expense", parents=[user, output],
+                            help="change an expense's amount, category, description or mode")
+    p.add_argument("--id", type=_expense_id, required=True, help="expense id as shown by list")
+    p.add_argument("--amount", type=_positive_amount)
+    p.add_argument("--category")
+    p.add_argument("--description")
+    p.add_argument("--mode", help="payment mode")
+    p.set_defaults(handler=cmd_edit_expense)
+
+    p = commands.add_parser("delete-expense", parents=[user], help="delete an expense")
+    p.add_argument("--id", type=_expense_id, required=True, help="expense id as shown by list")
+    p.set_defaults(handler=cmd_delete_expense)
+
+    p = commands.add_parser("list", parents=[user, output], help="list expenses")
+    p.add_argument("--month", type=_month, help="only this YYYY-MM month")
+    p.add_argument("--from", dest="date_from", type=_date, help="first YYYY-MM-DD date to include")
+    p.add_argument("--to", dest="date_to", type=_date, help="last YYYY-MM-DD date to include")
+    p.add_argument("--category", help="only this category")
+    p.add_argument("--mode", help="only this payment mode")
+    p.add_argument("--page", type=int, help="print only this page (from 1)")
+    p.add_argument("--page-size", type=int, default=None,
+                   help="rows per page with --page (default: 20)")
+    p.set_defaults(handler=cmd_list)
+
+    p = commands.add_parser("search", parents=[user, output],
+                            help="find expenses by words of their description or category, best first")
+    p.add_argument("query", nargs="+", help="words to look for; prefixes and small typos match too")
+    p.add_argument("--from", dest="date_from", type=_date, help="first YYYY-MM-DD date to include")
+    p.add_argument("--to", dest="date_to", type=_date, help="last YYYY-MM-DD date to include")
+    p.add_argument("--min", dest="min_amount", type=_amount, help="smallest amount to include")
+    p.add_argument("--max", dest="max_amount", type=_amount, help="largest amount to include")
+    p.add_argument("--limit", type=int, default=None,
+                   help="most results to print (default: 20)")
+    p.set_defaults(handler=cmd_search)
+
+    p = commands.add_parser("summary", parents=[user, output],
+                            help="spending and budget for a month")
+    p.add_argument("--month", type=_month, help="YYYY-MM (default: this month)")
+    p.set_defaults(handler=cmd_summary)
+
+    p = commands.add_parser("report", parents=[user, output],
+                            help="spending totals by month/category/mode, trends and top descriptions")
+    p.add_argument("--from", dest="first_month", type=_month, help="first YYYY-MM month to include")
+    p.add_argument("--to", dest="last_month", type=_month, help="last YYYY-MM month to include")
+    p.add_argument("--by", type=_group_fields, default=["month", "category"],
+                   help="comma-separated fields to group totals by: month, category, payment_mode "
+                        "(default: month,category)")
+    p.add_argument("--window", type=int, default=3, help="months in the rolling average (default: 3)")
+    p.add_argument("--top", type=int, default=10, help="descriptions to list by total spend (default: 10)")
+    p.add_argument("--section", choices=["all", "groups", "monthly", "top"], default="all",
+                   help="part of the report to print (default: all)")
+    p.set_defaults(handler=cmd_report)
+
+    p = commands.add_parser("budget", help="manage weekly, monthly, quarterly and yearly budgets")
+    actions = p.add_subparsers(dest="action", metavar="ACTION", required=True)
+    a = actions.add_parser("set", parents=[user, output], help="set or replace a budget")
+    a.add_argument("--amount", type=_positive_amount, required=True)
+    when = a.add_mutually_exclusive_group()
+    when.add_argument("--period", type=_period,
+                      help="week, month, quarter or year for the current one, or a period such as "
+                           "2024-W07, 2024-05, 2024-Q2 or 2024 (default: this month)")
+    when.add_argument("--month", type=_month, help="YYYY-MM, the same as --period YYYY-MM")
+    a.add_argument("--category", default="", help="budget one category only (default: all spending)")
+    a.add_argument("--rollover", action="store_true",
+                   help="carry what is left (or overspent) into the next period")
+    a.set_defaults(handler=cmd_budget_set)
+    a = actions.add_parser("list", parents=[user, output],
+                           help="budgets with what was spent against them")
+    when = a.add_mutually_exclusive_group()
+    when.add_argument("--period", type=_period, help="only this period (default: every budget in effect today)")
+    when.add_argument("--month", type=_month, help="YYYY-MM, the same as --period YYYY-MM")
+    a.set_defaults(handler=cmd_budget_list)
+
+    p = commands.add_parser("goal", help="manage savings goals")
+    actions = p.add_subparsers(dest="action", metavar="ACTION", required=True)
+    a = actions.add_parser("add", parents=[user, output], help="create a savings goal")
+    a.add_argument("--name", required=True)
+    a.add_argument("--target", type=_positive_amount, required=True)
+    a.set_defaults(handler=cmd_goal_add)
+
+    p = commands.add_parser("recurring", help="manage expenses that repeat on a schedule")
+    actions = p.add_subparsers(dest="action", metavar="ACTION", required=True)
+    a = actions.add_parser("add", parents=[user, output], help="add a recurring expense (posted by run-due)")
+    a.add_argument("--amount", type=_positive_amount, required=True)
+    a.add_argument("--category", default="Bills", help="e.g. Food/Travel/Shopping/Bills/Other (default: Bills)")
+    a.add_argument("--description", default="")
+    a.add_argument("--mode", default="Other", help="payment mode, e.g. Cash/UPI/Card")
+    a.add_argument("--schedule", required=True,
+                   help="monthly[:DAY|last], weekly[:mon..sun] or 'cron:DOM MONTH DOW'")
+    a.add_argument("--start", type=_date, help="first YYYY-MM-DD date it can fall on (default: today)")
+    a.add_argument("--end", type=_date, help="last YYYY-MM-DD date it can fall on")
+    a.set_defaults(handler=cmd_recurring_add)
+    a = actions.add_parser("list", parents=[user, output], help="list a user's recurring expenses")
+    a.set_defaults(handler=cmd_recurring_list)
+    a = actions.add_parser("delete", parents=[user], help="stop a recurring expense")
+    a.add_argument("--id", type=int, required=True, help="rule id from 'recurring list'")
+    a.set_defaults(handler=cmd_recurring_delete)
+
+    p = commands.add_parser("category-rule", help="manage rules that give new expenses a category")
+    actions = p.add_subparsers(dest="action", metavar="ACTION", required=True)
+    a = actions.add_parser("add", parents=[user, output],
+                           help="categorize expenses whose description has these words")
+    a.add_argument("--match", required=True,
+                   help="words the description must contain, in order; end a word with * to match longer words")
+    a.add_argument("--category", required=True)
+    a.add_argument("--mode", default="", help="only expenses paid this way")
+    a.add_argument("--min", dest="min_amount", type=_amount, help="only expenses of at least this amount")
+    a.add_argument("--max", dest="max_amount", type=_amount, help="only expenses of at most this amount")
+    a.set_defaults(handler=cmd_category_rule_add)
+    a = actions.add_parser("list", parents=[user, output], help="list a user's category rules, first applied first")
+    a.set_defaults(handler=cmd_category_rule_list)
+    a = actions.add_parser("delete", parents=[user], help="delete a category rule")
+    a.add_argument("--id", type=int, required=True, help="rule id from 'category-rule list'")
+    a.set_defaults(handler=cmd_category_rule_delete)
+
+    p = commands.add_parser("categorize", parents=[user, output],
+                            help="show the category an expense would get from the rules and history")
+    p.add_argument("--description", required=True)
+    p.add_argument("--mode", default="Other", help="payment mode")
+    p.add_argument("--amount", type=_amount, default=0)
+    p.set_defaults(handler=cmd_categorize)
+
+    p = commands.add_parser("run-due", parents=[output],
+                            help="add every recurring expense that has come due, for all users")
+    p.add_argument("--user", help="only this user's")
+    p.add_argument("--date", type=_date, help="post up to this YYYY-MM-DD date (default: today)")
+    p.set_defaults(handler=cmd_run_due)
+
+    # not the shared --format option: set_defaults() here would change its default everywhere
+    p = commands.add_parser("export", parents=[user], help="write a user's expenses")
+    p.add_argument("--format", choices=["json", "csv", "jsonl"], default="csv",
+                   help="output format (default: csv)")
+    p.add_argument("--output", "-o", help="file to write (default: stdout)")
+    p.add_argument("--from", dest="date_from", type=_date, help="first YYYY-MM-DD date to include")
+    p.add_argument("--to", dest="date_to", type=_date, help="last YYYY-MM-DD date to include")
+    p.add_argument("--incremental", action="store_true",
+                   help="append only expenses added since the last export to this file")
+    p.add_argument("--gzip", action="store_true", default=None,
+                   help="compress the output (default: if its name ends in .gz)")
+    p.set_defaults(handler=cmd_export)
+
+    # import and provision report counts, so their text format is a sentence rather than csv
+    report = argparse.ArgumentParser(add_help=False)
+    report.add_argument("--format", choices=["json", "text"], default="json",
+                        help="format of the counts printed at the end (default: json); "
+                             "problems with single rows go to stderr either way")
+
+    p = commands.add_parser("import", parents=[report],
+                            help="bulk-import expenses from a CSV export or bank statement")
+    p.add_argument("file", help="CSV file to import ('-' for stdin)")
+    p.add_argument("--user", required=True, help="user the expenses belong to")
+    p.add_argument("--no-dedupe", action="store_true",
+                   help="import rows even if an identical expense already exists")
+    p.add_argument("--batch-size", type=int, default=None,
+                   help="rows buffered before each write (default: 50000)")
+    p.add_argument("--dry-run", action="store_true", help="parse and validate only; write nothing")
+    p.add_argument("--no-categorize", action="store_true",
+                   help="give rows without a category Other instead of one from the rules and history")
+    p.set_defaults(handler=cmd_import)
+
+    p = commands.add_parser("provision", parents=[report], help="register many users from a CSV file")
+    p.add_argument("file", help="CSV with a header naming username, password, first_name, "
+                                "last_name, age and email ('-' for stdin)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="processes hashing passwords (default: one per CPU)")
+    p.add_argument("--cost", type=int, default=None,
+                   help="password hash cost for these accounts (default: the configured cost); "
+                        "a lower cost is raised on each user's first login")
+    p.add_argument("--dry-run", action="store_true", help="validate only; create nothing")
+    # --cost can only be checked once the scheme is known, after parsing
+    p.set_defaults(handler=cmd_provision, error=p.error)
+
+    p = commands.add_parser("migrate-legacy", parents=[output],
+                            help="move the shared expenses.csv of older versions into per-user ledgers")
+    p.add_argument("--user", help="user the expenses belong to (needed unless the file has a "
+                                  "username column; then only for rows that leave it blank)")
+    p.set_defaults(handler=cmd_migrate_legacy)
+
+    p = commands.add_parser("month-end", parents=[output],
+                            help="write a summary and an expense export for every user")
+    p.add_argument("--month", type=_month, help="YYYY-MM (default: this month)")
+    p.add_argument("--output", "-o", help="folder for the files (default: <data-dir>/month_end)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="worker processes (default: one per CPU)")
+    p.set_defaults(handler=cmd_month_end)
+
+    return parser
+
+
+def require_user(username):
+    if not app.username_exists(username):
+        raise SystemExit(f"Unknown user '{username}'.")
+
+
+def write_records(records, fields, fmt, out=None):
+    """
+    Write dicts to out (stdout by default) as a JSON array or as CSV with a
+    header row. Records are written as they come, so long listings stream.
+    """
+    out = out or sys.stdout
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(records)
+        return
+    first = True
+    out.write("[")
+    for record in records:
+        out.write("\n  " if first else ",\n  ")
+        out.write(json.dumps(record, ensure_ascii=False))
+        first = False
+    out.write("\n]\n" if not first else "]\n")
+
+
+def write_record(record, fields, fmt, out=None):
+    """
+    Write a single dict: a JSON object, or one CSV row under a header.
+    """
+    out = out or sys.stdout
+    if fmt == "csv":
+        write_records([record], fields, fmt, out)
+    else:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def expense_record(eid, row):
+    record = {"id": eid}
+    record.update(zip(EXPENSE_HEADER, row))
+    try:
+        record["amount"] = float(record["amount"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return record
+
+
+def report_alerts(username, changes=None):
+    for message in app.update_budget_alerts(username, changes):
+        print(message, file=sys.stderr)
+
+
+def summary_record(summary):
+    record = dict(summary)
+    for name in ("spent", "budget", "remaining"):
+        if record[name] is not None:
+            record[name] = amount_value(record[name])
+    record["categories"] = {c: amount_value(t) for c, t in summary["categories"].items()}
+    return record
+
+
+def cmd_add_expense(args):
+    require_user(args.user)
+    eid, expense = app.record_expense(args.user, args.amount, args.category.strip(),
+                                      args.description.strip(), args.mode.strip(), args.date)
+    write_record(expense_record(eid, expense.to_row()), EXPENSE_FIELDS, args.format)
+    report_alerts(args.user, [(expense.date, expense.category)])
+    return 0
+
+
+def find_expense(username, eid):
+    found = app.find_expense(username, eid)
+    if found is None:
+        raise SystemExit(f"No expense '{eid}' for user '{username}'.")
+    return found
+
+
+def cmd_edit_expense(args):
+    require_user(args.user)
+    month, key, row = find_expense(args.user, args.id)
+    new_row = list(row)
+    if args.amount is not None:
+        new_row[1] = format_amount(args.amount)
+    for i, value in ((2, args.category), (3, args.description), (4, args.mode)):
+        if value is not None:
+            new_row[i] = value.strip()
+    app.get_store().update_expense(args.user, month, key, new_row, expected=row)
+    write_record(expense_record(args.id, new_row), EXPENSE_FIELDS, args.format)
+    report_alerts(args.user, [(new_row[0], new_row[2])])
+    return 0
+
+
+def cmd_delete_expense(args):
+    require_user(args.user)
+    month, key, row = find_expense(args.user, args.id)
+    app.get_store().delete_expense(args.user, month, key, expected=row)
+    print(f"Deleted expense {args.id}.", file=sys.stderr)
+    return 0
+
+
+def iter_expense_records(entries):
+    for number, month, key, row in entries:
+        yield expense_record(expense_id(month, key), row)
+
+
+def cmd_list(args):
+    from personal_finance.viewer import DEFAULT_PAGE_SIZE, ExpenseFilter, ExpensePager
+
+    require_user(args.user)
+    date_from, date_to = args.date_from, args.date_to
+    if args.month:
+        date_from = max(date_from or "", args.month + "-01")
+        date_to = min(date_to or "9999", args.month + "-31")
+    pager = ExpensePager(app.get_store(), args.user,
+                         ExpenseFilter(date_from, date_to, args.category, args.mode),
+                         args.page_size or DEFAULT_PAGE_SIZE)
+    if args.page is None:
+        entries = pager.entries()
+    else:
+        entries = pager.page(args.page)
+    write_records(iter_expense_records(entries), EXPENSE_FIELDS, args.format)
+    return 0
+
+
+def cmd_search(args):
+    from personal_finance.search import DEFAULT_LIMIT, search_expenses
+
+    require_user(args.user)
+    limit = DEFAULT_LIMIT if args.limit is None else max(args.limit, 0)
+    try:
+        found = search_expenses(app.get_store(), args.user, " ".join(args.query),
+                                args.date_from, args.date_to, args.min_amount, args.max_amount, limit)
+    except ValueError as e:
+        raise SystemExit(f"Invalid search: {e}.")
+    records = []
+    for score, eid, row in found["results"]:
+        record = expense_record(eid, row)
+        record["score"] = round(score, 3)
+        records.append(record)
+    write_records(records, SEARCH_FIELDS, args.format)
+    print(f"{found['matches']} matching expenses.", file=sys.stderr)
+    return 0
+
+
+def cmd_summary(args):
+    require_user(args.user)
+    summary = app.get_monthly_summary(args.user, args.month)
+    write_record(summary_record(summary), SUMMARY_FIELDS, args.format)
+    return 0
+
+
+def cmd_report(args):
+    from personal_finance import report
+
+    require_user(args.user)
+    columns = report.ExpenseColumns.load(app.get_store(), args.user, args.first_month, args.last_month)
+    sections = {
+        "groups": (lambda: report.group_totals(columns, args.by), args.by + ["total", "count"]),
+        "monthly": (lambda: report.monthly_series(columns, args.window),
+                    ["month", "total", "count", "rolling_average", "previous_year", "change_percent"]),
+        "top": (lambda: report.top_descriptions(columns, args.top), ["description", "total", "count"]),
+    }
+    if args.section != "all":
+        build, fields = sections[args.section]
+        write_records(build(), fields, args.format)
+    elif args.format == "json":
+        write_record(report.build_report(columns, args.by, args.window, args.top), None, "json")
+    else:
+        # one csv table per section, separated by a blank line
+        for i, (build, fields) in enumerate(sections.values()):
+            if i:
+                sys.stdout.write("\n")
+            write_records(build(), fields, "csv")
+    return 0
+
+
+def cmd_budget_set(args):
+    require_user(args.user)
+    period = args.period or args.month or app.get_current_month()
+    budget = app.write_user_budget(args.user, period, args.amount, args.category.strip(), args.rollover)
+    write_record(budget.to_record(), BUDGET_FIELDS, args.format)
+    return 0
+
+
+def cmd_budget_list(args):
+    require_user(args.user)
+    engine = app.get_budget_engine()
+    period = args.period or args.month
+    if period:
+        budgets = engine.period_budgets(args.user, period)
+    else:
+        budgets = engine.in_effect(args.user, app.get_today())
+    write_records((engine.status(args.user, b) for b in budgets), BUDGET_STATUS_FIELDS, args.format)
+    return 0
+
+
+def cmd_recurring_add(args):
+    require_user(args.user)
+    start = args.start or app.get_today()
+    expense = Expense(start, args.amount, args.category.strip(), args.description.strip(), args.mode.strip())
+    try:
+        rule = app.add_recurring_expense(args.user, expense, args.schedule, start, args.end or "")
+    except ValueError as e:
+        raise SystemExit(f"Invalid recurring expense: {e}")
+    write_record(rule.to_record(), RULE_FIELDS, args.format)
+    return 0
+
+
+def cmd_recurring_list(args):
+    require_user(args.user)
+    rules = app.get_store().recurring_rules(args.user)
+    write_records((rule.to_record() for _, rule in rules), RULE_FIELDS, args.format)
+    return 0
+
+
+def cmd_recurring_delete(args):
+    require_user(args.user)
+    if not app.get_store().delete_rule(args.user, args.id):
+        raise SystemExit(f"No recurring expense {args.id} for user '{args.user}'.")
+    print(f"Deleted recurring expense {args.id}.", file=sys.stderr)
+    return 0
+
+
+def cmd_category_rule_add(args):
+    require_user(args.user)
+    try:
+        rule = app.add_category_rule(args.user, args.match, args.category, args.mode,
+                                     args.min_amount, args.max_amount)
+    except ValueError as e:
+        raise SystemExit(f"Invalid category rule: {e}")
+    write_record(rule.to_record(), CATEGORY_RULE_FIELDS, args.format)
+    return 0
+
+
+def cmd_category_rule_list(args):
+    require_user(args.user)
+    rules = app.get_store().category_rules(args.user)
+    write_records((rule.to_record() for rule in rules), CATEGORY_RULE_FIELDS, args.format)
+    return 0
+
+
+def cmd_category_rule_delete(args):
+    require_user(args.user)
+    if not app.delete_category_rule(args.user, args.id):
+        raise SystemExit(f"No category rule {args.id} for user '{args.user}'.")
+    print(f"Deleted category rule {args.id}.", file=sys.stderr)
+    return 0
+
+
+def cmd_categorize(args):
+    require_user(args.user)
+    categorizer = app.get_categorizer(args.user)
+    category, source = categorizer.suggest(args.description, args.mode, args.amount) if categorizer else (None, None)
+    record = {"description": args.description, "payment_mode": args.mode, "amount": amount_value(args.amount),
+              "category": category, "source": None if source is None else str(source)}
+    write_record(record, CATEGORIZE_FIELDS, args.format)
+    return 0
+
+
+def cmd_run_due(args):
+    if args.user:
+        require_user(args.user)
+    date = args.date or app.get_today()
+    result = app.post_recurring_expenses(args.user, date)
+    record = {"date": date}
+    record.update((name, result[name]) for name in RUN_DUE_FIELDS[1:])
+    write_record(record, RUN_DUE_FIELDS, args.format)
+    if args.user and result["posted"]:
+        report_alerts(args.user, sorted({(row[0], row[2]) for _, row in result["posted"]}))
+    return 0
+
+
+def cmd_goal_add(args):
+    require_user(args.user)
+    goal = app.add_savings_goal(args.user, args.name.strip(), args.target)
+    write_record(goal.to_record(), GOAL_FIELDS, args.format)
+    return 0
+
+
+def cmd_export(args):
+    from personal_finance.exporter import export_expenses
+
+    require_user(args.user)
+    output = Path(args.output).expanduser() if args.output else None
+    try:
+        result = export_expenses(app.get_store(), args.user, output, args.format,
+                                 args.date_from, args.date_to, args.incremental, args.gzip)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if output is not None:
+        verb = "appended to" if result["appended"] else "exported to"
+        print(f"{result['rows']} expenses {verb} {output}", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args):
+    from personal_finance.importer import DEFAULT_BATCH_SIZE, import_expenses
+
+    require_user(args.user)
+    store = app.get_store()
+    batch_size = args.batch_size or DEFAULT_BATCH_SIZE
+    categorizer = None if args.no_categorize else app.get_categorizer(args.user)
+    if args.file == "-":
+        result = import_expenses(store, args.user, sys.stdin, not args.no_dedupe, batch_size, args.dry_run,
+                                 categorizer)
+    else:
+        with open(args.file, "r", newline="", encoding="utf-8-sig") as f:
+            result = import_expenses(store, args.user, f, not args.no_dedupe, batch_size, args.dry_run,
+                                     categorizer)
+
+    for line_no, message in result.errors:
+        print(f"line {line_no}: {message}", file=sys.stderr)
+    if result.skipped > len(result.errors):
+        print(f"... and {result.skipped - len(result.errors)} more invalid rows", file=sys.stderr)
+    if args.format == "text":
+        print(f"Read {result.read} rows: {result.imported} imported, "
+              f"{result.duplicates} duplicates skipped, {result.skipped} invalid.")
+        if result.categorized:
+            print(f"  {result.categorized} rows were given a category from your rules and history")
+    else:
+        record = {"read": result.read, "imported": result.imported, "duplicates": result.duplicates,
+                  "skipped": result.skipped, "categorized": result.categorized, "dry_run": args.dry_run}
+        write_record(record, IMPORT_FIELDS, args.format)
+
+    if result.imported and not args.dry_run:
+        report_alerts(args.user)
+    return 0
+
+
+def cmd_provision(args):
+    from personal_finance.passwords import check_cost
+    from personal_finance.provision import provision_users
+
+    try:
+        scheme, cost = app.get_password_scheme()
+    except ValueError as e:
+        raise SystemExit(f"Invalid password setting: {e}.")
+    if args.cost is not None:
+        try:
+            cost = check_cost(scheme, args.cost)
+        except ValueError as e:
+            args.error(f"argument --cost: {e}")
+    store = app.get_store()
+    if args.file == "-":
+        result = provision_users(store, sys.stdin, scheme, cost, args.workers, args.dry_run)
+    else:
+        with open(args.file, "r", newline="", encoding="utf-8-sig") as f:
+            result = provision_users(store, f, scheme, cost, args.workers, args.dry_run)
+
+    for line_no, message in result.errors:
+        print(f"line {line_no}: {message}", file=sys.stderr)
+    if result.rejected > len(result.errors):
+        print(f"... and {result.rejected - len(result.errors)} more rejected rows", file=sys.stderr)
+    for username in result.raced:
+        print(f"'{username}' was registered by another session meanwhile; skipped.", file=sys.stderr)
+    if args.format == "text":
+        verb = "valid" if args.dry_run else "created"
+        print(f"Read {result.read} users: {len(result.created)} {verb}, {result.rejected} rejected.")
+    else:
+        record = {"read": result.read, "created": len(result.created), "rejected": result.rejected,
+                  "raced": len(result.raced), "dry_run": args.dry_run}
+        write_record(record, PROVISION_FIELDS, args.format)
+    return 0 if not result.rejected and not result.raced else 1
+
+
+def cmd_migrate_legacy(args):
+    store = app.get_store()
+    if not store.has_legacy_expenses():
+        print("expenses.csv has no expenses to migrate.", file=sys.stderr)
+        return 0
+    if args.user:
+        require_user(args.user)
+    for owner in sorted(store.legacy_expense_owners() or ()):
+        require_user(owner)
+    try:
+        moved = store.migrate_legacy_expenses(args.user)
+    except ValueError as e:
+        raise SystemExit(f"{e} Say whose they are with --user.")
+    write_records(({"user": user, "expenses": count} for user, count in sorted(moved.items())),
+                  MIGRATE_FIELDS, args.format)
+    return 0
+
+
+def cmd_month_end(args):
+    from personal_finance.monthend import run_month_end
+
+    month = args.month or app.get_current_month()
+    output_dir = Path(args.output).expanduser() if args.output else app.get_file_path("month_end")
+    stats = run_month_end(app.get_store(), app.DATA_DIR, month, output_dir, args.workers)
+    write_record(stats, list(stats), args.format)
+    return 0
+
+
+def run(argv):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        app.DATA_DIR = Path(args.data_dir).expanduser()
+    mode = "cprofile" if args.cprofile else "trace" if args.profile else profiling.mode_from_env()
+    if mode:
+        profiling.start(mode, app.DATA_DIR, argv)
+    if args.command is None:
+        return app.interactive()
+    try:
+        with profiling.operation("action", " ".join(filter(None, [args.command, getattr(args, "action", None)]))):
+            return args.handler(args)
+    except ConcurrentUpdateError as e:
+        print(f"{e} Nothing was changed; please try again.", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # stdout was closed early (e.g. piped into head); don't fail again on exit flush
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
@@ -0,0 +1,316 @@
+"""
+Columnar binary cache of expense partitions.
+
+<partition>.cols holds the rows of a partition's csv file already parsed,
+one column per field:
+
+    ids            int64   the row's expense id
+    days           int32   date as days since 1970-01-01, INVALID_DAY if unparseable
+    amounts        int64   amount in paise (hundredths)
+    categories     int32   code into the category dictionary
+    modes          int32   code into the payment mode dictionary
+    descriptions   int32   code into the description dictionary
+
+The file is a header followed by chunks. A chunk is the columns for a run
+of rows followed by the dictionary values first used in it (json):
+
+    header   magic, csv mtime_ns, csv size, csv inode, crc32 of the csv's
+             last 4 KiB, chunk count, end of the last chunk
+    chunk    row count, dictionary bytes, the six columns, dictionaries
+
+Readers mmap the file and copy each column out with one memcpy per chunk.
+The cache is checked against the csv file's mtime, size and inode. If the
+file only grew (same inode, and the bytes the cache covers still end the
+same way) just the new rows are parsed and added as one more chunk;
+anything else rebuilds it. Chunks are merged once there are more than MAX_CHUNKS.
+
+Rows whose amount isn't a number are left out. The journal isn't covered:
+LedgerStore applies it on top. Like journal.py, nothing here locks.
+"""
+import csv
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from datetime import date
+
+from personal_finance.models import to_paise
+from personal_finance.rowindex import iter_records
+
+
+MAGIC = b"PFCOLS01"
+HEADER = struct.Struct("<8sqqqIqq")
+CHUNK = struct.Struct("<qq")
+TAIL_BYTES = 4096
+MAX_CHUNKS = 16
+INVALID_DAY = -(2 ** 31)
+EPOCH = date(1970, 1, 1).toordinal()
+
+# (attribute, array typecode) in file order
+COLUMNS = (
+    ("ids", "q"),
+    ("days", "i"),
+    ("amounts", "q"),
+    ("categories", "i"),
+    ("modes", "i"),
+    ("descriptions", "i"),
+)
+DICTIONARIES = ("category_names", "mode_names", "description_names")
+
+
+def cache_path(path):
+    return path.with_name(path.name + ".cols")
+
+
+def day_number(text):
+    """
+    Days since 1970-01-01 for a YYYY-MM-DD date, or INVALID_DAY.
+    """
+    try:
+        return date(int(text[0:4]), int(text[5:7]), int(text[8:10])).toordinal() - EPOCH
+    except ValueError:
+        return INVALID_DAY
+
+
+def tail_crc(path, covered):
+    """
+    crc32 of the TAIL_BYTES of path before offset covered; None if it is gone.
+    """
+    start = max(0, covered - TAIL_BYTES)
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return zlib.crc32(f.read(covered - start))
+    except FileNotFoundError:
+        return None
+
+
+class Columns:
+    """
+    Parsed expense rows as parallel array.array columns with their dictionaries.
+    """
+
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.category_names = []
+        self.mode_names = []
+        self.description_names = []
+        self._codes = None
+        self._days = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _code_maps(self):
+        if self._codes is None:
+            self._codes = [{v: i for i, v in enumerate(getattr(self, name))} for name in DICTIONARIES]
+        return self._codes
+
+    def _code(self, which, value):
+        codes = self._code_maps()[which]
+        code = codes.get(value)
+        if code is None:
+            values = getattr(self, DICTIONARIES[which])
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def add_row(self, row, id_column):
+        """
+        Add a csv row (date, amount, category, description, mode, ..., id).
+        Returns False, adding nothing, if the amount or id doesn't parse.
+        """
+        if len(row) <= id_column:
+            return False
+        try:
+            paise = to_paise(row[1])
+            row_id = int(row[id_column])
+        except ValueError:
+            return False
+        day = self._days.get(row[0])
+        if day is None:
+            day = self._days[row[0]] = day_number(row[0])
+        self.ids.append(row_id)
+        self.days.append(day)
+        self.amounts.append(paise)
+        self.categories.append(self._code(0, row[2]))
+        self.modes.append(self._code(1, row[4]))
+        self.descriptions.append(self._code(2, row[3]))
+        return True
+
+    def apply(self, entries, id_column):
+        """
+        Apply journal entries (op, key, row) keyed by the id as a string.
+        """
+        if not entries:
+            return
+        latest = {}
+        for op, key, row in entries:
+            latest[key[0]] = row
+        changed = {}
+        for key, row in latest.items():
+            try:
+                changed[int(key)] = row
+            except ValueError:
+                continue
+        keep = [i for i, row_id in enumerate(self.ids) if row_id not in changed]
+        if len(keep) < len(self.ids):
+            for name, typecode in COLUMNS:
+                column = getattr(self, name)
+                setattr(self, name, array(typecode, [column[i] for i in keep]))
+        for row_id, row in changed.items():
+            if row is not None:
+                self.add_row(row, id_column)
+
+
+class ColumnCache:
+    """
+    The .cols cache of one partition csv file; id_column is where each row's
+    id is and encoding is the csv file's text encoding.
+    """
+
+    magic = MAGIC
+    suffix = ".cols"
+
+    def __init__(self, path, id_column, encoding="utf-8"):
+        self.path = path
+        self.cache_path = path.with_name(path.name + self.suffix)
+        self.id_column = id_column
+        self.encoding = encoding
+
+    def load(self):
+        """
+        The partition's rows as Columns, updating or rebuilding the cache
+        first if the csv file changed. The caller holds the partition's lock.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return Columns()
+        header = self._read_header()
+        if header is not None:
+            mtime_ns, size, inode, tail, chunks, end = header
+            if (mtime_ns, size, inode) == (st.st_mtime_ns, st.st_size, st.st_ino):
+                return self._read()
+            if inode == st.st_ino and size <= st.st_size and tail_crc(self.path, size) == tail:
+                columns = self._read()
+                added = self._append(columns, header, st)
+                if chunks + 1 > MAX_CHUNKS:
+                    self._write(columns, st)
+                else:
+                    self._write_chunk(added, header, st)
+                return columns
+        columns = Columns()
+        self._parse(columns, 0)
+        self._write(columns, st)
+        return columns
+
+    # ---- reading ----
+
+    def _read_header(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        values = HEADER.unpack(data)
+        if values[0] != self.magic:
+            return None
+        return values[1:]
+
+    def _read(self):
+        columns = Columns()
+        with open(self.cache_path, "rb") as f:
+            end = HEADER.unpack(f.read(HEADER.size))[-1]
+            if end <= HEADER.size:
+                return columns
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offset = HEADER.size
+                while offset < end:
+                    rows, dict_bytes = CHUNK.unpack_from(mm, offset)
+                    offset += CHUNK.size
+                    for name, typecode in COLUMNS:
+                        column = getattr(columns, name)
+                        width = column.itemsize * rows
+                        column.frombytes(mm[offset:offset + width])
+                        offset += width
+                    added = json.loads(mm[offset:offset + dict_bytes].decode("utf-8"))
+                    offset += dict_bytes
+                    for name, values in zip(DICTIONARIES, added):
+                        getattr(columns, name).extend(values)
+        return columns
+
+    # ---- parsing ----
+
+    def _parse(self, columns, offset):
+        """
+        Parse csv rows from byte offset (0 = the start, header included) into columns.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            records = iter_records(f)
+            if offset == 0:
+                next(records, None)
+            text = (data.decode(self.encoding, "replace") for start, data in records)
+            for row in csv.reader(text):
+                columns.add_row(row, self.id_column)
+
+    def _append(self, columns, header, st):
+        """
+        Parse the rows added to the csv file since header was written into
+        columns; returns them as a Columns of their own for a new chunk.
+        """
+        covered = header[1]
+        before = len(columns)
+        sizes = [len(getattr(columns, name)) for name in DICTIONARIES]
+        self._parse(columns, covered)
+        added = Columns()
+        for name, typecode in COLUMNS:
+            setattr(added, name, getattr(columns, name)[before:])
+        for name, size in zip(DICTIONARIES, sizes):
+            setattr(added, name, getattr(columns, name)[size:])
+        return added
+
+    # ---- writing ----
+
+    def _chunk_bytes(self, columns):
+        dictionaries = json.dumps([getattr(columns, name) for name in DICTIONARIES]).encode("utf-8")
+        parts = [CHUNK.pack(len(columns), len(dictionaries))]
+        parts.extend(getattr(columns, name).tobytes() for name, typecode in COLUMNS)
+        parts.append(dictionaries)
+        return b"".join(parts)
+
+    def _header_bytes(self, st, chunks, end):
+        return HEADER.pack(self.magic, st.st_mtime_ns, st.st_size, st.st_ino,
+                           tail_crc(self.path, st.st_size) or 0, chunks, end)
+
+    def _write(self, columns, st):
+        """
+        Write columns as a fresh single-chunk cache.
+        """
+        chunk = self._chunk_bytes(columns)
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self._header_bytes(st, 1, HEADER.size + len(chunk)))
+            f.write(chunk)
+        os.replace(tmp_path, self.cache_path)
+
+    def _write_chunk(self, added, header, st):
+        """
+        Add one chunk after the last one, then point the header past it. A
+        crash before the header is rewritten leaves the old cache intact.
+        """
+        chunks, end = header[4], header[5]
+        chunk = self._chunk_bytes(added)
+        with open(self.cache_path, "r+b") as f:
+            f.seek(end)
+            f.write(chunk)
+            f.truncate()
+            f.flush()
+            f.seek(0)
+            f.write(self._header_bytes(st, chunks + 1, end + len(chunk)))
@@ -0,0 +1,44 @@
+import json
+import os
+from pathlib import Path
+
+from personal_finance.fileio import file_signature
+
+
+CONFIG_FILE = "config.json"
+
+_cache = {}
+
+
+def load_config(data_dir):
+    """
+    Settings from <data_dir>/config.json, or {} if there is none.
+    The parsed file is cached until its mtime or size changes.
+    """
+    path = Path(data_dir) / CONFIG_FILE
+    signature = file_signature(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    config = {}
+    if signature is not None:
+        try:
+            with open(path, "r") as f:
+                config = json.load(f)
+        except ValueError:
+            print(f"Ignoring invalid config file {path}")
+            config = {}
+        if not isinstance(config, dict):
+            config = {}
+    _cache[path] = (signature, config)
+    return config
+
+
+def get_setting(data_dir, key, env_var=None, default=None):
+    """
+    A setting from the environment variable if it is set, else from config.json, else default.
+    """
+    if env_var and os.environ.get(env_var):
+        return os.environ[env_var]
+    return load_config(data_dir).get(key, default)
@@ -0,0 +1,206 @@
+"""
+Streaming, resumable expense exports.
+
+An export walks the user's month partitions one at a time and writes every
+expense as it is read, so memory use doesn't grow with the history.
+
+    csv     a header row, then id,date,amount,category,description,payment_mode
+    jsonl   one JSON object per line
+    json    one JSON array (full exports only: it can't be appended to)
+
+Any of them can be gzip-compressed; an output name ending in .gz turns it on.
+
+An incremental export appends only the expenses added since the previous
+run. Its watermark, the highest id exported from each month, is kept in
+<output>.watermark together with the output's size at the time. An
+interrupted run doesn't touch the watermark; the next run cuts the output
+back to the recorded size and picks up from there, so no row is lost or
+written twice. A gzip output gets one gzip member per run, which gzip and
+gzip.open() read as a single stream.
+
+Expenses that were edited or deleted after being exported are not revisited
+by an incremental run; a full export picks them up.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+from personal_finance.fileio import fsync_file
+from personal_finance.models import amount_value, format_amount, to_paise
+from personal_finance.store import EXPENSE_HEADER, expense_id
+
+FORMATS = ("csv", "jsonl", "json")
+FIELDS = ["id"] + EXPENSE_HEADER
+WATERMARK_VERSION = 1
+
+
+def watermark_path(path):
+    path = Path(path)
+    return path.with_name(path.name + ".watermark")
+
+
+def read_watermark(path):
+    """
+    The watermark dict of an output file, or None if it has none or it
+    doesn't match the file any more.
+    """
+    try:
+        with open(watermark_path(path), encoding="utf-8") as f:
+            mark = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+    if not isinstance(mark, dict) or mark.get("version") != WATERMARK_VERSION or size < mark.get("size", 0):
+        return None
+    return mark
+
+
+def save_watermark(path, mark):
+    target = watermark_path(path)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(mark, f)
+        fsync_file(f)
+    os.replace(tmp_path, target)
+
+
+def in_range(month, date_from, date_to):
+    """
+    False if no date of the month can fall within [date_from, date_to].
+    The undated partition is always read; its rows are filtered one by one.
+    """
+    if len(month) != 7:
+        return True
+    return (date_from is None or month >= date_from[:7]) and (date_to is None or month <= date_to[:7])
+
+
+def iter_expenses(store, username, date_from=None, date_to=None, after=None):
+    """
+    Yield (month, key, row) for the user's expenses within the date range,
+    month by month. after maps a month to the id to continue after.
+    """
+    after = after or {}
+    for month in store.expense_months(username):
+        if not in_range(month, date_from, date_to):
+            continue
+        for key, row in store.stream_expenses(username, month, after.get(month, 0)):
+            if date_from is not None and row[0] < date_from:
+                continue
+            if date_to is not None and row[0] > date_to:
+                continue
+            yield month, key, row
+
+
+class _Writer:
+    """
+    Writes expenses to a text stream in one of FORMATS.
+    """
+
+    def __init__(self, out, fmt, header):
+        self.out = out
+        self.fmt = fmt
+        self.count = 0
+        if fmt == "csv":
+            self.csv = csv.writer(out, lineterminator="\n")
+            if header:
+                self.csv.writerow(FIELDS)
+        elif fmt == "json":
+            out.write("[")
+
+    def write(self, eid, row):
+        try:
+            paise = to_paise(row[1])
+        except ValueError:
+            paise = None
+        if self.fmt == "csv":
+            amount = format_amount(paise) if paise is not None else row[1]
+            self.csv.writerow([eid, row[0], amount] + list(row[2:5]))
+        else:
+            record = dict(zip(FIELDS, [eid] + list(row[:5])))
+            if paise is not None:
+                record["amount"] = amount_value(paise)
+            text = json.dumps(record, ensure_ascii=False)
+            if self.fmt == "json":
+                self.out.write(("\n  " if not self.count else ",\n  ") + text)
+            else:
+                self.out.write(text + "\n")
+        self.count += 1
+
+    def finish(self):
+        if self.fmt == "json":
+            self.out.write("\n]\n" if self.count else "]\n")
+
+
+def export_expenses(store, username, output=None, fmt="csv", date_from=None, date_to=None,
+                    incremental=False, compress=None):
+    """
+    Export a user's expenses to the output path (stdout if None) and return
+    {"rows", "appended", "output", "bytes"}. compress defaults to whether
+    output ends in .gz. With incremental, only expenses after the output's
+    watermark are appended; the first run writes everything.
+    ValueError for combinations that can't work.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format '{fmt}' (use {', '.join(FORMATS)})")
+    if output is None:
+        if incremental:
+            raise ValueError("an incremental export needs an output file")
+        writer = _Writer(sys.stdout, fmt, True)
+        for month, key, row in iter_expenses(store, username, date_from, date_to):
+            writer.write(expense_id(month, key), row)
+        writer.finish()
+        return {"rows": writer.count, "appended": False, "output": None, "bytes": None}
+
+    output = Path(output)
+    if compress is None:
+        compress = output.suffix == ".gz"
+    if incremental and fmt == "json":
+        raise ValueError("json output can't be appended to; use jsonl for incremental exports")
+    settings = {"user": username, "format": fmt, "gzip": bool(compress), "from": date_from, "to": date_to}
+
+    mark = read_watermark(output) if incremental else None
+    if mark is not None and {k: mark.get(k) for k in settings} != settings:
+        raise ValueError(f"{output} was exported with different settings "
+                         f"({', '.join(f'{k}={mark.get(k)}' for k in settings)}); "
+                         "export to a new file or drop --incremental")
+    appending = mark is not None
+    if appending:
+        # drop anything an interrupted run wrote after the last watermark
+        with open(output, "r+b") as f:
+            f.truncate(mark["size"])
+        after = {m: int(k) for m, k in mark["months"].items()}
+    else:
+        try:
+            os.remove(watermark_path(output))
+        except FileNotFoundError:
+            pass
+        after = {}
+
+    raw = open(output, "ab" if appending else "wb")
+    with raw:
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compress else raw
+        out = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        writer = _Writer(out, fmt, not appending)
+        months = dict(after)
+        for month, key, row in iter_expenses(store, username, date_from, date_to, after):
+            writer.write(expense_id(month, key), row)
+            months[month] = max(months.get(month, 0), int(key))
+        writer.finish()
+        out.flush()
+        out.detach()
+        if compress:
+            stream.close()
+        fsync_file(raw)
+        size = raw.tell()
+
+    if incremental:
+        mark = dict(settings, version=WATERMARK_VERSION, size=size, months=months)
+        save_watermark(output, mark)
+    return {"rows": writer.count, "appended": appending, "output": str(output), "bytes": size}
@@ -0,0 +1,61 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; locking becomes a no-op there
+    fcntl = None
+
+
+def file_signature(path):
+    """
+    (mtime_ns, size) of a file, or None if it does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def locked(path):
+    """
+    Hold an exclusive advisory lock for path while the block runs.
+
+    The lock is taken on a separate <path>.lock file because data files are
+    replaced by rename, which would leave a lock on the old inode useless.
+    Locks are per open file, so nesting locked() on the same path in one
+    process deadlocks; callers lock once at their entry point.
+    """
+    if fcntl is None:
+        yield
+        return
+    lock_path = f"{path}.lock"
+    with open(lock_path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def fsync_file(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def fsync_dir(directory):
+    """
+    Make a rename inside directory durable. Not every platform supports this.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
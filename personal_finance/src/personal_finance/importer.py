@@ -0,0 +1,235 @@
+"""
+Bulk import of expenses from CSV exports and bank statements.
+
+The input is read as a stream. Rows are normalized into the ledger's
+date,amount,category,description,payment_mode layout, checked against the
+user's existing entries and buffered per month; each flush is one append
+per month partition. Only the months that appear in the file are read.
+Rows without a category can be given one by a categorize.Categorizer.
+"""
+import csv
+import itertools
+import re
+from collections import Counter
+from datetime import datetime
+
+from personal_finance.models import Expense, to_paise
+from personal_finance.store import expense_month
+
+
+DEFAULT_BATCH_SIZE = 50000
+
+# Accepted header names for each ledger column, lower-cased.
+COLUMN_ALIASES = {
+    "date": ["date", "txn date", "transaction date", "value date", "posting date", "tran date"],
+    "amount": ["amount", "debit", "debit amount", "withdrawal", "withdrawal amount",
+               "withdrawal amt.", "amount (inr)", "spent"],
+    "category": ["category", "type"],
+    "description": ["description", "narration", "details", "particulars", "remarks", "merchant"],
+    "payment_mode": ["payment_mode", "payment mode", "mode", "payment", "method"],
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y",
+                "%Y/%m/%d", "%d %b %Y", "%d-%b-%Y", "%d %b %y", "%d-%b-%y", "%d.%m.%Y"]
+
+_AMOUNT_JUNK = re.compile(r"[₹,\s]|^(rs\.?|inr)", re.IGNORECASE)
+
+
+class ImportResult:
+    """
+    Counts from one import run; errors holds (line number, message) for the first few bad rows.
+    """
+
+    MAX_ERRORS = 20
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.categorized = 0
+        self.errors = []
+        self.months = set()
+
+    def error(self, line_no, message):
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_no, message))
+
+
+def map_columns(header):
+    """
+    Column positions in header for each ledger field, or None if the row
+    doesn't look like a header (the file is then read in ledger order).
+    """
+    names = [h.strip().lower() for h in header]
+    positions = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                positions[field] = names.index(alias)
+                break
+    if "date" in positions and "amount" in positions:
+        return positions
+    return None
+
+
+class Normalizer:
+    """
+    Turns raw statement values into ledger values. Dates are memoized since
+    statements repeat the same few hundred dates across many rows.
+    """
+
+    def __init__(self):
+        self._dates = {}
+
+    def date(self, value):
+        value = value.strip()
+        cached = self._dates.get(value)
+        if cached is not None:
+            return cached
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"unrecognised date '{value}'")
+        self._dates[value] = parsed
+        return parsed
+
+    @staticmethod
+    def amount(value):
+        """
+        A statement amount as positive paise.
+        """
+        text = _AMOUNT_JUNK.sub("", value.strip())
+        if text.startswith("(") and text.endswith(")"):
+            text = text[1:-1]
+        if not text:
+            raise ValueError("missing amount")
+        amount = abs(to_paise(text))
+        if amount == 0:
+            raise ValueError("zero amount")
+        return amount
+
+
+def dedupe_key(date, amount, category, description, payment_mode):
+    """
+    Content key an expense is deduplicated on; import_expenses builds the
+    same key inline for already-normalized rows.
+    """
+    return (date, to_paise(amount), category.strip().lower(),
+            description.strip().lower(), payment_mode.strip().lower())
+
+
+def import_expenses(store, username, lines, dedupe=True, batch_size=DEFAULT_BATCH_SIZE, dry_run=False,
+                    categorizer=None):
+    """
+    Import expenses for username from an iterable of csv text lines (an open file).
+
+    With dedupe, a row is skipped when the user already has an identical entry
+    (same date, amount, category, description and mode). Duplicates are
+    counted, so importing a statement twice adds nothing while two identical
+    purchases on the same day in one statement are both kept.
+
+    With a categorizer, rows without a category get the one it suggests
+    (Other if none). Since a suggestion can change as the user's history
+    grows, those rows are deduplicated without comparing the category.
+    """
+    result = ImportResult()
+    normalize = Normalizer()
+    existing = {}
+    pending = {}
+    pending_count = 0
+
+    def seen_in(month):
+        """
+        Counters of the month's existing entries by dedupe key, and by the
+        key without its category.
+        """
+        counts = existing.get(month)
+        if counts is None:
+            keys = [dedupe_key(*row[:5]) for row in store.expense_rows(username, month)
+                    if len(row) >= 5 and _is_number(row[1])]
+            counts = existing[month] = (Counter(keys), Counter(key[:2] + key[3:] for key in keys))
+        return counts
+
+    def flush():
+        for month, expenses in pending.items():
+            if not dry_run:
+                store.add_expenses(username, month, [e.to_row() for e in expenses])
+            result.imported += len(expenses)
+        pending.clear()
+
+    reader = csv.reader(lines)
+    first = next(reader, None)
+    if first is None:
+        return result
+    positions = map_columns(first)
+    line_no = 1
+    if positions is None:
+        positions = {"date": 0, "amount": 1, "category": 2, "description": 3, "payment_mode": 4}
+        rows = itertools.chain([first], reader)
+        line_no = 0
+    else:
+        rows = reader
+    width = max(positions.values()) + 1
+
+    get_category = positions.get("category")
+    get_description = positions.get("description")
+    get_mode = positions.get("payment_mode")
+
+    for row in rows:
+        line_no += 1
+        if not row or not any(row):
+            continue
+        result.read += 1
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        try:
+            date = normalize.date(row[positions["date"]])
+            amount = normalize.amount(row[positions["amount"]])
+        except ValueError as e:
+            result.error(line_no, str(e))
+            continue
+        category = row[get_category].strip() if get_category is not None else ""
+        description = row[get_description].strip() if get_description is not None else ""
+        mode = (row[get_mode].strip() if get_mode is not None else "") or "Other"
+        guessed = not category and categorizer is not None
+        if guessed:
+            category = categorizer.category(description, mode, amount)
+            if category:
+                result.categorized += 1
+        category = category or "Other"
+
+        month = expense_month(date)
+        if dedupe:
+            key = (date, amount, category.lower(), description.lower(), mode.lower())
+            counts = seen_in(month)[guessed]
+            if guessed:
+                key = key[:2] + key[3:]
+            if counts[key] > 0:
+                counts[key] -= 1
+                result.duplicates += 1
+                continue
+
+        pending.setdefault(month, []).append(Expense(date, amount, category, description, mode))
+        result.months.add(month)
+        pending_count += 1
+        if pending_count >= batch_size:
+            flush()
+            pending_count = 0
+
+    flush()
+    return result
+
+
+def _is_number(value):
+    try:
+        to_paise(value)
+        return True
+    except ValueError:
+        return False
+
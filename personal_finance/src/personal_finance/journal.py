@@ -0,0 +1,144 @@
+"""
+Append-only change journals for the csv data files.
+
+A data file <name> may have a <name>.journal next to it holding changes that
+have not been folded into the file yet. Each journal line is a csv row:
+
+    U,<key>,<row values...>    insert or replace the rows with this key
+    D,<key>                    delete the rows with this key
+
+where <key> is a json list of strings. Readers apply the journal on top of
+the base file in order, so changing one row costs one short append instead
+of rewriting the whole file.
+
+compact() folds everything into a new base file. It never leaves the base
+half-written: the new base is written to <name>.compact and fsynced, the
+journal is renamed to <name>.journal.done, and only then is the base
+replaced. recover() finishes or rolls back a compaction that was
+interrupted at any of those steps.
+
+None of these functions lock; LedgerStore calls them while holding the
+data file's lock.
+"""
+import csv
+import io
+import json
+import os
+
+from personal_finance.fileio import fsync_dir, fsync_file
+
+
+UPSERT = "U"
+DELETE = "D"
+
+
+def journal_path(path):
+    return path.with_name(path.name + ".journal")
+
+
+def _compact_path(path):
+    return path.with_name(path.name + ".compact")
+
+
+def _done_path(path):
+    return path.with_name(path.name + ".journal.done")
+
+
+def read_journal(path, width):
+    """
+    Entries (op, key, row) of a data file's journal, oldest first.
+    Lines that are torn or garbled (e.g. by a crash mid-append) are skipped.
+    """
+    entries = []
+    try:
+        f = open(journal_path(path), "r", newline="")
+    except FileNotFoundError:
+        return entries
+    with f:
+        for line in csv.reader(f):
+            if len(line) < 2:
+                continue
+            try:
+                key = tuple(json.loads(line[1]))
+            except ValueError:
+                continue
+            if line[0] == UPSERT and len(line) == width + 2:
+                entries.append((UPSERT, key, line[2:]))
+            elif line[0] == DELETE and len(line) == 2:
+                entries.append((DELETE, key, None))
+    return entries
+
+
+def append_journal(path, entries):
+    """
+    Append (op, key, row) entries to a data file's journal in one write.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for op, key, row in entries:
+        if op == UPSERT:
+            writer.writerow([op, json.dumps(list(key))] + [str(v) for v in row])
+        else:
+            writer.writerow([op, json.dumps(list(key))])
+
+    jpath = journal_path(path)
+    prefix = ""
+    try:
+        with open(jpath, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # the previous append was cut short; don't glue onto it
+                    prefix = "\n"
+    except FileNotFoundError:
+        pass
+    with open(jpath, "a", newline="") as f:
+        f.write(prefix + buf.getvalue())
+        fsync_file(f)
+
+
+def compact(path, header, rows):
+    """
+    Make header + rows the new content of path and drop its journal.
+    """
+    compact_path = _compact_path(path)
+    with open(compact_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+        fsync_file(f)
+
+    jpath = journal_path(path)
+    done_path = _done_path(path)
+    if jpath.exists():
+        os.replace(jpath, done_path)
+    os.replace(compact_path, path)
+    fsync_dir(path.parent)
+    try:
+        os.unlink(done_path)
+    except FileNotFoundError:
+        pass
+
+
+def needs_recovery(path):
+    return _compact_path(path).exists() or _done_path(path).exists()
+
+
+def recover(path):
+    """
+    Clean up after a compaction of path that was interrupted by a crash.
+    """
+    compact_path = _compact_path(path)
+    done_path = _done_path(path)
+    if compact_path.exists():
+        if done_path.exists():
+            # journal already retired: the new base is the truth
+            os.replace(compact_path, path)
+            os.unlink(done_path)
+        else:
+            # journal still live: the old base plus journal is the truth
+            os.unlink(compact_path)
+    elif done_path.exists():
+        os.unlink(done_path)
+
@@ -1,14 +1,33 @@
 import os
+import sys
 import csv
+import json
 import re
-import hashlib
 from getpass import getpass
 from datetime import datetime
 from pathlib import Path
 
+from personal_finance import profiling
+from personal_finance.budgets import PERIOD_KINDS, PERIOD_LABELS, BudgetEngine, period_for
+from personal_finance.config import get_setting
+from personal_finance.fileio import file_signature
+from personal_finance.models import CategoryRule, Expense, RecurringRule, SavingsGoal, format_amount, to_paise
+from personal_finance.store import LedgerStore, ConcurrentUpdateError, BUDGET_HEADER, EXPENSE_DIR
+from personal_finance.store import LEGACY_BUDGET_HEADER, MONTHLY_BUDGET_HEADER
+from personal_finance.store import expense_id, expense_month, split_expense_id
+
 # Define data directory in user's home folder
 DATA_DIR = Path.home() / ".personal_finance_data"
 
+_store = None
+_alert_worker = None
+_categorizers = {}
+
+# data files whose header was found right, with their file_signature() then
+CHECKED_HEADERS_FILE = "checked_headers.json"
+# longest first line read when checking a header; a longer one isn't a header
+MAX_HEADER_BYTES = 4096
+
 def ensure_data_dir():
     if not DATA_DIR.exists():
         DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -17,150 +36,154 @@ def get_file_path(filename):
     ensure_data_dir()
     return DATA_DIR / filename
 
-def initialize_password_file():
-    header = ["username", "password"]
-    file_path = get_file_path("password.csv")
-    if not file_path.exists():
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
+def get_backend_name():
+    """
+    "csv" (default) or "sqlite", from PERSONAL_FINANCE_BACKEND or config.json's "backend".
+    """
+    return get_setting(DATA_DIR, "backend", "PERSONAL_FINANCE_BACKEND", "csv").lower()
 
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f.readlines()]
+def new_store(backend=None):
+    """
+    A new store for the data directory, e.g. for a thread that needs its own.
+    """
+    backend = backend or get_backend_name()
+    if backend == "sqlite":
+        from personal_finance.sqlite_store import SqliteStore
+        return SqliteStore(DATA_DIR)
+    if backend == "csv":
+        return LedgerStore(DATA_DIR)
+    raise SystemExit(f"Unknown storage backend '{backend}' (expected 'csv' or 'sqlite').")
+
+def get_store():
+    """
+    The session's store; every read and write of the data goes through it.
+    """
+    global _store
+    ensure_data_dir()
+    backend = get_backend_name()
+    if _store is None or _store.data_dir != DATA_DIR or _store.backend != backend:
+        _store = profiling.wrap_store(new_store(backend))
+    return _store
 
-    if len(lines) == 0:
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
+def load_checked_headers():
+    """
+    {file name: [mtime_ns, size]} of the data files whose header was found
+    right, as they were then (checked_headers.json), or {} if none were.
+    """
+    try:
+        with open(get_file_path(CHECKED_HEADERS_FILE), "r") as f:
+            checked = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return checked if isinstance(checked, dict) else {}
 
-    first_row = lines[0].split(",")
-    if first_row != header:
-        with open(file_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            for line in lines:
-                if line.strip():
-                    writer.writerow(line.split(","))
 
+def save_checked_headers(checked):
+    path = get_file_path(CHECKED_HEADERS_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checked, f)
+    os.replace(tmp_path, path)
 
-def initialize_userdata_file():
-    header = ["First Name", "Last Name", "Age", "Email", "Username"]
-    file_path = get_file_path("userdata.csv")
-    if not file_path.exists():
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
 
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f.readlines()]
+def check_header(filename, header, checked, create=True, keep=()):
+    """
+    Make sure a data file starts with header: a missing file is created with
+    just the header (unless not create), an empty one gets it, and one that
+    starts with anything else has it put in front of its lines. Only the
+    first line is read, and nothing at all if the file hasn't changed since
+    its header was found right (checked, updated here). A first row in keep
+    is left alone and returned; otherwise returns None.
+    """
+    file_path = get_file_path(filename)
+    signature = file_signature(file_path)
+    if signature is not None and checked.get(filename) == list(signature):
+        return None
+    if signature is None and not create:
+        checked.pop(filename, None)
+        return None
 
-    if len(lines) == 0:
+    first_line = ""
+    if signature is not None:
+        with open(file_path, "r") as f:
+            first_line = f.readline(MAX_HEADER_BYTES)
+    first_row = first_line.strip().split(",")
+    if not first_line:
         with open(file_path, "w", newline="") as f:
             csv.writer(f).writerow(header)
-        return
-
-    first_row = lines[0].split(",")
-    if first_row != header:
+    elif first_row in keep:
+        checked.pop(filename, None)
+        return first_row
+    elif first_row != header:
+        with open(file_path, "r") as f:
+            lines = [line.strip() for line in f.readlines()]
         with open(file_path, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(header)
             for line in lines:
                 if line.strip():
                     writer.writerow(line.split(","))
+    checked[filename] = list(file_signature(file_path))
+    return None
 
 
-def initialize_expense_file():
-    header = ["date", "amount", "category", "description", "payment_mode"]
-    file_path = get_file_path("expenses.csv")
-    if not file_path.exists():
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
-
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f.readlines()]
+def initialize_password_file(checked=None):
+    header = ["username", "password"]
+    check_header("password.csv", header, {} if checked is None else checked)
 
-    if len(lines) == 0:
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
 
-    first_row = lines[0].split(",")
-    if first_row != header:
-        with open(file_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            for line in lines:
-                if line.strip():
-                    writer.writerow(line.split(","))
+def initialize_userdata_file(checked=None):
+    header = ["First Name", "Last Name", "Age", "Email", "Username"]
+    check_header("userdata.csv", header, {} if checked is None else checked)
 
 
-def initialize_budget_file():
+def initialize_expense_file(checked=None):
     """
-    budget.csv columns:
-      username, year-month (YYYY-MM), budget_amount, alerted_50, alerted_80, alerted_exceeded
+    Expenses live in expenses/<user>/<YYYY-MM>.csv. An old shared expenses.csv
+    is only header-checked here; it is moved into partitions on login.
     """
-    header = ["username", "month", "budget_amount", "alerted_50", "alerted_80", "alerted_exceeded"]
-    file_path = get_file_path("budget.csv")
-    if not file_path.exists():
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
+    header = ["date", "amount", "category", "description", "payment_mode"]
+    get_file_path(EXPENSE_DIR).mkdir(exist_ok=True)
+    check_header("expenses.csv", header, {} if checked is None else checked, create=False)
 
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f.readlines()]
 
-    if len(lines) == 0:
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
+def initialize_budget_file(checked=None):
+    """
+    budget.csv columns:
+      username, period (YYYY-Www, YYYY-MM, YYYY-Qn or YYYY), category ('' for all
+      spending), budget_amount, rollover (yes/no), carried (amount brought over
+      from the period before), alerted (highest alert threshold shown, in percent)
+    """
+    if check_header("budget.csv", BUDGET_HEADER, {} if checked is None else checked,
+                    keep=(LEGACY_BUDGET_HEADER, MONTHLY_BUDGET_HEADER)):
+        # the store rewrites it in the current layout when it first reads it
+        LedgerStore(DATA_DIR).table("budget.csv")
 
-    first_row = lines[0].split(",")
-    if first_row != header:
-        with open(file_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            for line in lines:
-                if line.strip():
-                    writer.writerow(line.split(","))
 
-                    
-def initialize_savings_file():
+def initialize_savings_file(checked=None):
     """
     savings.csv columns:
       username, goal_id, goal_name, target_amount, current_amount, created_on
     """
     header = ["username", "goal_id", "goal_name", "target_amount", "current_amount", "created_on"]
-    file_path = get_file_path("savings.csv")
-    if not file_path.exists():
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
-
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f.readlines()]
-
-    if len(lines) == 0:
-        with open(file_path, "w", newline="") as f:
-            csv.writer(f).writerow(header)
-        return
-
-    first_row = lines[0].split(",")
-    if first_row != header:
-        with open(file_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            for line in lines:
-                if line.strip():
-                    writer.writerow(line.split(","))
+    check_header("savings.csv", header, {} if checked is None else checked)
 
 
+@profiling.action
 def initialize_all_files():
-    initialize_password_file()
-    initialize_userdata_file()
-    initialize_expense_file()
-    initialize_budget_file()
-    initialize_savings_file()
+    """
+    Create the data files that are missing and check the headers of the
+    others, skipping those unchanged since the last check.
+    """
+    checked = load_checked_headers()
+    before = dict(checked)
+    initialize_password_file(checked)
+    initialize_userdata_file(checked)
+    initialize_expense_file(checked)
+    initialize_budget_file(checked)
+    initialize_savings_file(checked)
+    if checked != before:
+        save_checked_headers(checked)
 
 
 def is_valid_name(name):
@@ -213,167 +236,127 @@ def get_input(prompt, validator_function):
         print()                    
 
 
+def get_password_scheme():
+    """
+    (scheme, cost) for new password hashes, from PERSONAL_FINANCE_PASSWORD_SCHEME /
+    PERSONAL_FINANCE_PASSWORD_COST or config.json's "password_scheme" / "password_cost".
+    ValueError if they can't be used.
+    """
+    from personal_finance import passwords
+
+    scheme = get_setting(DATA_DIR, "password_scheme", "PERSONAL_FINANCE_PASSWORD_SCHEME",
+                         passwords.default_scheme())
+    cost = get_setting(DATA_DIR, "password_cost", "PERSONAL_FINANCE_PASSWORD_COST")
+    return scheme, passwords.check_cost(scheme, cost or passwords.default_cost(scheme))
+
+
+def check_password_settings():
+    """
+    An error message if the configured password scheme or cost can't be
+    used, else None. Checked at startup, so a bad setting isn't first
+    noticed in the middle of a login; the hashing module is only loaded
+    when something is configured.
+    """
+    if get_setting(DATA_DIR, "password_scheme", "PERSONAL_FINANCE_PASSWORD_SCHEME") is None and \
+            get_setting(DATA_DIR, "password_cost", "PERSONAL_FINANCE_PASSWORD_COST") is None:
+        return None
+    try:
+        get_password_scheme()
+    except ValueError as e:
+        return f"Invalid password setting: {e}."
+    return None
+
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    from personal_finance import passwords
 
-def username_exists(username):
-    file_path = get_file_path("password.csv")
-    if not file_path.exists():
+    scheme, cost = get_password_scheme()
+    return passwords.hash_password(password, scheme, cost)
+
+
+@profiling.action
+def check_password(username, password):
+    """
+    True if password is the user's. A hash in an older form (unsalted
+    SHA-256, or a lower cost than configured) is replaced by a new one on
+    success.
+    """
+    from personal_finance import passwords
+
+    store = get_store()
+    stored = store.password_hash(username)
+    if not passwords.verify_password(password, stored):
         return False
-    with open(file_path, "r") as f:
-        for row in csv.reader(f):
-            if row and row[0] == username:
-                return True
-    return False
+    scheme, cost = get_password_scheme()
+    if passwords.needs_rehash(stored, scheme, cost):
+        store.set_password(username, passwords.hash_password(password, scheme, cost))
+    return True
+
+def username_exists(username):
+    return get_store().user_exists(username)
 
 
 def get_current_month():
     return datetime.now().strftime("%Y-%m")
 
 
-def read_user_budget(username, month=None):
-    """
-    Return a dict for the user's budget for the given month or None.
-    dict keys: month, budget_amount(float), alerted_50, alerted_80, alerted_exceeded
-    """
-    if month is None:
-        month = get_current_month()
+def get_today():
+    return datetime.now().strftime("%Y-%m-%d")
 
-    file_path = get_file_path("budget.csv")
-    if not file_path.exists():
-        return None
 
-    with open(file_path, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get("username") == username and row.get("month") == month:
-                try:
-                    return {
-                        "month": row["month"],
-                        "budget_amount": float(row["budget_amount"]),
-                        "alerted_50": row.get("alerted_50", "no"),
-                        "alerted_80": row.get("alerted_80", "no"),
-                        "alerted_exceeded": row.get("alerted_exceeded", "no"),
-                    }
-                except:
-                    return None
-    return None
+def get_budget_engine():
+    return BudgetEngine(get_store())
 
 
-def write_user_budget(username, month, budget_amount,
-                      alerted_50="no", alerted_80="no", alerted_exceeded="no"):
+def read_user_budget(username, period=None, category=""):
     """
-    Upsert the user's budget for a month.
+    Return the user's Budget (amounts in paise) for the given period
+    (default: this month), and category if given, or None. A period without
+    a budget of its own continues an earlier rollover budget.
     """
-    rows = []
-    header = ["username", "month", "budget_amount", "alerted_50", "alerted_80", "alerted_exceeded"]
-    file_path = get_file_path("budget.csv")
+    if period is None:
+        period = get_current_month()
+    return get_budget_engine().budget(username, period, category)
 
-    if file_path.exists():
-        with open(file_path, "r") as f:
-            rows = list(csv.reader(f))
-
-    found = False
-    new_rows = []
-    if rows:
-        new_rows.append(rows[0])
-        for r in rows[1:]:
-            if len(r) >= 2 and r[0] == username and r[1] == month:
-                new_rows.append([username, month, str(budget_amount), alerted_50, alerted_80, alerted_exceeded])
-                found = True
-            else:
-                new_rows.append(r)
-    if not rows:
-        new_rows.append(header)
 
-    if not found:
-        new_rows.append([username, month, str(budget_amount), alerted_50, alerted_80, alerted_exceeded])
-
-    with open(file_path, "w", newline="") as f:
-        csv.writer(f).writerows(new_rows)
+def write_user_budget(username, period, amount, category="", rollover=False):
+    """
+    Set the user's budget for period and category, carrying over from the
+    period before if that one rolls over; returns the Budget.
+    """
+    return get_budget_engine().set_budget(username, period, amount, category, rollover)
 
 
 def get_user_savings_goals(username):
     """
-    Return list of goals as dicts:
-    {goal_id (int), goal_name, target_amount(float), current_amount(float), created_on}
-    """
-    goals = []
-    file_path = get_file_path("savings.csv")
-    if not file_path.exists():
-        return goals
-
-    with open(file_path, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get("username") == username:
-                try:
-                    goals.append({
-                        "goal_id": int(row.get("goal_id", "0")),
-                        "goal_name": row.get("goal_name"),
-                        "target_amount": float(row.get("target_amount", "0")),
-                        "current_amount": float(row.get("current_amount", "0")),
-                        "created_on": row.get("created_on")
-                    })
-                except:
-                    pass
-    return goals
+    Return the user's goals as a list of SavingsGoal (amounts in paise).
+    """
+    return get_store().goals(username)
 
 
 def write_user_savings_goals(username, goals_list):
     """
-    goals_list: list of dicts with keys goal_id, goal_name, target_amount, current_amount, created_on
+    goals_list: list of SavingsGoal.
     This overwrites the user's goals entries in savings.csv (keeps other users intact).
     """
-    rows = []
-    header = ["username", "goal_id", "goal_name", "target_amount", "current_amount", "created_on"]
-    file_path = get_file_path("savings.csv")
+    get_store().put_goals(username, goals_list, datetime.now().date().isoformat())
 
-    if file_path.exists():
-        with open(file_path, "r") as f:
-            rows = list(csv.reader(f))
-
-    new_rows = []
-    if rows:
-        new_rows.append(rows[0])
-        for r in rows[1:]:
-            if r and r[0] != username:
-                new_rows.append(r)
-    else:
-        new_rows.append(header)
-
-    for g in goals_list:
-        new_rows.append([
-            username,
-            str(g["goal_id"]),
-            g["goal_name"],
-            str(g["target_amount"]),
-            str(g["current_amount"]),
-            g.get("created_on", datetime.now().date().isoformat())
-        ])
 
-    with open(file_path, "w", newline="") as f:
-        csv.writer(f).writerows(new_rows)
+def update_user_savings_goals(username, change):
+    """
+    change(goals) edits the user's goal list in place; it is re-run on a fresh
+    copy if another session changes savings.csv at the same time.
+    """
+    get_store().modify_goals(username, change, datetime.now().date().isoformat())
 
 
+@profiling.action
 def change_password(username):
     print("\n--- CHANGE PASSWORD ---\n")
 
     old_pw = getpass("Enter current password: ")
-    encrypted_old = hash_password(old_pw)
-
-    valid = False
-    rows = []
-    file_path = get_file_path("password.csv")
-    with open(file_path, "r") as f:
-        rows = list(csv.reader(f))
 
-    for row in rows:
-        if row and row[0] == username and row[1] == encrypted_old:
-            valid = True
-            break
-
-    if not valid:
+    if not check_password(username, old_pw):
         print("Incorrect current password.\n")
         return
 
@@ -394,124 +377,186 @@ def change_password(username):
 
     encrypted_new = hash_password(new_pw)
 
-    new_rows = []
-    for row in rows:
-        if row and row[0] == username:
-            new_rows.append([username, encrypted_new])
-        else:
-            new_rows.append(row)
-
-    with open(file_path, "w", newline="") as f:
-        csv.writer(f).writerows(new_rows)
+    get_store().set_password(username, encrypted_new)
 
     print("Password successfully changed!\n")
 
 
 
+@profiling.action
 def set_or_update_budget(username):
-    print("\n--- SET / UPDATE MONTHLY BUDGET ---\n")
-    month = get_current_month()
-
-    existing = read_user_budget(username, month)
+    print("\n--- SET / UPDATE BUDGET ---\n")
+    engine = get_budget_engine()
+    existing = engine.in_effect(username, get_today())
     if existing:
-        print(f"Current budget for {month}: ₹{existing['budget_amount']}")
+        print("Budgets in effect today:")
+        for budget in existing:
+            left = engine.carry(username, budget)
+            print(f"  {budget.period:<9} {budget.category or 'All spending':<15} "
+                  f"₹{format_amount(budget.available)}  (₹{format_amount(left)} left)")
     else:
-        print(f"No budget set for {month} yet.")
+        print("No budget in effect today.")
+
+    for i, kind in enumerate(PERIOD_KINDS, start=1):
+        print(f"{i}. {PERIOD_LABELS[kind].capitalize()}")
+    choice = input("Period (default: 2): ").strip() or "2"
+    if choice not in ("1", "2", "3", "4"):
+        print("Invalid choice.\n")
+        return
+    kind = PERIOD_KINDS[int(choice) - 1]
+    period = period_for(get_today(), kind)
+
+    category = input("Category (leave blank for all spending): ").strip()
 
     while True:
-        amount = input("Enter monthly budget amount: ").strip()
+        amount = input(f"Enter {PERIOD_LABELS[kind]} budget amount: ").strip()
         try:
-            amount = float(amount)
+            amount = to_paise(amount)
             if amount <= 0:
                 print("Budget must be greater than zero.")
                 continue
             break
-        except:
+        except ValueError:
             print("Enter a valid number.")
 
-    write_user_budget(
-        username,
-        month,
-        amount,
-        alerted_50="no",
-        alerted_80="no",
-        alerted_exceeded="no"
-    )
+    rollover = input("Carry what is left over to the next period? (y/n): ").strip().lower() == "y"
+
+    budget = write_user_budget(username, period, amount, category, rollover)
 
-    print(f"Budget for {month} set to ₹{amount}\n")
+    label = f"{category} budget" if category else "Budget"
+    print(f"{label} for {period} set to ₹{format_amount(amount)}")
+    if budget.carried:
+        print(f"Carried over from the last period: ₹{format_amount(budget.carried)}")
+    print()
 
 
-def calculate_monthly_spending(username):
-    month = get_current_month()
-    total = 0.0
-    file_path = get_file_path("expenses.csv")
+def calculate_monthly_spending(username, month=None):
+    """
+    The user's spending in a month (default: this one), in paise.
+    """
+    if month is None:
+        month = get_current_month()
+    return get_store().monthly_total(username, month)
+
 
-    if not file_path.exists():
-        return 0.0
+def get_alert_thresholds():
+    """
+    Budget alert thresholds in percent, from PERSONAL_FINANCE_ALERT_THRESHOLDS
+    or config.json's "alert_thresholds" (default 50, 80, 100).
+    """
+    from personal_finance import alerts
 
-    with open(file_path, "r") as f:
-        rows = list(csv.reader(f))
+    value = get_setting(DATA_DIR, "alert_thresholds", "PERSONAL_FINANCE_ALERT_THRESHOLDS",
+                        alerts.DEFAULT_THRESHOLDS)
+    try:
+        return alerts.parse_thresholds(value)
+    except (TypeError, ValueError):
+        return alerts.DEFAULT_THRESHOLDS
 
-    for row in rows[1:]:
-        if len(row) < 2:
-            continue
-        date_str = row[0]
-        try:
-            amount = float(row[1])
-        except:
-            continue
 
-        if date_str.startswith(month):
-            total += amount
+def get_alert_worker():
+    """
+    The session's background alert checker, started on first use.
+    """
+    global _alert_worker
+    if _alert_worker is None:
+        from personal_finance import alerts
+        _alert_worker = alerts.AlertWorker(new_store, get_alert_thresholds())
+    return _alert_worker
 
-    return total
 
+def queue_budget_alerts(username, date=None, category=None):
+    """
+    Have the alert worker check the user's budgets that an expense on date
+    (default: today) in category counts against, or every budget in effect
+    on date if category is None; its messages are printed by
+    print_budget_alerts().
+    """
+    get_alert_worker().notify(username, date or get_today(), category)
 
-def check_budget_alerts(username):
-    month = get_current_month()
-    budget = read_user_budget(username, month)
 
-    if not budget:
+def print_budget_alerts(wait=False):
+    """
+    Print the alerts the worker has found so far; with wait, first let it
+    finish what is queued.
+    """
+    if _alert_worker is None:
         return
+    if wait:
+        _alert_worker.flush()
+    for message in _alert_worker.take_messages():
+        print(message)
 
-    spent = calculate_monthly_spending(username)
-    limit = budget["budget_amount"]
 
-    if limit <= 0:
-        return
+def update_budget_alerts(username, changes=None):
+    """
+    Check the user's budgets that changes, (date, category) pairs, count
+    against now (default: every budget in effect today), record the
+    thresholds newly crossed and return the alert messages for them.
+    """
+    from personal_finance import alerts
+
+    return alerts.check_budgets(get_store(), username, changes or [(get_today(), None)],
+                                get_alert_thresholds())
 
-    a50 = budget.get("alerted_50", "no")
-    a80 = budget.get("alerted_80", "no")
-    a100 = budget.get("alerted_exceeded", "no")
 
-    percent = (spent / limit) * 100
+def get_auto_category():
+    """
+    How expenses without a category get one (categorize.py), from
+    PERSONAL_FINANCE_AUTO_CATEGORY or config.json's "auto_category":
+    "learn" (default), "rules" or "off".
+    """
+    from personal_finance import categorize
 
-    updated = False
+    value = str(get_setting(DATA_DIR, "auto_category", "PERSONAL_FINANCE_AUTO_CATEGORY",
+                            categorize.AUTO_LEARN)).strip().lower()
+    return value if value in categorize.AUTO_CATEGORY_MODES else categorize.AUTO_LEARN
 
-    if percent >= 50 and a50 == "no":
-        print("You have crossed 50% of your monthly budget!")
-        budget["alerted_50"] = "yes"
-        updated = True
 
-    if percent >= 80 and a80 == "no":
-        print("You have crossed 80% of your monthly budget!")
-        budget["alerted_80"] = "yes"
-        updated = True
+def get_categorizer(username):
+    """
+    The user's Categorizer, built on first use and kept for the session
+    until their rules change; None if automatic categories are off.
+    """
+    from personal_finance import categorize
+
+    mode = get_auto_category()
+    if mode == categorize.AUTO_OFF:
+        return None
+    key = (str(DATA_DIR), username, mode)
+    categorizer = _categorizers.get(key)
+    if categorizer is None:
+        categorizer = _categorizers[key] = categorize.Categorizer.load(
+            get_store(), username, learn=mode == categorize.AUTO_LEARN)
+    return categorizer
+
+
+def add_category_rule(username, pattern, category, payment_mode="", min_amount=None, max_amount=None):
+    """
+    Store a new category rule for the user and return it; ValueError if it
+    isn't valid (categorize.check_rule).
+    """
+    from personal_finance import categorize
+
+    rule = CategoryRule(None, pattern.strip(), category.strip(), payment_mode.strip(), min_amount, max_amount)
+    categorize.check_rule(rule)
+    get_store().add_category_rule(username, rule)
+    _forget_categorizers(username)
+    return rule
+
+
+def delete_category_rule(username, rule_id):
+    """
+    Remove one of the user's category rules; False if there was no such rule.
+    """
+    deleted = get_store().delete_category_rule(username, rule_id)
+    _forget_categorizers(username)
+    return deleted
 
-    if percent >= 100 and a100 == "no":
-        print("You have EXCEEDED your monthly budget!")
-        budget["alerted_exceeded"] = "yes"
-        updated = True
 
-    if updated:
-        write_user_budget(
-            username,
-            month,
-            budget["budget_amount"],
-            budget["alerted_50"],
-            budget["alerted_80"],
-            budget["alerted_exceeded"]
-        )
+def _forget_categorizers(username):
+    for key in [k for k in _categorizers if k[1] == username]:
+        del _categorizers[key]
 
 
 def create_savings_goal(username):
@@ -521,31 +566,36 @@ def create_savings_goal(username):
     while True:
         target = input("Enter target amount: ").strip()
         try:
-            target = float(target)
+            target = to_paise(target)
             if target <= 0:
                 print("Target must be greater than zero.")
                 continue
             break
-        except:
+        except ValueError:
             print("Enter a valid number.")
 
-    goals = get_user_savings_goals(username)
+    add_savings_goal(username, goal_name, target)
 
-    new_id = 1
-    if goals:
-        new_id = max(g["goal_id"] for g in goals) + 1
+    print(f"Savings goal '{goal_name}' created with target ₹{format_amount(target)}\n")
 
-    goals.append({
-        "goal_id": new_id,
-        "goal_name": goal_name,
-        "target_amount": target,
-        "current_amount": 0.0,
-        "created_on": datetime.now().strftime("%Y-%m-%d")
-    })
 
-    write_user_savings_goals(username, goals)
+def add_savings_goal(username, goal_name, target):
+    """
+    Append a new goal (target in paise) with the next free id and return it.
+    """
+    created = []
 
-    print(f"Savings goal '{goal_name}' created with target ₹{target}\n")
+    def add_goal(goals):
+        new_id = 1
+        if goals:
+            new_id = max(g.goal_id for g in goals) + 1
+
+        goal = SavingsGoal(new_id, goal_name, target, 0, datetime.now().strftime("%Y-%m-%d"))
+        goals.append(goal)
+        created[:] = [goal]
+
+    update_user_savings_goals(username, add_goal)
+    return created[0]
 
 
 def view_savings_goals(username):
@@ -557,11 +607,11 @@ def view_savings_goals(username):
         return
 
     for g in goals:
-        print(f"ID: {g['goal_id']}")
-        print(f"Goal Name: {g['goal_name']}")
-        print(f"Target: ₹{g['target_amount']}")
-        print(f"Saved: ₹{g['current_amount']}")
-        print(f"Remaining: ₹{g['target_amount'] - g['current_amount']}")
+        print(f"ID: {g.goal_id}")
+        print(f"Goal Name: {g.name}")
+        print(f"Target: ₹{format_amount(g.target)}")
+        print(f"Saved: ₹{format_amount(g.saved)}")
+        print(f"Remaining: ₹{format_amount(g.remaining)}")
         print("-----------------------------")
 
 
@@ -574,7 +624,7 @@ def add_money_to_savings(username):
         return
 
     for g in goals:
-        print(f"{g['goal_id']}. {g['goal_name']} — Saved ₹{g['current_amount']} / ₹{g['target_amount']}")
+        print(f"{g.goal_id}. {g.name} — Saved ₹{format_amount(g.saved)} / ₹{format_amount(g.target)}")
 
     while True:
         try:
@@ -585,7 +635,7 @@ def add_money_to_savings(username):
 
     selected = None
     for g in goals:
-        if g["goal_id"] == goal_id:
+        if g.goal_id == goal_id:
             selected = g
             break
 
@@ -596,20 +646,24 @@ def add_money_to_savings(username):
     while True:
         amount = input("Enter amount to add: ").strip()
         try:
-            amount = float(amount)
+            amount = to_paise(amount)
             if amount <= 0:
                 print("Enter a positive number.")
                 continue
             break
-        except:
+        except ValueError:
             print("Invalid amount.")
 
-    selected["current_amount"] += amount
+    def add_money(goals):
+        for g in goals:
+            if g.goal_id == goal_id:
+                g.saved += amount
+                selected.saved = g.saved
 
-    write_user_savings_goals(username, goals)
+    update_user_savings_goals(username, add_money)
 
-    print(f"Added ₹{amount} to '{selected['goal_name']}'")
-    print(f"Progress: ₹{selected['current_amount']} / ₹{selected['target_amount']}\n")
+    print(f"Added ₹{format_amount(amount)} to '{selected.name}'")
+    print(f"Progress: ₹{format_amount(selected.saved)} / ₹{format_amount(selected.target)}\n")
 
 
 def delete_savings_goal(username):
@@ -621,7 +675,7 @@ def delete_savings_goal(username):
         return
 
     for g in goals:
-        print(f"{g['goal_id']}. {g['goal_name']} (Saved ₹{g['current_amount']})")
+        print(f"{g.goal_id}. {g.name} (Saved ₹{format_amount(g.saved)})")
 
     while True:
         try:
@@ -630,13 +684,15 @@ def delete_savings_goal(username):
         except:
             print("Invalid ID.")
 
-    new_goals = [g for g in goals if g["goal_id"] != goal_id]
+    def remove_goal(goals):
+        goals[:] = [g for g in goals if g.goal_id != goal_id]
 
-    write_user_savings_goals(username, new_goals)
+    update_user_savings_goals(username, remove_goal)
 
     print("Goal deleted successfully.\n")
 
 
+@profiling.action
 def savings_menu(username):
     """ Sub-menu for savings feature """
     while True:
@@ -663,160 +719,344 @@ def savings_menu(username):
             print("Invalid choice.\n")
 
 
+@profiling.action
 def export_expenses(username):
     print("\n--- EXPORT EXPENSES ---\n")
 
+    from personal_finance.exporter import export_expenses as write_export
+
     export_name = get_file_path(f"exported_expenses_{username}.csv")
-    file_path = get_file_path("expenses.csv")
+    store = get_store()
 
-    if not file_path.exists():
+    if not store.expense_months(username):
         print("No expenses found.\n")
         return
 
-    with open(file_path, "r") as f:
-        rows = list(csv.reader(f))
-
-    header = rows[0]
-    user_rows = [header]
-
-    user_rows.extend(rows[1:])
-
-    with open(export_name, "w", newline="") as f:
-        csv.writer(f).writerows(user_rows)
-
+    # a full export each time, so edits and deletions since the last one show up
+    # (personal-finance export --incremental appends only the new rows)
+    write_export(store, username, export_name)
     print(f"Expenses successfully exported to {export_name}\n")
 
 
+@profiling.action
 def add_expense(username):
     print("\n--- ADD NEW EXPENSE ---")
 
     while True:
         amount = input("Enter amount: ").strip()
         try:
-            amount = float(amount)
+            amount = to_paise(amount)
             break
-        except:
+        except ValueError:
             print("Enter a valid number.")
 
-    category = input("Enter category (Food/Travel/Shopping/Bills/Other): ").strip()
+    category = input("Enter category (Food/Travel/Shopping/Bills/Other, Enter to guess): ").strip()
     description = input("Enter description: ").strip()
     payment = input("Enter payment mode (Cash/UPI/Card): ").strip()
-    date = datetime.now().strftime("%Y-%m-%d")
 
-    file_path = get_file_path("expenses.csv")
-    with open(file_path, "a", newline="") as f:
-        csv.writer(f).writerow([date, amount, category, description, payment])
+    eid, expense = record_expense(username, amount, category, description, payment)
 
+    if not category:
+        print(f"Category: {expense.category}")
     print("Expense added.\n")
 
-    check_budget_alerts(username)
+    queue_budget_alerts(username, expense.date, expense.category)
 
+    repeat = input("Repeat it every month or week? (m/w, Enter for no): ").strip().lower()
+    if repeat in ("m", "w"):
+        schedule = "monthly" if repeat == "m" else "weekly"
+        add_recurring_expense(username, expense, schedule)
+        print(f"It will be added {schedule} from now on.\n")
 
-def view_expenses(username):
-    print("\n--- ALL EXPENSES ---")
-    file_path = get_file_path("expenses.csv")
 
-    if not file_path.exists():
-        print("No expenses found.\n")
-        return
+def add_recurring_expense(username, expense, schedule, start=None, end=""):
+    """
+    Make expense repeat on schedule (see recurring.py) from start, and
+    return the RecurringRule. Without start the rule starts at the
+    expense's own date, which counts as already posted.
+    """
+    from personal_finance import recurring
 
-    with open(file_path, "r") as f:
-        rows = list(csv.reader(f))
+    rule = RecurringRule(None, expense.amount, expense.category, expense.description, expense.payment_mode,
+                         schedule, start or expense.date, end, "" if start else expense.date)
+    recurring.check_rule(rule)
+    get_store().add_rule(username, rule)
+    return rule
 
-    if len(rows) <= 1:
-        print("No expenses recorded yet.\n")
-        return
 
-    print("\n#   DATE         AMOUNT   CATEGORY     DESCRIPTION      MODE")
-    print("----------------------------------------------------------------")
+@profiling.action
+def post_recurring_expenses(username=None, today=None):
+    """
+    Add every recurring expense that has come due up to today (YYYY-MM-DD,
+    default: the real one), for one user or all of them. Returns the run's
+    counts and rows (recurring.run_due).
+    """
+    from personal_finance import recurring
 
-    for i, row in enumerate(rows[1:], start=1):
-        if len(row) < 5:
-            continue
-        date, amt, cat, desc, mode = row
-        print(f"{i}.  {date:<12} {amt:<8} {cat:<12} {desc:<15} {mode}")
+    return recurring.run_due(get_store(), today or get_today(), username)
 
 
+def record_expense(username, amount, category, description, payment, date=None):
+    """
+    Store one expense (amount in paise, dated today unless date is given)
+    and return (expense id, Expense). Without a category it gets the one
+    the user's rules or history suggest, or Other.
+    """
+    if date is None:
+        date = datetime.now().strftime("%Y-%m-%d")
+    if not category:
+        categorizer = get_categorizer(username)
+        category = (categorizer and categorizer.category(description, payment, amount)) or "Other"
+    expense = Expense(date, amount, category, description, payment)
+    key = get_store().add_expense(username, expense.to_row())
+    return expense_id(expense_month(date), key), expense
 
-def edit_delete_expense(username):
-    print("\n--- EDIT/DELETE EXPENSE ---")
-    file_path = get_file_path("expenses.csv")
 
-    if not file_path.exists():
-        print("No expenses found.\n")
-        return
+def get_page_size():
+    """
+    Rows per page in the expense viewer, from PERSONAL_FINANCE_PAGE_SIZE or config.json's "page_size".
+    """
+    from personal_finance.viewer import DEFAULT_PAGE_SIZE
 
-    with open(file_path, "r") as f:
-        rows = list(csv.reader(f))
+    try:
+        return max(1, int(get_setting(DATA_DIR, "page_size", "PERSONAL_FINANCE_PAGE_SIZE", DEFAULT_PAGE_SIZE)))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
 
-    if len(rows) <= 1:
-        print("No expenses to modify.\n")
-        return
 
-    for i, row in enumerate(rows[1:], start=1):
-        print(f"{i}. {row}")
+def ask_optional_date(prompt):
+    while True:
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            print("Enter a date as YYYY-MM-DD, or leave blank.")
+
+
+def ask_expense_filter():
+    from personal_finance.viewer import ExpenseFilter
+
+    print("Leave a field blank to match anything.")
+    date_from = ask_optional_date("From date (YYYY-MM-DD): ")
+    date_to = ask_optional_date("To date (YYYY-MM-DD): ")
+    category = input("Category: ").strip()
+    payment_mode = input("Payment mode: ").strip()
+    return ExpenseFilter(date_from, date_to, category, payment_mode)
+
+
+def browse_expenses(username, select=False):
+    """
+    Page through the user's expenses with optional filters. With select=True
+    the user picks a row and its (month, key, row) is returned; None if they
+    quit without choosing.
+    """
+    from personal_finance.viewer import ExpensePager
+
+    page_size = get_page_size()
+    pager = ExpensePager(get_store(), username, page_size=page_size)
+
+    if not pager.months:
+        print("No expenses recorded yet.\n")
+        return None
 
+    number = 1
+    while True:
+        entries = pager.page(number)
+        if not entries and number > 1:
+            number = min(number - 1, pager.page_count())
+            continue
+
+        print("\n#   ID           DATE         AMOUNT   CATEGORY     DESCRIPTION      MODE")
+        print("-----------------------------------------------------------------------------")
+        for i, month, key, row in entries:
+            date, amt, cat, desc, mode = row[:5]
+            print(f"{i}.  {expense_id(month, key):<12} {date:<12} {amt:<8} {cat:<12} {desc:<15} {mode}")
+        if not entries:
+            print("No matching expenses.")
+
+        pages = pager.page_count(exact=False)
+        label = f"Page {number} of {pages}" if pages else f"Page {number}"
+        print(f"{label} ({pager.filter.describe()})")
+        print("n = next, p = previous, g = go to page, f = filter, s = search, q = "
+              + ("cancel, or enter a row # or ID to choose it" if select else "back"))
+
+        command = input("> ").strip().lower()
+        if command in ("", "n"):
+            number += 1
+        elif command == "p":
+            number = max(1, number - 1)
+        elif command == "g":
+            try:
+                number = max(1, int(input("Page: ").strip()))
+            except ValueError:
+                print("Invalid page.")
+        elif command == "f":
+            pager = ExpensePager(get_store(), username, ask_expense_filter(), page_size)
+            number = 1
+        elif command == "s":
+            chosen = search_menu(username, page_size, select)
+            if chosen:
+                return chosen
+        elif command == "q":
+            return None
+        elif select and command.isdigit():
+            chosen = [e for e in entries if e[0] == int(command)]
+            if chosen:
+                return chosen[0][1:]
+            print("Pick a row number shown on this page.")
+        elif select and "/" in command:
+            chosen = find_expense(username, command)
+            if chosen:
+                return chosen
+            print("No expense with that ID.")
+        else:
+            print("Invalid choice.")
+
+
+def search_menu(username, limit, select=False):
+    """
+    Ask for words and show the user's best matching expenses. With
+    select=True one can be chosen; its (month, key, row) is returned.
+    """
+    from personal_finance.search import search_expenses
+
+    query = input("Search for: ").strip()
     try:
-        choice = int(input("Choose index: "))
-    except:
-        print("Invalid input.\n")
-        return
+        found = search_expenses(get_store(), username, query, limit=limit)
+    except ValueError as e:
+        print(f"Please {e}.")
+        return None
+    results = found["results"]
+    if not results:
+        print("No matching expenses.")
+        return None
 
-    if choice < 1 or choice >= len(rows):
-        print("Invalid index.\n")
-        return
+    print("\n#   ID           DATE         AMOUNT   CATEGORY     DESCRIPTION      MODE")
+    print("-----------------------------------------------------------------------------")
+    for i, (score, eid, row) in enumerate(results, 1):
+        date, amt, cat, desc, mode = row[:5]
+        print(f"{i}.  {eid:<12} {date:<12} {amt:<8} {cat:<12} {desc:<15} {mode}")
+    print(f"Best {len(results)} of {found['matches']} matches for '{query}'")
+    if not select:
+        return None
 
-    entry = rows[choice]
-    date, amt, cat, desc, mode = entry  
+    choice = input("Enter a row # or ID to choose it, or press Enter to go back: ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(results):
+        choice = results[int(choice) - 1][1]
+    if choice:
+        chosen = find_expense(username, choice)
+        if chosen:
+            return chosen
+        print("No expense with that ID.")
+    return None
 
 
-    print("1. Edit")
-    print("2. Delete")
+def find_expense(username, value):
+    """
+    (month, key, row) of the expense with this id, or None.
+    """
+    try:
+        month, key = split_expense_id(value)
+    except ValueError:
+        return None
+    row = get_store().get_expense(username, month, key)
+    if row is None:
+        return None
+    return month, key, row
 
-    action = input("Choose: ").strip()
 
-    if action == "2":
-        rows.pop(choice)
-        print("Expense deleted.\n")
+@profiling.action
+def view_expenses(username):
+    print("\n--- ALL EXPENSES ---")
+    browse_expenses(username)
 
-    elif action == "1":
-        amt2 = input(f"Amount ({amt}): ").strip() or amt
-        cat2 = input(f"Category ({cat}): ").strip() or cat
-        desc2 = input(f"Description ({desc}): ").strip() or desc
-        mode2 = input(f"Payment ({mode}): ").strip() or mode
 
-        rows[choice] = [date, amt2, cat2, desc2, mode2]
-        print("✔ Expense updated.\n")
+@profiling.action
+def edit_delete_expense(username):
+    print("\n--- EDIT/DELETE EXPENSE ---")
+    store = get_store()
+    chosen = browse_expenses(username, select=True)
+
+    if chosen is None:
+        return
 
-    with open(file_path, "w", newline="") as f:
-        csv.writer(f).writerows(rows)
+    month, key, entry = chosen
+    date, amt, cat, desc, mode = entry
 
+    print("1. Edit")
+    print("2. Delete")
 
+    action = input("Choose: ").strip()
 
+    try:
+        if action == "2":
+            store.delete_expense(username, month, key, expected=entry)
+            print("Expense deleted.\n")
+
+        elif action == "1":
+            amt2 = input(f"Amount ({amt}): ").strip() or amt
+            try:
+                amt2 = format_amount(to_paise(amt2))
+            except ValueError:
+                print("Invalid amount.\n")
+                return
+            cat2 = input(f"Category ({cat}): ").strip() or cat
+            desc2 = input(f"Description ({desc}): ").strip() or desc
+            mode2 = input(f"Payment ({mode}): ").strip() or mode
+
+            store.update_expense(username, month, key, [date, amt2, cat2, desc2, mode2], expected=entry)
+            print("✔ Expense updated.\n")
+            queue_budget_alerts(username, date, cat2)
+    except ConcurrentUpdateError as e:
+        print(f"{e} Nothing was changed; please try again.\n")
+
+
+
+def get_monthly_summary(username, month=None):
+    """
+    Return a dict: month, spent, budget (None if not set), remaining,
+    categories {name: total}; amounts in paise.
+    """
+    if month is None:
+        month = get_current_month()
+    spent = calculate_monthly_spending(username, month)
+    budget = read_user_budget(username, month)
+    limit = budget.available if budget else None
+    return {
+        "month": month,
+        "spent": spent,
+        "budget": limit,
+        "remaining": limit - spent if limit is not None else None,
+        "categories": {c: t for c, (t, n) in get_store().category_totals(username, month).items()},
+    }
+
+
+@profiling.action
 def monthly_summary(username):
     print("\n--- MONTHLY SUMMARY ---")
-    month = get_current_month()
-    spent = calculate_monthly_spending(username)
+    summary = get_monthly_summary(username)
 
-    print(f"Total spent in {month}: ₹{spent}")
+    print(f"Total spent in {summary['month']}: ₹{format_amount(summary['spent'])}")
 
-    budget = read_user_budget(username, month)
-    if budget:
-        remaining = budget["budget_amount"] - spent
-        print(f"Budget: ₹{budget['budget_amount']}")
-        print(f"Remaining: ₹{remaining}\n")
+    if summary["budget"] is not None:
+        print(f"Budget: ₹{format_amount(summary['budget'])}")
+        print(f"Remaining: ₹{format_amount(summary['remaining'])}\n")
     else:
         print("No budget set for this month.\n")
 
 
 def finance_menu(username):
     while True:
+        # alerts from expenses added earlier, checked in the background
+        print_budget_alerts()
         print("\n===== FINANCE MENU =====")
         print("1. Add a new expense")
         print("2. View expenses")
         print("3. Edit/Delete an expense")
         print("4. View monthly summary")
-        print("5. Set or update monthly budget")
+        print("5. Set or update a budget")
         print("6. Savings goals")
         print("7. Export expenses to CSV")
         print("8. Change Password")
@@ -841,13 +1081,58 @@ def finance_menu(username):
         elif choice == "8":
             change_password(username)
         elif choice == "9":
+            print_budget_alerts(wait=True)
             print("Logged out.\n")
             break
         else:
             print("Invalid choice.\n")
 
 
-def main():
+def main(argv=None):
+    """
+    Entry point: subcommands when arguments are given, the interactive menu
+    otherwise (without loading the command parser, to start faster).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        mode = profiling.mode_from_env()
+        if mode:
+            profiling.start(mode, DATA_DIR, argv)
+        return interactive()
+    from personal_finance.cli import run
+    return run(argv)
+
+
+def migrate_legacy_expenses(username):
+    """
+    Offer to move the shared expenses.csv of older versions into per-user
+    ledgers. Its rows have no owner unless the file has a username column,
+    so nothing moves without the user's say-so
+    (personal-finance migrate-legacy does the same without asking).
+    """
+    store = get_store()
+    owners = store.legacy_expense_owners()
+    print("\nexpenses.csv from an older version still holds expenses.")
+    if owners is None:
+        question = "They don't say whose they are. Move them all into your ledger? (y/n): "
+    else:
+        question = "Move them into the ledgers of the users they name (unnamed ones into yours)? (y/n): "
+    if input(question).strip().lower() != "y":
+        print("Left as they are; you will be asked again next time.")
+        return
+    unknown = sorted(owner for owner in owners or () if not username_exists(owner))
+    if unknown:
+        print(f"Not moved: expenses.csv names users that don't exist ({', '.join(unknown)}).")
+        return
+    moved = store.migrate_legacy_expenses(username)
+    print(f"Moved {sum(moved.values())} expenses from the shared expenses.csv.")
+
+
+def interactive():
+    problem = check_password_settings()
+    if problem:
+        print(problem, file=sys.stderr)
+        return 1
     initialize_all_files()
     
     print("Welcome to Personal Finance Manager")
@@ -861,20 +1146,18 @@ def main():
         if choice == "1":
             username = input("Username: ").strip()
             password = getpass("Password: ")
-            hashed = hash_password(password)
             
-            valid = False
-            file_path = get_file_path("password.csv")
-            if file_path.exists():
-                with open(file_path, "r") as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        if row and row[0] == username and row[1] == hashed:
-                            valid = True
-                            break
-            
-            if valid:
+            if check_password(username, password):
                 print(f"Welcome back, {username}!")
+                store = get_store()
+                if store.has_legacy_expenses():
+                    migrate_legacy_expenses(username)
+                posted = post_recurring_expenses(username)
+                if posted["expenses"]:
+                    print(f"Added {posted['expenses']} recurring expenses that came due.")
+                    # each posting counts against the budgets of its own date
+                    for date, category in sorted({(row[0], row[2]) for _, row in posted["posted"]}):
+                        queue_budget_alerts(username, date, category)
                 finance_menu(username)
             else:
                 print("Invalid credentials.")
@@ -899,15 +1182,8 @@ def main():
             password = get_input("Password: ", is_valid_password)
             hashed = hash_password(password)
             
-            # Save to password.csv
-            pw_path = get_file_path("password.csv")
-            with open(pw_path, "a", newline="") as f:
-                csv.writer(f).writerow([username, hashed])
-                
-            # Save to userdata.csv
-            ud_path = get_file_path("userdata.csv")
-            with open(ud_path, "a", newline="") as f:
-                csv.writer(f).writerow([first_name, last_name, age, email, username])
+            # Save to password.csv and userdata.csv
+            get_store().add_user(username, hashed, first_name, last_name, age, email)
                 
             print("Registration successful! Please login.\n")
             
@@ -918,4 +1194,4 @@ def main():
             print("Invalid choice.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+Money and the rows that carry it.
+
+Amounts are integer paise (hundredths of a rupee) from the moment they are
+parsed until they are shown or written out, so totals are exact however
+many rows are summed. The row classes use __slots__: no per-object dict,
+one attribute per column.
+
+    to_paise        "250.5" / 250.5 -> 25050
+    format_amount   25050 -> "250.50"
+    amount_value    25050 -> 250.5, for JSON output
+"""
+
+
+def to_paise(value):
+    """
+    An amount (text or number) as integer hundredths, rounding half away
+    from zero; ValueError if it isn't a finite number.
+    """
+    if isinstance(value, int):
+        return value * 100
+    value = float(value)
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError(f"not a finite amount: {value!r}")
+    paise = int(abs(value) * 100 + 0.5)
+    return -paise if value < 0 else paise
+
+
+def format_amount(paise):
+    """
+    Paise as rupees with two decimals, the way amounts are stored and shown.
+    """
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(paise), 100)
+    return f"{sign}{rupees}.{rest:02d}"
+
+
+def amount_value(paise):
+    return paise / 100
+
+
+class Expense:
+    """
+    One expense; amount is in paise.
+    """
+
+    __slots__ = ("date", "amount", "category", "description", "payment_mode")
+
+    def __init__(self, date, amount, category, description, payment_mode):
+        self.date = date
+        self.amount = amount
+        self.category = category
+        self.description = description
+        self.payment_mode = payment_mode
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        An Expense from a stored date,amount,category,description,payment_mode
+        row; ValueError if the amount isn't a number.
+        """
+        date, amount, category, description, payment_mode = (list(row[:5]) + [""] * 5)[:5]
+        return cls(date, to_paise(amount), category, description, payment_mode)
+
+    def to_row(self):
+        return [self.date, format_amount(self.amount), self.category, self.description, self.payment_mode]
+
+
+class Budget:
+    """
+    A user's budget for one period (see budgets.py), for all spending or
+    (with category set) for one category; amount is in paise. A rollover
+    budget passes what is left of it on to the next period, which gets it
+    as carried (paise, negative after an overspend). alerted is the highest
+    alert threshold, in percent of the available amount, already shown.
+    """
+
+    __slots__ = ("period", "amount", "category", "alerted", "rollover", "carried")
+
+    def __init__(self, period, amount, category="", alerted=0, rollover=False, carried=0):
+        self.period = period
+        self.amount = amount
+        self.category = category or ""
+        self.alerted = alerted or 0
+        self.rollover = bool(rollover)
+        self.carried = carried or 0
+
+    @property
+    def available(self):
+        return self.amount + self.carried
+
+    def to_record(self):
+        return {
+            "period": self.period,
+            "category": self.category,
+            "budget_amount": amount_value(self.amount),
+            "rollover": self.rollover,
+            "carried": amount_value(self.carried),
+            "alerted": self.alerted,
+        }
+
+
+class SavingsGoal:
+    """
+    A savings goal; target and saved are in paise.
+    """
+
+    __slots__ = ("goal_id", "name", "target", "saved", "created_on")
+
+    def __init__(self, goal_id, name, target, saved=0, created_on=""):
+        self.goal_id = goal_id
+        self.name = name
+        self.target = target
+        self.saved = saved
+        self.created_on = created_on
+
+    @property
+    def remaining(self):
+        return self.target - self.saved
+
+    def to_row(self, username, default_created_on):
+        return [username, str(self.goal_id), self.name, format_amount(self.target),
+                format_amount(self.saved), self.created_on or default_created_on]
+
+    def to_record(self):
+        return {
+            "goal_id": self.goal_id,
+            "goal_name": self.name,
+            "target_amount": amount_value(self.target),
+            "current_amount": amount_value(self.saved),
+            "created_on": self.created_on,
+        }
+
+
+class RecurringRule:
+    """
+    An expense that repeats on a schedule (see recurring.py); amount is in
+    paise. Occurrences up to last_posted (YYYY-MM-DD, "" before the first
+    run) are in the ledger. pending is the date a run was posting up to and
+    is only set while, or if, that run didn't finish.
+    """
+
+    __slots__ = ("rule_id", "amount", "category", "description", "payment_mode",
+                 "schedule", "start", "end", "last_posted", "pending")
+
+    def __init__(self, rule_id, amount, category, description, payment_mode, schedule,
+                 start, end="", last_posted="", pending=""):
+        self.rule_id = rule_id
+        self.amount = amount
+        self.category = category
+        self.description = description
+        self.payment_mode = payment_mode
+        self.schedule = schedule
+        self.start = start
+        self.end = end or ""
+        self.last_posted = last_posted or ""
+        self.pending = pending or ""
+
+    def expense_row(self, date):
+        """
+        The ledger row of the occurrence on date.
+        """
+        return [date, format_amount(self.amount), self.category, self.description, self.payment_mode]
+
+    def to_row(self, username):
+        return [username, str(self.rule_id), format_amount(self.amount), self.category, self.description,
+                self.payment_mode, self.schedule, self.start, self.end, self.last_posted, self.pending]
+
+    def to_record(self):
+        return {
+            "rule_id": self.rule_id,
+            "amount": amount_value(self.amount),
+            "category": self.category,
+            "description": self.description,
+            "payment_mode": self.payment_mode,
+            "schedule": self.schedule,
+            "start": self.start,
+            "end": self.end,
+            "last_posted": self.last_posted,
+        }
+
+
+class CategoryRule:
+    """
+    Gives expenses whose description contains pattern's words a category
+    (see categorize.py). payment_mode ("" for any) and the amount range in
+    paise (None for no limit) narrow which expenses it applies to.
+    """
+
+    __slots__ = ("rule_id", "pattern", "category", "payment_mode", "min_amount", "max_amount")
+
+    def __init__(self, rule_id, pattern, category, payment_mode="", min_amount=None, max_amount=None):
+        self.rule_id = rule_id
+        self.pattern = pattern
+        self.category = category
+        self.payment_mode = payment_mode or ""
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def allows(self, payment_mode, amount):
+        """
+        True if an expense's mode and amount (paise) meet the rule's limits.
+        """
+        if self.payment_mode and self.payment_mode.lower() != payment_mode.strip().lower():
+            return False
+        if self.min_amount is not None and amount < self.min_amount:
+            return False
+        return self.max_amount is None or amount <= self.max_amount
+
+    def to_row(self, username):
+        return [username, str(self.rule_id), self.pattern, self.category, self.payment_mode,
+                "" if self.min_amount is None else format_amount(self.min_amount),
+                "" if self.max_amount is None else format_amount(self.max_amount)]
+
+    def to_record(self):
+        return {
+            "rule_id": self.rule_id,
+            "pattern": self.pattern,
+            "category": self.category,
+            "payment_mode": self.payment_mode,
+            "min_amount": None if self.min_amount is None else amount_value(self.min_amount),
+            "max_amount": None if self.max_amount is None else amount_value(self.max_amount),
+        }
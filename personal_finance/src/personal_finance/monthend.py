@@ -0,0 +1,136 @@
+"""
+Month-end job: a summary and an export file for every user.
+
+The users and the month's budgets are read once in the parent process,
+which also stores the budgets rolled over into the month (see budgets.py).
+Users are then split into shards and handed to a process pool; each worker
+opens its own store and, per user, writes
+
+    <output>/<user>/<YYYY-MM>-summary.json   spending, budget and per-category totals
+    <output>/<user>/<YYYY-MM>-expenses.csv   the month's expenses with their ids
+
+Users only touch their own partitions, so the shards share nothing but the
+output directory and the work spreads evenly over the cores.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+from personal_finance.budgets import BudgetEngine
+from personal_finance.models import amount_value
+from personal_finance.store import EXPENSE_HEADER, LedgerStore, expense_id
+
+# shards per worker: enough to even out users with very different amounts of data
+SHARDS_PER_WORKER = 4
+
+
+def open_store(data_dir, backend):
+    if backend == "sqlite":
+        from personal_finance.sqlite_store import SqliteStore
+        return SqliteStore(data_dir)
+    return LedgerStore(data_dir)
+
+
+def user_summary(username, month, totals, budget_amount):
+    """
+    The summary record for one user's month from {category: (paise, count)};
+    budget_amount is paise or None.
+    """
+    spent = sum(t for t, n in totals.values())
+    return {
+        "username": username,
+        "month": month,
+        "spent": amount_value(spent),
+        "count": sum(n for t, n in totals.values()),
+        "budget": amount_value(budget_amount) if budget_amount is not None else None,
+        "remaining": amount_value(budget_amount - spent) if budget_amount is not None else None,
+        "categories": {c: {"total": amount_value(t), "count": n} for c, (t, n) in sorted(totals.items())},
+    }
+
+
+def write_user_files(store, username, month, budget_amount, output_dir):
+    """
+    Write one user's summary and export files; returns (expense rows, bytes written).
+    """
+    # a user without expenses that month gets empty files, not an empty partition
+    has_month = month in store.expense_months(username)
+    totals = store.category_totals(username, month) if has_month else {}
+
+    folder = Path(output_dir) / quote(username, safe="")
+    folder.mkdir(parents=True, exist_ok=True)
+    summary_path = folder / f"{month}-summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(user_summary(username, month, totals, budget_amount), f, ensure_ascii=False)
+
+    export_path = folder / f"{month}-expenses.csv"
+    rows = 0
+    with open(export_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id"] + EXPENSE_HEADER)
+        if has_month:
+            for key, row in store.month_expenses(username, month):
+                writer.writerow([expense_id(month, key)] + row)
+                rows += 1
+    return rows, summary_path.stat().st_size + export_path.stat().st_size
+
+
+def run_shard(data_dir, backend, month, output_dir, shard):
+    """
+    Process one shard of (username, budget paise or None); runs in a worker.
+    Returns (users, expense rows, bytes written).
+    """
+    store = open_store(data_dir, backend)
+    rows = size = 0
+    for username, budget_amount in shard:
+        n, b = write_user_files(store, username, month, budget_amount, output_dir)
+        rows += n
+        size += b
+    return len(shard), rows, size
+
+
+def run_month_end(store, data_dir, month, output_dir, workers=None):
+    """
+    Write the month-end files of every registered user and return run
+    statistics, throughput included.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    budgets = store.month_budgets(month)
+    engine = BudgetEngine(store)
+    tasks = []
+    for username in sorted(store.usernames()):
+        # a budget rolled over into the month is stored now, which fixes its carry
+        budget = budgets.get(username) or engine.store_budget(username, month)
+        tasks.append((username, budget.available if budget is not None else None))
+    shard_count = max(1, min(len(tasks), workers * SHARDS_PER_WORKER))
+    shards = [tasks[i::shard_count] for i in range(shard_count)]
+
+    users = rows = size = 0
+    if workers == 1:
+        results = [run_shard(data_dir, store.backend, month, output_dir, shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_shard, data_dir, store.backend, month, output_dir, shard)
+                       for shard in shards]
+            results = [f.result() for f in futures]
+    for u, r, b in results:
+        users += u
+        rows += r
+        size += b
+
+    seconds = time.perf_counter() - start
+    return {
+        "month": month,
+        "output": str(output_dir),
+        "workers": workers,
+        "users": users,
+        "expenses": rows,
+        "bytes_written": size,
+        "seconds": round(seconds, 3),
+        "users_per_sec": round(users / seconds, 1) if seconds else None,
+        "expenses_per_sec": round(rows / seconds, 1) if seconds else None,
+    }
@@ -0,0 +1,135 @@
+"""
+Password hashing.
+
+Hashes are stored as self-describing strings, so the scheme and cost can be
+changed without invalidating existing passwords:
+
+    scrypt$<log2 N>$<r>$<p>$<salt hex>$<hash hex>
+    pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+    <64 hex digits>             unsalted SHA-256 from older versions
+
+verify_password() accepts all three. needs_rehash() is True for the old
+SHA-256 form and for hashes made with a different scheme or a lower cost
+than the current setting; the caller re-hashes those after a successful
+login, when it has the plain password.
+
+scrypt is used when hashlib has it (OpenSSL 1.1+), PBKDF2-SHA256 otherwise.
+The cost is log2 of scrypt's N, or PBKDF2's iteration count; new hashes
+are only made with a cost in COST_LIMITS (check_cost()).
+"""
+import hashlib
+import hmac
+import os
+
+
+SCRYPT = "scrypt"
+PBKDF2 = "pbkdf2_sha256"
+SCHEMES = (SCRYPT, PBKDF2)
+
+DEFAULT_SCRYPT_COST = 14        # N = 16384, r = 8: 16 MiB and ~50 ms per hash
+DEFAULT_PBKDF2_COST = 600000
+# (lowest, highest) cost accepted for new hashes: scrypt's log2 N up to
+# 2^20 (1 GiB with r = 8), PBKDF2 iterations
+COST_LIMITS = {SCRYPT: (10, 20), PBKDF2: (100000, 10000000)}
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def default_scheme():
+    return SCRYPT if hasattr(hashlib, "scrypt") else PBKDF2
+
+
+def default_cost(scheme):
+    return DEFAULT_SCRYPT_COST if scheme == SCRYPT else DEFAULT_PBKDF2_COST
+
+
+def check_cost(scheme, cost):
+    """
+    cost as an int if new hashes can be made with it under scheme;
+    ValueError saying what is accepted otherwise.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"unknown password scheme '{scheme}' (use {' or '.join(SCHEMES)})")
+    low, high = COST_LIMITS[scheme]
+    what = "log2 of N" if scheme == SCRYPT else "iterations"
+    try:
+        value = int(cost)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not low <= value <= high:
+        raise ValueError(f"password cost '{cost}' is out of range for {scheme}: "
+                         f"use {low} to {high} ({what})")
+    return value
+
+
+def _derive(password, scheme, cost, salt, r=SCRYPT_R, p=SCRYPT_P):
+    if scheme == SCRYPT:
+        n = 1 << cost
+        # scrypt needs 128 * r * N bytes; leave OpenSSL's 32 MiB default out of it
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * r * n + 1024 * 1024, dklen=HASH_BYTES)
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, cost, HASH_BYTES)
+
+
+def hash_password(password, scheme=None, cost=None):
+    """
+    A new salted hash of password in the stored string form.
+    """
+    scheme = scheme or default_scheme()
+    cost = check_cost(scheme, cost or default_cost(scheme))
+    salt = os.urandom(SALT_BYTES)
+    digest = _derive(password, scheme, cost, salt).hex()
+    if scheme == SCRYPT:
+        return f"{SCRYPT}${cost}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest}"
+    return f"{PBKDF2}${cost}${salt.hex()}${digest}"
+
+
+def _legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def _parse(stored):
+    """
+    (scheme, cost, salt, digest, r, p) of a stored hash; scheme is None for
+    the old SHA-256 form. ValueError if it is neither.
+    """
+    parts = stored.split("$")
+    if len(parts) == 1 and len(stored) == 64:
+        return None, 0, b"", bytes.fromhex(stored), 0, 0
+    if parts[0] == SCRYPT and len(parts) == 6:
+        return SCRYPT, int(parts[1]), bytes.fromhex(parts[4]), bytes.fromhex(parts[5]), \
+            int(parts[2]), int(parts[3])
+    if parts[0] == PBKDF2 and len(parts) == 4:
+        return PBKDF2, int(parts[1]), bytes.fromhex(parts[2]), bytes.fromhex(parts[3]), 0, 0
+    raise ValueError("unrecognised password hash")
+
+
+def verify_password(password, stored):
+    """
+    True if password matches the stored hash (any supported form).
+    """
+    if not stored:
+        return False
+    try:
+        scheme, cost, salt, digest, r, p = _parse(stored)
+    except ValueError:
+        return False
+    if scheme is None:
+        return hmac.compare_digest(bytes.fromhex(_legacy_hash(password)), digest)
+    return hmac.compare_digest(_derive(password, scheme, cost, salt, r, p), digest)
+
+
+def needs_rehash(stored, scheme=None, cost=None):
+    """
+    True if stored should be replaced by a hash with the given (default:
+    current) scheme and cost.
+    """
+    scheme = scheme or default_scheme()
+    cost = int(cost or default_cost(scheme))
+    try:
+        stored_scheme, stored_cost, *rest = _parse(stored)
+    except ValueError:
+        return True
+    return stored_scheme != scheme or stored_cost < cost
@@ -0,0 +1,481 @@
+"""
+Profiling mode: where a session's time goes.
+
+Turned on with `personal-finance --profile ...` (or --cprofile) or
+PERSONAL_FINANCE_PROFILE=1 (=cprofile). While it is on, every menu action
+or command and every call made on the store is an operation in the
+session's trace, with its wall time and what happened inside it, nested
+operations included:
+
+    file_opens      files opened by the app
+    rows_read       csv rows parsed
+    bytes_read      bytes read (characters, for text files)
+    bytes_written   bytes written (likewise)
+    bytes_mapped    size of the cache files mapped into memory
+    parse_seconds   time spent reading and splitting csv rows
+    input_seconds   time spent waiting at a prompt
+
+When the program exits the trace is written to
+<data dir>/profiles/<session>.json (or PERSONAL_FINANCE_PROFILE_DIR): the
+operations in order, totals per operation name, and per file how often it
+was opened and read, with how many times over its whole size, so a
+whole-file scan stands out. With cprofile, each menu action or command also
+gets a <session>-<n>-<name>.prof for pstats.
+
+Counting works by giving the app's modules counting versions of open, csv
+and mmap, and the session a store proxy that times its methods. None of it
+is installed (nor cProfile imported) unless profiling is on, so a normal
+run pays nothing. SQLite does its own reads inside the library; they only
+show up as time.
+"""
+import atexit
+import builtins
+import csv
+import functools
+import importlib
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from types import GeneratorType
+
+COUNTERS = ("file_opens", "rows_read", "bytes_read", "bytes_written", "bytes_mapped",
+            "parse_seconds", "input_seconds")
+MODES = ("trace", "cprofile")
+PROFILE_DIR = "profiles"
+# operations kept in order in the trace; later ones only count in the totals
+MAX_OPERATIONS = 100000
+# modules whose open, csv and mmap are swapped for counting versions
+INSTRUMENTED_MODULES = ("main", "cli", "store", "colcache", "rowindex", "journal", "totals", "termindex",
+                        "exporter", "importer", "fileio", "config", "monthend", "provision")
+
+_profiler = None
+
+
+def mode_from_env():
+    """
+    "trace" or "cprofile" from PERSONAL_FINANCE_PROFILE, or None if it is off.
+    """
+    value = os.environ.get("PERSONAL_FINANCE_PROFILE", "").strip().lower()
+    if value in ("", "0", "off", "no", "false"):
+        return None
+    return "cprofile" if value == "cprofile" else "trace"
+
+
+def start(mode, data_dir, argv=()):
+    """
+    Turn profiling on for the rest of the process; the trace is written at exit.
+    """
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    out_dir = os.environ.get("PERSONAL_FINANCE_PROFILE_DIR") or Path(data_dir) / PROFILE_DIR
+    _profiler = Profiler(mode, data_dir, out_dir, argv)
+    _install()
+    atexit.register(_finish)
+    return _profiler
+
+
+def operation(kind, name):
+    """
+    Context manager making the block an operation, if profiling is on.
+    """
+    if _profiler is None or threading.get_ident() != _profiler.thread:
+        return nullcontext()
+    return _profiler.operation(kind, name)
+
+
+def action(fn):
+    """
+    Decorator making each call of a menu action an operation.
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with operation("action", fn.__name__):
+            return fn(*args, **kwargs)
+    return run
+
+
+def wrap_store(store):
+    """
+    store, or a proxy timing its calls if profiling is on.
+    """
+    return store if _profiler is None else ProfiledStore(store)
+
+
+class Profiler:
+    """
+    The session's operations and counters.
+    """
+
+    def __init__(self, mode, data_dir, out_dir, argv):
+        self.mode = mode
+        self.data_dir = str(data_dir)
+        self.out_dir = Path(out_dir)
+        self.argv = list(argv)
+        self.session = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.started = time.perf_counter()
+        self.thread = threading.get_ident()
+        self.operations = []
+        self.dropped = 0
+        self.stack = []
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        # counted on other threads (the budget alert worker), not in any operation
+        self.background = dict.fromkeys(COUNTERS, 0)
+        self.files = {}
+        self.fds = {}
+        self.dumps = []
+        self._cprofile = None
+        self._lock = threading.Lock()
+
+    def path_key(self, path):
+        path = os.fspath(path)
+        if path.startswith(self.data_dir + os.sep):
+            return path[len(self.data_dir) + 1:]
+        return path
+
+    def count(self, counter, n, path=None):
+        if threading.get_ident() != self.thread:
+            with self._lock:
+                self.background[counter] += n
+            return
+        self.totals[counter] += n
+        for record in self.stack:
+            record[counter] += n
+        if path is not None:
+            stats = self.files.get(path)
+            if stats is None:
+                stats = self.files[path] = dict.fromkeys(("file_opens", "rows_read", "bytes_read",
+                                                          "bytes_written", "bytes_mapped"), 0)
+                stats["read_by"] = {}
+            stats[counter] += n
+            if counter in ("bytes_read", "bytes_mapped") and self.stack:
+                read_by = stats["read_by"]
+                name = self.stack[-1]["name"]
+                read_by[name] = read_by.get(name, 0) + n
+
+    def begin(self, kind, name, record=None):
+        """
+        Start an operation, or resume record (a generator being consumed).
+        """
+        if record is None:
+            record = {"kind": kind, "name": name, "depth": len(self.stack),
+                      "start_ms": round((time.perf_counter() - self.started) * 1000, 3), "seconds": 0.0}
+            record.update(dict.fromkeys(COUNTERS, 0))
+            if len(self.operations) < MAX_OPERATIONS:
+                self.operations.append(record)
+            else:
+                self.dropped += 1
+        if not self.stack and kind == "action" and self.mode == "cprofile":
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self.stack.append(record)
+        record["_began"] = time.perf_counter()
+        return record
+
+    def end(self, record):
+        record["seconds"] += time.perf_counter() - record.pop("_began")
+        self.stack.pop()
+        if not self.stack and self._cprofile is not None:
+            self._cprofile.disable()
+            name = re.sub(r"[^\w.-]+", "_", record["name"])
+            path = self.out_dir / f"{self.session}-{len(self.dumps) + 1}-{name}.prof"
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            self._cprofile.dump_stats(path)
+            self.dumps.append(str(path))
+            self._cprofile = None
+
+    def operation(self, kind, name):
+        return _Operation(self, kind, name)
+
+    def iterate(self, kind, name, iterator):
+        """
+        iterator as one operation, timed only while producing items.
+        """
+        record = None
+        while True:
+            record = self.begin(kind, name, record)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.end(record)
+            yield item
+
+    def trace(self):
+        import platform
+
+        by_name = {}
+        for record in self.operations:
+            total = by_name.get((record["kind"], record["name"]))
+            if total is None:
+                total = by_name[record["kind"], record["name"]] = {
+                    "kind": record["kind"], "name": record["name"], "calls": 0, "seconds": 0.0}
+                total.update(dict.fromkeys(COUNTERS, 0))
+            total["calls"] += 1
+            for field in ("seconds",) + COUNTERS:
+                total[field] += record[field]
+        files = []
+        for path, stats in self.files.items():
+            try:
+                size = os.path.getsize(os.path.join(self.data_dir, path))
+            except OSError:
+                size = None
+            entry = {"path": path, "size": size}
+            entry.update(stats)
+            entry["full_reads"] = round(stats["bytes_read"] / size, 2) if size else None
+            files.append(entry)
+        return {
+            "session": self.session,
+            "started": self.started_at,
+            "seconds": round(time.perf_counter() - self.started, 6),
+            "mode": self.mode,
+            "argv": self.argv,
+            "data_dir": self.data_dir,
+            "python": platform.python_version(),
+            "totals": _rounded(self.totals),
+            "background": _rounded(self.background),
+            "by_name": [_rounded(t) for t in sorted(by_name.values(), key=lambda t: -t["seconds"])],
+            "files": sorted(files, key=lambda f: -(f["bytes_read"] + f["bytes_mapped"])),
+            "operations": [_rounded(r) for r in self.operations],
+            "dropped_operations": self.dropped,
+            "cprofile": self.dumps,
+        }
+
+    def write(self):
+        import json
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{self.session}.json"
+        with builtins.open(path, "w") as f:
+            json.dump(self.trace(), f, indent=1)
+        return path
+
+
+def _rounded(record):
+    return {k: round(v, 6) if isinstance(v, float) else v for k, v in record.items() if k != "_began"}
+
+
+def _finish():
+    if _profiler is None:
+        return
+    while _profiler.stack:
+        _profiler.end(_profiler.stack[-1])
+    path = _profiler.write()
+    print(f"Profile written to {path}", file=sys.stderr)
+
+
+class _Operation:
+    def __init__(self, profiler, kind, name):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.record = self.profiler.begin(self.kind, self.name)
+        return self.record
+
+    def __exit__(self, *exc):
+        self.profiler.end(self.record)
+        return False
+
+
+class ProfiledStore:
+    """
+    A store whose public method calls are "store" operations. Generators
+    they return are timed while they are consumed, and context managers
+    while they are entered.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        value = getattr(self._store, name)
+        if name.startswith("_") or not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None or threading.get_ident() != profiler.thread:
+                return value(*args, **kwargs)
+            with profiler.operation("store", name):
+                result = value(*args, **kwargs)
+            if isinstance(result, GeneratorType):
+                return profiler.iterate("store", name, result)
+            if hasattr(result, "__enter__") and hasattr(result, "__exit__"):
+                return _TimedContext(result, name)
+            return result
+        return call
+
+
+class _TimedContext:
+    def __init__(self, context, name):
+        self._context = context
+        self._name = name
+
+    def __enter__(self):
+        with operation("store", self._name):
+            return self._context.__enter__()
+
+    def __exit__(self, *exc):
+        return self._context.__exit__(*exc)
+
+
+class _CountedFile:
+    """
+    A file object that counts what is read from and written to it.
+    """
+
+    def __init__(self, f, path):
+        self._f = f
+        self._path = path
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        _count("bytes_read", len(data), self._path)
+        return data
+
+    def readline(self, *args):
+        line = self._f.readline(*args)
+        _count("bytes_read", len(line), self._path)
+        return line
+
+    def readlines(self, *args):
+        lines = self._f.readlines(*args)
+        _count("bytes_read", sum(map(len, lines)), self._path)
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._f)
+        _count("bytes_read", len(line), self._path)
+        return line
+
+    def write(self, data):
+        n = self._f.write(data)
+        _count("bytes_written", len(data), self._path)
+        return n
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def fileno(self):
+        fd = self._f.fileno()
+        if _profiler is not None:
+            _profiler.fds[fd] = self._path
+        return fd
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._f.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class _CountedReader:
+    def __init__(self, reader, path):
+        self._reader = reader
+        self._path = path
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        began = time.perf_counter()
+        try:
+            row = next(self._reader)
+        finally:
+            _count("parse_seconds", time.perf_counter() - began)
+        _count("rows_read", 1, self._path)
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+
+class _CountedModule:
+    """
+    Stands in for a module, counting what some of its functions do.
+    """
+
+    def __init__(self, module, **overrides):
+        self._module = module
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+def _count(counter, n, path=None):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.count(counter, n, path)
+
+
+def _counted_open(file, *args, **kwargs):
+    f = builtins.open(file, *args, **kwargs)
+    if isinstance(file, int) or _profiler is None:
+        return f
+    path = _profiler.path_key(file)
+    _count("file_opens", 1, path)
+    return _CountedFile(f, path)
+
+
+def _counted_reader(source, *args, **kwargs):
+    return _CountedReader(csv.reader(source, *args, **kwargs), getattr(source, "_path", None))
+
+
+def _counted_mmap(fileno, length, *args, **kwargs):
+    mapped = mmap.mmap(fileno, length, *args, **kwargs)
+    _count("bytes_mapped", len(mapped), _profiler.fds.get(fileno) if _profiler else None)
+    return mapped
+
+
+def _timed_prompt(prompt_function):
+    """
+    prompt_function, counting the time spent in it as input_seconds.
+    """
+    @functools.wraps(prompt_function)
+    def prompt(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return prompt_function(*args, **kwargs)
+        finally:
+            _count("input_seconds", time.perf_counter() - began)
+    return prompt
+
+
+def _input(prompt=""):
+    return builtins.input(prompt)
+
+
+def _install():
+    counted_csv = _CountedModule(csv, reader=_counted_reader)
+    counted_mmap = _CountedModule(mmap, mmap=_counted_mmap)
+    for name in INSTRUMENTED_MODULES:
+        module = importlib.import_module(f"personal_finance.{name}")
+        module.open = _counted_open
+        if getattr(module, "csv", None) is csv:
+            module.csv = counted_csv
+        if getattr(module, "mmap", None) is mmap:
+            module.mmap = counted_mmap
+    main = importlib.import_module("personal_finance.main")
+    main.input = _timed_prompt(_input)
+    main.getpass = _timed_prompt(main.getpass)
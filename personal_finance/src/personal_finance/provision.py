@@ -0,0 +1,152 @@
+"""
+Bulk account provisioning.
+
+Reads a CSV file of users (username, password, first_name, last_name, age,
+email), checks every row with the same rules as interactive registration
+and creates the valid accounts together:
+
+  - usernames are checked against one set of existing names, loaded once,
+    and against the rows before them in the file
+  - passwords are hashed across a process pool, since hashing is where
+    the time goes
+  - password.csv and userdata.csv each get one append for the whole batch
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from personal_finance import passwords
+from personal_finance.main import is_valid_age, is_valid_email, is_valid_name, is_valid_password
+
+
+FIELDS = ["username", "password", "first_name", "last_name", "age", "email"]
+
+# Accepted header names for each field, lower-cased.
+COLUMN_ALIASES = {
+    "username": ["username", "user", "login"],
+    "password": ["password"],
+    "first_name": ["first_name", "first name", "firstname"],
+    "last_name": ["last_name", "last name", "lastname", "surname"],
+    "age": ["age"],
+    "email": ["email", "e-mail", "mail"],
+}
+
+# Below this many passwords the pool costs more to start than it saves.
+POOL_THRESHOLD = 64
+
+
+class ProvisionResult:
+    """
+    Counts from one provisioning run; errors holds (line number, message)
+    for the first few rejected rows.
+    """
+
+    MAX_ERRORS = 20
+
+    def __init__(self):
+        self.read = 0
+        self.created = []
+        self.rejected = 0
+        self.errors = []
+        # usernames registered by another session between the check and the write
+        self.raced = []
+
+    def error(self, line_no, message):
+        self.rejected += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_no, message))
+
+
+def map_columns(header):
+    """
+    Column positions in header for each field, or None if the row doesn't
+    name them all.
+    """
+    names = [h.strip().lower() for h in header]
+    positions = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                positions[field] = names.index(alias)
+                break
+        else:
+            return None
+    return positions
+
+
+def validate_user(user):
+    """
+    Error messages for one user dict; empty if it can be registered.
+    """
+    errors = []
+    if len(user["username"]) < 3:
+        errors.append("Username must be at least 3 chars.")
+    errors.extend(is_valid_name(user["first_name"]))
+    errors.extend(is_valid_name(user["last_name"]))
+    errors.extend(is_valid_age(user["age"]))
+    errors.extend(is_valid_email(user["email"]))
+    errors.extend(is_valid_password(user["password"]))
+    return errors
+
+
+def hash_passwords(plain, scheme, cost, workers=None):
+    """
+    Hashes of the plain passwords, in order, computed on a process pool.
+    """
+    hasher = partial(passwords.hash_password, scheme=scheme, cost=cost)
+    if len(plain) < POOL_THRESHOLD or workers == 1:
+        return [hasher(p) for p in plain]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(plain) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hasher, plain, chunksize=chunksize))
+
+
+def provision_users(store, lines, scheme, cost, workers=None, dry_run=False):
+    """
+    Create the users listed in an iterable of csv text lines (an open file)
+    whose first row is a header. Rows that fail validation or whose
+    username is taken are counted and reported, not created.
+    """
+    result = ProvisionResult()
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return result
+    positions = map_columns(header)
+    if positions is None:
+        result.error(1, f"header must name the columns {', '.join(FIELDS)}")
+        return result
+    width = max(positions.values()) + 1
+
+    taken = store.usernames()
+    valid = []
+    for line_no, row in enumerate(reader, start=2):
+        if not row or not any(row):
+            continue
+        result.read += 1
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        user = {field: row[i].strip() for field, i in positions.items()}
+        user["password"] = row[positions["password"]]
+        errors = validate_user(user)
+        if not errors and user["username"] in taken:
+            errors = ["Username already taken."]
+        if errors:
+            result.error(line_no, " ".join(errors))
+            continue
+        taken.add(user["username"])
+        valid.append(user)
+
+    if dry_run or not valid:
+        result.created = [u["username"] for u in valid]
+        return result
+
+    hashes = hash_passwords([u["password"] for u in valid], scheme, cost, workers)
+    accounts = [(u["username"], h, u["first_name"], u["last_name"], u["age"], u["email"])
+                for u, h in zip(valid, hashes)]
+    result.raced = store.add_users(accounts)
+    raced = set(result.raced)
+    result.created = [u["username"] for u in valid if u["username"] not in raced]
+    return result
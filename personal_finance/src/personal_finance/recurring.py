@@ -0,0 +1,232 @@
+"""
+Recurring expenses.
+
+A rule (models.RecurringRule, kept in recurring.csv or the database's
+recurring table) repeats one expense on a schedule:
+
+    monthly         on the start date's day of the month
+    monthly:15      on the 15th (the last day in shorter months); monthly:last
+    weekly          on the start date's weekday
+    weekly:mon      on Mondays (mon, tue, ... sun)
+    cron:1,15 * *   cron-like day-of-month, month and day-of-week fields; a
+                    full five-field cron line is accepted and its minute and
+                    hour are ignored, since expenses only have a date
+
+run_due() posts every occurrence from a rule's start (or the day after the
+last one posted) up to today in one run: all rules' rows are grouped per
+user and month and each group is a single append, so catching up years of
+rent for every user is a handful of writes. Each rule remembers the last
+date it posted up to, so a run only posts what is new. A run that stopped
+halfway leaves the rule's pending date set; the next run compares those
+occurrences with the ledger and posts only the ones that are missing.
+"""
+import calendar
+import re
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+
+from personal_finance.store import expense_month
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+_STEP_RE = re.compile(r"^(\*|\w+(?:-\w+)?)(?:/(\d+))?$")
+
+
+class Schedule:
+    """
+    A parsed schedule; dates(first, last) gives its occurrences in a range.
+    ValueError if the text isn't a schedule.
+    """
+
+    def __init__(self, text, start):
+        self.text = text
+        kind, _, arg = text.strip().lower().partition(":")
+        arg = arg.strip()
+        start = _as_date(start)
+        if kind == "monthly":
+            self.kind = "monthly"
+            if not arg:
+                self.day = start.day
+            elif arg == "last":
+                self.day = 31
+            elif arg.isdigit() and 1 <= int(arg) <= 31:
+                self.day = int(arg)
+            else:
+                raise ValueError(f"'{text}': monthly takes a day of the month (1-31 or last)")
+        elif kind == "weekly":
+            self.kind = "weekly"
+            if not arg:
+                self.weekday = start.weekday()
+            elif arg[:3] in WEEKDAYS:
+                self.weekday = WEEKDAYS.index(arg[:3])
+            else:
+                raise ValueError(f"'{text}': weekly takes a weekday (mon-sun)")
+        elif kind == "cron":
+            self.kind = "cron"
+            fields = arg.split()
+            if len(fields) == 5:
+                fields = fields[2:]
+            if len(fields) != 3:
+                raise ValueError(f"'{text}': cron takes day-of-month, month and day-of-week fields")
+            self.days = _cron_field(fields[0], 1, 31)
+            self.months = _cron_field(fields[1], 1, 12, MONTH_NAMES, 1)
+            # 0 and 7 are both Sunday; stored as Python weekdays (Monday = 0)
+            weekdays = _cron_field(fields[2], 0, 7, ("sun",) + WEEKDAYS[:6], 0)
+            self.weekdays = None if weekdays is None else frozenset((d - 1) % 7 for d in weekdays)
+        else:
+            raise ValueError(f"'{text}' is not a schedule (monthly, weekly or cron:...)")
+
+    def dates(self, first, last):
+        """
+        Occurrences from first to last (dates), both included, in order.
+        """
+        if first > last:
+            return
+        if self.kind == "weekly":
+            day = first + timedelta(days=(self.weekday - first.weekday()) % 7)
+            while day <= last:
+                yield day
+                day += timedelta(days=7)
+            return
+        year, month = first.year, first.month
+        while (year, month) <= (last.year, last.month):
+            if self.kind == "monthly":
+                days = (min(self.day, calendar.monthrange(year, month)[1]),)
+            elif self.months is None or month in self.months:
+                days = _cron_days(self.days, self.weekdays, year, month)
+            else:
+                days = ()
+            for d in days:
+                day = date(year, month, d)
+                if first <= day <= last:
+                    yield day
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _cron_field(text, low, high, names=(), base=0):
+    """
+    The set of values a cron field allows, or None for every value.
+    """
+    if text == "*":
+        return None
+    values = set()
+    for part in text.split(","):
+        match = _STEP_RE.match(part)
+        if not match:
+            raise ValueError(f"bad cron field '{text}'")
+        span, step = match.group(1), int(match.group(2) or 1)
+        if span == "*":
+            first, last = low, high
+        else:
+            bounds = [_cron_value(v, low, high, names, base) for v in span.split("-")]
+            first, last = bounds[0], bounds[-1]
+            if match.group(2) and len(bounds) == 1:
+                last = high
+        if step < 1 or first > last:
+            raise ValueError(f"bad cron field '{text}'")
+        values.update(range(first, last + 1, step))
+    return frozenset(values)
+
+
+def _cron_value(value, low, high, names, base):
+    if value[:3] in names:
+        return names.index(value[:3]) + base
+    if not value.isdigit() or not low <= int(value) <= high:
+        raise ValueError(f"cron value '{value}' is not within {low}-{high}")
+    return int(value)
+
+
+@lru_cache(maxsize=1024)
+def _cron_days(days, weekdays, year, month):
+    """
+    Days of a month matching cron's day-of-month and day-of-week fields; as
+    in cron, a day matches either one when both are restricted.
+    """
+    first_weekday, length = calendar.monthrange(year, month)
+    found = []
+    for d in range(1, length + 1):
+        if days is None and weekdays is None:
+            found.append(d)
+        elif (days is not None and d in days) or \
+                (weekdays is not None and (first_weekday + d - 1) % 7 in weekdays):
+            found.append(d)
+    return tuple(found)
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def check_rule(rule):
+    """
+    ValueError unless rule's schedule and dates are valid.
+    """
+    start = _as_date(rule.start)
+    if rule.end and _as_date(rule.end) < start:
+        raise ValueError("a rule can't end before it starts")
+    Schedule(rule.schedule, start)
+
+
+def due_rows(rule, today):
+    """
+    (through, rows): the ledger rows of rule's occurrences not posted yet,
+    up to today or its end, and the date that covers.
+    """
+    through = _as_date(today)
+    if rule.end:
+        through = min(through, _as_date(rule.end))
+    first = _as_date(rule.start)
+    if rule.last_posted:
+        first = max(first, _as_date(rule.last_posted) + timedelta(days=1))
+    dates = Schedule(rule.schedule, rule.start).dates(first, through)
+    return through.isoformat(), [rule.expense_row(d.isoformat()) for d in dates]
+
+
+def _unposted(store, username, rows, pending):
+    """
+    The rows that an interrupted run, posting up to pending, didn't get
+    into the ledger.
+    """
+    existing = Counter()
+    stored = set(store.expense_months(username))
+    for month in sorted({expense_month(row[0]) for row in rows if row[0] <= pending}):
+        if month in stored:
+            existing.update(tuple(r) for _, r in store.month_expenses(username, month))
+    missing = []
+    for row in rows:
+        if row[0] <= pending and existing[tuple(row)] > 0:
+            existing[tuple(row)] -= 1
+        else:
+            missing.append(row)
+    return missing
+
+
+def run_due(store, today, username=None):
+    """
+    Post every due occurrence of every rule (or of username's rules) up to
+    today (YYYY-MM-DD). Returns {"rules", "expenses", "users", "months"}
+    with "posted": [(username, row)] for the rows written.
+    """
+    def plan(rules):
+        postings = []
+        for user, rule in rules:
+            if username is not None and user != username:
+                continue
+            through, rows = due_rows(rule, today)
+            if rule.pending:
+                rows = _unposted(store, user, rows, rule.pending)
+            elif not rows:
+                continue
+            postings.append((user, rule, through, rows))
+        return postings
+
+    postings = store.post_recurring(plan)
+    posted = [(user, row) for user, rule, through, rows in postings for row in rows]
+    return {
+        "rules": sum(1 for p in postings if p[3]),
+        "expenses": len(posted),
+        "users": len({user for user, row in posted}),
+        "months": len({(user, expense_month(row[0])) for user, row in posted}),
+        "posted": posted,
+    }
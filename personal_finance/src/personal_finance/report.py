@@ -0,0 +1,292 @@
+"""
+Spending reports over a user's expense history.
+
+ExpenseColumns loads the expenses once into parallel columns: month number,
+category code, payment mode code, description code and amount. Categories,
+modes and descriptions are dictionary-encoded, so every report below is an
+aggregation over small integers:
+
+    group_totals        totals and counts by any of month, category, mode
+    monthly_series      per-month totals with a rolling average and the
+                        same month one year earlier
+    top_descriptions    where the money went, by description
+
+With NumPy installed the columns are NumPy arrays and the aggregations are
+np.unique/np.bincount over combined codes. Without it they are array.array
+columns and each report is a single pass in Python with the same results.
+Undated expenses have no month and are left out.
+"""
+import heapq
+from array import array
+
+from personal_finance.store import UNDATED_PARTITION
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+GROUP_FIELDS = ["month", "category", "payment_mode"]
+DEFAULT_WINDOW = 3
+DEFAULT_TOP = 10
+
+
+def month_number(month):
+    """
+    YYYY-MM as a count of months, so consecutive months differ by one.
+    """
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def month_name(number):
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def _recode(mapping, codes):
+    """
+    codes translated through mapping (old code -> new code).
+    """
+    if numpy is not None:
+        return numpy.asarray(mapping, dtype=numpy.int32)[numpy.frombuffer(codes, dtype=numpy.int32)]
+    return array("i", map(mapping.__getitem__, codes))
+
+
+class _Codes:
+    """
+    Dictionary encoding: each distinct value gets the next small int.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ExpenseColumns:
+    """
+    One user's expenses as columns, amounts in paise. Build with ExpenseColumns.load().
+    """
+
+    def __init__(self):
+        self.months = array("i")
+        self.categories = array("i")
+        self.modes = array("i")
+        self.descriptions = array("i")
+        self.amounts = array("q")
+        self.category_names = []
+        self.mode_names = []
+        self.description_names = []
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @classmethod
+    def load(cls, store, username, first_month=None, last_month=None):
+        """
+        Read the user's expenses between two YYYY-MM months (inclusive; None
+        for open-ended) from the store's per-month columns, re-coding each
+        month's dictionaries into one set. Descriptions are compared
+        case-insensitively, categories and modes after stripping spaces.
+        """
+        columns = cls()
+        categories, modes, descriptions = _Codes(), _Codes(), _Codes()
+        parts = {name: [] for name in ("months", "categories", "modes", "descriptions", "amounts")}
+        for month in store.expense_months(username):
+            if month == UNDATED_PARTITION:
+                continue
+            if (first_month and month < first_month) or (last_month and month > last_month):
+                continue
+            month_columns = store.expense_columns(username, month)
+            if not len(month_columns):
+                continue
+            parts["months"].append(array("i", [month_number(month)]) * len(month_columns))
+            parts["amounts"].append(month_columns.amounts)
+            parts["categories"].append(_recode(
+                [categories.code(v.strip()) for v in month_columns.category_names],
+                month_columns.categories))
+            parts["modes"].append(_recode(
+                [modes.code(v.strip()) for v in month_columns.mode_names],
+                month_columns.modes))
+            parts["descriptions"].append(_recode(
+                [descriptions.code(v.strip().lower()) for v in month_columns.description_names],
+                month_columns.descriptions))
+
+        for name, chunks in parts.items():
+            column = getattr(columns, name)
+            if numpy is not None:
+                dtype = numpy.int64 if column.typecode == "q" else numpy.int32
+                chunks = [numpy.asarray(c, dtype=dtype) for c in chunks]
+                setattr(columns, name, numpy.concatenate(chunks) if chunks else numpy.zeros(0, dtype))
+            else:
+                for chunk in chunks:
+                    column.extend(chunk)
+        columns.category_names = categories.values
+        columns.mode_names = modes.values
+        columns.description_names = descriptions.values
+        return columns
+
+    def field(self, name):
+        """
+        (code column, decode function) for a group-by field.
+        """
+        if name == "month":
+            return self.months, month_name
+        if name == "category":
+            return self.categories, self.category_names.__getitem__
+        if name == "payment_mode":
+            return self.modes, self.mode_names.__getitem__
+        raise ValueError(f"can't group by '{name}' (use {', '.join(GROUP_FIELDS)})")
+
+
+def group_totals(columns, by=("month", "category")):
+    """
+    [{<field>: value, ..., "total": float, "count": int}] for every
+    combination of the by fields that has expenses, sorted by those fields.
+    """
+    fields = [columns.field(name) for name in by]
+    if not len(columns):
+        return []
+
+    if numpy is not None:
+        # one int64 key per row: the field codes as digits of a mixed-radix number
+        key = numpy.zeros(len(columns), dtype=numpy.int64)
+        bases = []
+        for codes, decode in fields:
+            low = int(codes.min())
+            base = int(codes.max()) - low + 1
+            key = key * base + (codes - low)
+            bases.append((low, base))
+        unique, inverse = numpy.unique(key, return_inverse=True)
+        totals = numpy.bincount(inverse, weights=columns.amounts)
+        counts = numpy.bincount(inverse)
+        groups = []
+        for k, total, count in zip(unique.tolist(), totals.tolist(), counts.tolist()):
+            values = []
+            for low, base in reversed(bases):
+                values.append(k % base + low)
+                k //= base
+            groups.append((tuple(reversed(values)), total, count))
+    else:
+        sums = {}
+        code_columns = [codes for codes, decode in fields]
+        for i, amount in enumerate(columns.amounts):
+            k = tuple(codes[i] for codes in code_columns)
+            entry = sums.get(k)
+            if entry is None:
+                sums[k] = [amount, 1]
+            else:
+                entry[0] += amount
+                entry[1] += 1
+        groups = [(k, total, count) for k, (total, count) in sums.items()]
+
+    result = []
+    for codes, total, count in groups:
+        record = {name: decode(code) for name, (column, decode), code in zip(by, fields, codes)}
+        record["total"] = round(total / 100, 2)
+        record["count"] = count
+        result.append(record)
+    result.sort(key=lambda r: [r[name] for name in by])
+    return result
+
+
+def monthly_series(columns, window=DEFAULT_WINDOW):
+    """
+    One entry per month from the first to the last month with expenses (gaps
+    included as zero): total, count, the average of the last window months'
+    totals, the total for the same month a year earlier and the change from
+    it in percent (None when there is nothing to compare against).
+    """
+    if not len(columns):
+        return []
+    window = max(1, window)
+
+    if numpy is not None:
+        first = int(columns.months.min())
+        offsets = columns.months - first
+        size = int(offsets.max()) + 1
+        totals = numpy.bincount(offsets, weights=columns.amounts, minlength=size)
+        counts = numpy.bincount(offsets, minlength=size)
+        running = numpy.concatenate(([0.0], numpy.cumsum(totals)))
+        ends = numpy.arange(1, size + 1)
+        starts = numpy.maximum(ends - window, 0)
+        rolling = (running[ends] - running[starts]) / (ends - starts)
+        totals, counts, rolling = totals.tolist(), counts.tolist(), rolling.tolist()
+    else:
+        first = min(columns.months)
+        size = max(columns.months) - first + 1
+        totals = [0] * size
+        counts = [0] * size
+        for month, amount in zip(columns.months, columns.amounts):
+            totals[month - first] += amount
+            counts[month - first] += 1
+        rolling = []
+        running = 0
+        for i, total in enumerate(totals):
+            running += total
+            if i >= window:
+                running -= totals[i - window]
+            rolling.append(running / min(i + 1, window))
+
+    series = []
+    for i in range(size):
+        previous = totals[i - 12] if i >= 12 else None
+        if previous:
+            change = round((totals[i] - previous) / previous * 100, 1)
+        else:
+            change = None
+        series.append({
+            "month": month_name(first + i),
+            "total": round(totals[i] / 100, 2),
+            "count": counts[i],
+            "rolling_average": round(rolling[i] / 100, 2),
+            "previous_year": round(previous / 100, 2) if previous is not None else None,
+            "change_percent": change,
+        })
+    return series
+
+
+def top_descriptions(columns, n=DEFAULT_TOP):
+    """
+    The n descriptions with the highest total spend (compared
+    case-insensitively): [{"description", "total", "count"}].
+    """
+    if not len(columns) or n <= 0:
+        return []
+    size = len(columns.description_names)
+
+    if numpy is not None:
+        totals = numpy.bincount(columns.descriptions, weights=columns.amounts, minlength=size)
+        counts = numpy.bincount(columns.descriptions, minlength=size)
+        if n < size:
+            best = numpy.argpartition(-totals, n - 1)[:n]
+        else:
+            best = numpy.arange(size)
+        best = best[numpy.argsort(-totals[best], kind="stable")]
+        chosen = [(int(i), float(totals[i]), int(counts[i])) for i in best]
+    else:
+        totals = [0] * size
+        counts = [0] * size
+        for code, amount in zip(columns.descriptions, columns.amounts):
+            totals[code] += amount
+            counts[code] += 1
+        chosen = [(i, totals[i], counts[i])
+                  for i in heapq.nlargest(n, range(size), key=totals.__getitem__)]
+
+    return [{"description": columns.description_names[i], "total": round(total / 100, 2), "count": count}
+            for i, total, count in chosen]
+
+
+def build_report(columns, by=("month", "category"), window=DEFAULT_WINDOW, top=DEFAULT_TOP):
+    return {
+        "rows": len(columns),
+        "groups": group_totals(columns, by),
+        "monthly": monthly_series(columns, window),
+        "top_descriptions": top_descriptions(columns, top),
+    }
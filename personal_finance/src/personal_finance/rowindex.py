@@ -0,0 +1,203 @@
+"""
+Byte-offset row index for expense partitions.
+
+Every row of an expense partition carries an integer id in its last column.
+Ids are handed out in increasing order and never reused within the
+partition. <partition>.idx maps each id to where its row sits in the csv
+file:
+
+    header      magic, csv mtime_ns, csv size, next id     (32 bytes)
+    slot <id>   byte offset (int64), byte length (int32)   (12 bytes each)
+
+so reading one expense costs a seek into the index and a seek into the csv
+file. A slot with length 0 has no row in the csv file: the expense was
+deleted, or exists only in the journal.
+
+The header records the csv file's mtime and size. When they no longer match
+(the file was compacted or changed by hand) the index is stale and is
+rebuilt with one scan of the file. The next id is carried over a rebuild,
+so deleting the newest expense doesn't free its id.
+
+Like journal.py, nothing here locks; LedgerStore calls it while holding the
+partition's lock.
+"""
+import csv
+import os
+import struct
+
+from personal_finance.fileio import file_signature
+
+
+MAGIC = b"PFROWIX1"
+HEADER = struct.Struct("<8sqqq")
+SLOT = struct.Struct("<qi")
+
+
+def index_path(path):
+    return path.with_name(path.name + ".idx")
+
+
+def iter_records(f):
+    """
+    Yield (offset, raw bytes) for each csv record of a file opened in binary
+    mode. A record spans several lines when a quoted field contains a newline.
+    """
+    offset = 0
+    pending = b""
+    for line in f:
+        pending += line
+        if pending.count(b'"') % 2:
+            continue
+        yield offset, pending
+        offset += len(pending)
+        pending = b""
+    if pending:
+        yield offset, pending
+
+
+def parse_line(data, encoding="utf-8"):
+    """
+    The values of one csv record given as bytes.
+    """
+    return next(csv.reader([data.decode(encoding, "replace").rstrip("\r\n")]), [])
+
+
+class RowIndex:
+    """
+    The .idx sidecar of one partition; id_column is where the id is in each
+    row and encoding is the csv file's text encoding.
+    """
+
+    def __init__(self, path, id_column, encoding="utf-8"):
+        self.path = path
+        self.index_path = index_path(path)
+        self.id_column = id_column
+        self.encoding = encoding
+
+    def _header(self):
+        """
+        (signature, next id) from the sidecar, or None if it is missing or garbled.
+        """
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, mtime_ns, size, next_id = HEADER.unpack(data)
+        if magic != MAGIC:
+            return None
+        return (mtime_ns, size), next_id
+
+    def is_current(self):
+        header = self._header()
+        return header is not None and header[0] == file_signature(self.path)
+
+    def ensure(self):
+        """
+        Rebuild the sidecar if it doesn't describe the csv file as it is now.
+        """
+        if not self.is_current():
+            self.rebuild()
+
+    def next_id(self):
+        self.ensure()
+        return self._header()[1]
+
+    def locate(self, row_id):
+        """
+        (offset, length) of the row with this id in the csv file, or None.
+        """
+        if row_id < 1:
+            return None
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(HEADER.size + (row_id - 1) * SLOT.size)
+                data = f.read(SLOT.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < SLOT.size:
+            return None
+        offset, length = SLOT.unpack(data)
+        return (offset, length) if length > 0 else None
+
+    def read_row(self, row_id):
+        """
+        The csv row with this id, or None if the csv file has no such row.
+        A slot that points at the wrong row means the sidecar is out of date
+        in a way its header didn't show; it is then rebuilt and read again.
+        """
+        for attempt in range(2):
+            self.ensure()
+            found = self.locate(row_id)
+            if found is None:
+                row = None
+            else:
+                offset, length = found
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    row = parse_line(f.read(length), self.encoding)
+            if row is None or (len(row) > self.id_column and row[self.id_column] == str(row_id)):
+                return row
+            self.rebuild()
+        return None
+
+    def record(self, first_id, offset, lengths):
+        """
+        Note rows appended to the csv file: ids first_id, first_id + 1, ...
+        written back to back from offset with the given byte lengths.
+        """
+        slots = []
+        for length in lengths:
+            slots.append(SLOT.pack(offset, length))
+            offset += length
+        header = self._header()
+        next_id = max(first_id + len(lengths), header[1] if header else 1)
+        mode = "r+b" if self.index_path.exists() else "w+b"
+        with open(self.index_path, mode) as f:
+            f.seek(HEADER.size + (first_id - 1) * SLOT.size)
+            f.write(b"".join(slots))
+            self._write_header(f, next_id)
+
+    def rebuild(self):
+        """
+        Scan the csv file and write a fresh sidecar for it.
+        """
+        header = self._header()
+        next_id = header[1] if header else 1
+        slots = {}
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            f = None
+        if f is not None:
+            with f:
+                records = iter_records(f)
+                next(records, None)  # header row
+                for offset, data in records:
+                    row = parse_line(data, self.encoding)
+                    if len(row) <= self.id_column:
+                        continue
+                    try:
+                        row_id = int(row[self.id_column])
+                    except ValueError:
+                        continue
+                    if row_id > 0:
+                        slots[row_id] = (offset, len(data))
+        if slots:
+            next_id = max(next_id, max(slots) + 1)
+
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w+b") as out:
+            empty = SLOT.pack(0, 0)
+            out.seek(HEADER.size)
+            out.write(b"".join(SLOT.pack(*slots[i]) if i in slots else empty
+                               for i in range(1, next_id)))
+            self._write_header(out, next_id)
+        os.replace(tmp_path, self.index_path)
+
+    def _write_header(self, f, next_id):
+        signature = file_signature(self.path) or (0, 0)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, signature[0], signature[1], next_id))
@@ -0,0 +1,168 @@
+"""
+Expense search.
+
+A query is a few words. Each one has to match a word of an expense's
+description or category: exactly, as a prefix (from two letters up), or,
+when neither finds anything, with one letter wrong, missing, added or
+swapped (from four letters up). Amount and date limits narrow the matches.
+
+Results are ranked by how well they match: an exact word counts more than a
+prefix and a prefix more than a typo, a word in the description more than
+one in the category, and a rare word more than a common one. Ties go to the
+most recent expense.
+
+The words (termindex.words) come from an inverted index the store keeps
+next to the expenses: termindex.py for CSV files, a full-text table in
+SQLite. The store hands it out as search chunks, each a run of indexed
+rows:
+
+    month                   YYYY-MM of its rows, None if they span months
+    size                    how many rows it has
+    terms(field, prefix)    its words of field starting with prefix, sorted
+    count(field, term)      how many of its rows have the word
+    positions(field, term)  set of the rows (numbers within it) that have it
+    rows(positions)         {position: (month, key, day, amount)}
+
+Rows outside the date range, or changed since they were indexed, are
+already left out of positions(). A search only looks up the words it asks
+for, so its cost follows the matches rather than the size of the ledger.
+"""
+import math
+
+from personal_finance.store import UNDATED_PARTITION, expense_id
+from personal_finance.termindex import FIELDS, words
+
+FIELD_WEIGHTS = {"description": 1.0, "category": 0.6}
+EXACT = 1.0
+PREFIX = 0.7
+TYPO = 0.4
+# shortest query words matched as a prefix and with a typo
+MIN_PREFIX = 2
+MIN_TYPO = 4
+DEFAULT_LIMIT = 20
+
+
+def one_edit(a, b):
+    """
+    True if a and b differ by at most one letter changed, added, removed,
+    or two neighbouring letters swapped.
+    """
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    if len(a) > len(b):
+        a, b = b, a
+    return a[i:] == b[i + 1:]
+
+
+def expand(chunks, word, typos=False):
+    """
+    {(field, term): match weight} for the indexed words that word matches.
+    """
+    found = {}
+    if typos:
+        for field in FIELDS:
+            seen = set()
+            for chunk in chunks:
+                seen.update(chunk.terms(field, ""))
+            for term in seen:
+                if abs(len(term) - len(word)) <= 1 and one_edit(word, term):
+                    found[field, term] = TYPO * FIELD_WEIGHTS[field]
+        return found
+    for chunk in chunks:
+        for field in FIELDS:
+            for term in chunk.terms(field, word):
+                if term == word:
+                    found[field, term] = EXACT * FIELD_WEIGHTS[field]
+                elif len(word) >= MIN_PREFIX:
+                    found.setdefault((field, term), PREFIX * FIELD_WEIGHTS[field])
+    return found
+
+
+def _classes(chunk, plans):
+    """
+    The chunk's rows that match every query word, as (score, positions)
+    classes: one per combination of match weights.
+    """
+    classes = [(0.0, None)]
+    for plan, idf in plans:
+        by_weight = {}
+        for key, weight in plan.items():
+            by_weight.setdefault(weight, []).append(key)
+        levels = []
+        seen = set()
+        for weight in sorted(by_weight, reverse=True):
+            rows = set()
+            for field, term in by_weight[weight]:
+                rows |= chunk.positions(field, term)
+            rows -= seen
+            if rows:
+                levels.append((weight * idf, rows))
+                seen |= rows
+        classes = [(score + weight, level if rows is None else rows & level)
+                   for score, rows in classes for weight, level in levels]
+        classes = [c for c in classes if c[1]]
+        if not classes:
+            break
+    return classes
+
+
+def search_expenses(store, username, query, date_from=None, date_to=None,
+                    min_amount=None, max_amount=None, limit=DEFAULT_LIMIT):
+    """
+    The user's expenses matching query, best first. Dates are YYYY-MM-DD
+    and amounts paise, all inclusive. Returns {"matches": how many matched,
+    "results": [(score, id, row)]} with at most limit results.
+    ValueError if the query has no words.
+    """
+    query_words = list(dict.fromkeys(words(query)))
+    if not query_words:
+        raise ValueError("search for at least one word")
+    with store.search_chunks(username, date_from, date_to) as chunks:
+        size = sum(chunk.size for chunk in chunks)
+        plans = []
+        for word in query_words:
+            plan = expand(chunks, word)
+            found = sum(chunk.count(f, t) for chunk in chunks for f, t in plan)
+            if not found and len(word) >= MIN_TYPO:
+                plan = expand(chunks, word, typos=True)
+                found = sum(chunk.count(f, t) for chunk in chunks for f, t in plan)
+            if not found:
+                return {"matches": 0, "results": []}
+            plans.append((plan, math.log(1 + size / found)))
+
+        matches = 0
+        groups = {}
+        for chunk in chunks:
+            for score, rows in _classes(chunk, plans):
+                if min_amount is not None or max_amount is not None:
+                    rows = {n for n, (month, key, day, amount) in chunk.rows(rows).items()
+                            if (min_amount is None or amount >= min_amount)
+                            and (max_amount is None or amount <= max_amount)}
+                matches += len(rows)
+                if rows:
+                    groups.setdefault((round(score, 9), chunk.month or ""), []).append((chunk, rows))
+
+        # best score first; among equal scores the newest month, then the newest day
+        picked = []
+        for group in sorted(groups, key=lambda g: (g[0], g[1] != UNDATED_PARTITION, g[1]), reverse=True):
+            if len(picked) >= limit:
+                break
+            found = []
+            for chunk, rows in groups[group]:
+                found.extend(chunk.rows(rows).values())
+            found.sort(key=lambda r: (r[2], int(r[1])), reverse=True)
+            picked.extend((group[0], month, key) for month, key, day, amount in found[:limit - len(picked)])
+
+    results = []
+    for score, month, key in picked:
+        row = store.get_expense(username, month, key)
+        if row is not None:
+            results.append((score, expense_id(month, key), row))
+    return {"matches": matches, "results": results}
@@ -0,0 +1,846 @@
+"""
+SQLite storage backend.
+
+SqliteStore offers the same operations as LedgerStore, backed by one
+database file in the data directory. Select it with
+PERSONAL_FINANCE_BACKEND=sqlite or {"backend": "sqlite"} in config.json.
+
+Move data between the two backends with:
+
+    python -m personal_finance.sqlite_store import   # csv files -> database
+    python -m personal_finance.sqlite_store export   # database -> csv files
+"""
+import argparse
+import shutil
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+from personal_finance.colcache import Columns, day_number
+from personal_finance.models import Budget, CategoryRule, RecurringRule, SavingsGoal, amount_value, format_amount, to_paise
+from personal_finance.store import EXPENSE_DIR, ConcurrentUpdateError, LedgerStore, expense_month, partition_name
+from personal_finance.termindex import Terms, words
+
+
+DB_FILE = "finance.db"
+
+BUDGETS_TABLE = """
+CREATE TABLE IF NOT EXISTS budgets (
+    username TEXT NOT NULL,
+    period TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    budget_amount REAL NOT NULL,
+    rollover INTEGER NOT NULL DEFAULT 0,
+    carried REAL NOT NULL DEFAULT 0,
+    alerted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, period, category)
+)"""
+
+# Running per-day, per-category spending, kept current by triggers on
+# expenses so that budgets are totalled from days rather than expenses.
+DAILY_TOTALS_TABLE = """
+CREATE TABLE IF NOT EXISTS daily_totals (
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (username, date, category)
+)"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS userdata (
+    username TEXT PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    age TEXT,
+    email TEXT
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    month TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    payment_mode TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (username, date);
+CREATE INDEX IF NOT EXISTS expenses_user_month ON expenses (username, month, category);
+%s;
+CREATE INDEX IF NOT EXISTS daily_totals_category ON daily_totals (username, category, date);
+CREATE TRIGGER IF NOT EXISTS expenses_add_daily AFTER INSERT ON expenses BEGIN
+    INSERT INTO daily_totals (username, date, category, total, count)
+    VALUES (NEW.username, NEW.date, NEW.category, CAST(ROUND(NEW.amount * 100) AS INTEGER), 1)
+    ON CONFLICT (username, date, category) DO UPDATE
+    SET total = total + excluded.total, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_remove_daily AFTER DELETE ON expenses BEGIN
+    UPDATE daily_totals SET total = total - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+    WHERE username = OLD.username AND date = OLD.date AND category = OLD.category;
+    DELETE FROM daily_totals
+    WHERE username = OLD.username AND date = OLD.date AND category = OLD.category AND count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_change_daily AFTER UPDATE OF username, date, amount, category ON expenses BEGIN
+    UPDATE daily_totals SET total = total - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+    WHERE username = OLD.username AND date = OLD.date AND category = OLD.category;
+    DELETE FROM daily_totals
+    WHERE username = OLD.username AND date = OLD.date AND category = OLD.category AND count <= 0;
+    INSERT INTO daily_totals (username, date, category, total, count)
+    VALUES (NEW.username, NEW.date, NEW.category, CAST(ROUND(NEW.amount * 100) AS INTEGER), 1)
+    ON CONFLICT (username, date, category) DO UPDATE
+    SET total = total + excluded.total, count = count + 1;
+END;
+%s;
+CREATE TABLE IF NOT EXISTS savings (
+    username TEXT NOT NULL,
+    goal_id INTEGER NOT NULL,
+    goal_name TEXT NOT NULL,
+    target_amount REAL NOT NULL,
+    current_amount REAL NOT NULL,
+    created_on TEXT,
+    PRIMARY KEY (username, goal_id)
+);
+CREATE TABLE IF NOT EXISTS recurring (
+    username TEXT NOT NULL,
+    rule_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL DEFAULT '',
+    last_posted TEXT NOT NULL DEFAULT '',
+    pending TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (username, rule_id)
+);
+CREATE TABLE IF NOT EXISTS category_rules (
+    username TEXT NOT NULL,
+    rule_id INTEGER NOT NULL,
+    pattern TEXT NOT NULL,
+    category TEXT NOT NULL,
+    payment_mode TEXT NOT NULL DEFAULT '',
+    min_amount REAL,
+    max_amount REAL,
+    PRIMARY KEY (username, rule_id)
+);
+""" % (DAILY_TOTALS_TABLE, BUDGETS_TABLE)
+
+# Full-text index of descriptions and categories for search (search.py),
+# kept current by triggers on expenses. The tokenizer matches
+# termindex.words(). Left out if this SQLite has no FTS5; search then reads
+# the user's expenses instead.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS expense_search USING fts5 (
+    username, description, category, content = 'expenses', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS expense_search_terms USING fts5vocab (expense_search, 'col');
+CREATE TRIGGER IF NOT EXISTS expenses_add_search AFTER INSERT ON expenses BEGIN
+    INSERT INTO expense_search (rowid, username, description, category)
+    VALUES (NEW.id, NEW.username, NEW.description, NEW.category);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_remove_search AFTER DELETE ON expenses BEGIN
+    INSERT INTO expense_search (expense_search, rowid, username, description, category)
+    VALUES ('delete', OLD.id, OLD.username, OLD.description, OLD.category);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_change_search AFTER UPDATE OF username, description, category ON expenses BEGIN
+    INSERT INTO expense_search (expense_search, rowid, username, description, category)
+    VALUES ('delete', OLD.id, OLD.username, OLD.description, OLD.category);
+    INSERT INTO expense_search (rowid, username, description, category)
+    VALUES (NEW.id, NEW.username, NEW.description, NEW.category);
+END;
+"""
+
+# All statements are constant, parameterized strings so sqlite3's statement
+# cache compiles each of them once per connection.
+SQL_PASSWORD = "SELECT password FROM users WHERE username = ?"
+SQL_ADD_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+SQL_USERNAMES = "SELECT username FROM users"
+SQL_ADD_USERDATA = ("INSERT OR REPLACE INTO userdata (username, first_name, last_name, age, email) "
+                    "VALUES (?, ?, ?, ?, ?)")
+SQL_SET_PASSWORD = "UPDATE users SET password = ? WHERE username = ?"
+BUDGET_COLUMNS = "period, category, budget_amount, alerted, rollover, carried"
+SQL_BUDGET = (f"SELECT {BUDGET_COLUMNS} FROM budgets "
+              "WHERE username = ? AND period = ? AND category = ?")
+SQL_USER_BUDGETS = (f"SELECT {BUDGET_COLUMNS} FROM budgets "
+                    "WHERE username = ? AND period = ? ORDER BY category")
+SQL_ALL_USER_BUDGETS = (f"SELECT {BUDGET_COLUMNS} FROM budgets "
+                        "WHERE username = ? ORDER BY period, category")
+SQL_MONTH_BUDGETS = (f"SELECT username, {BUDGET_COLUMNS} FROM budgets "
+                     "WHERE period = ? AND category = ''")
+SQL_PUT_BUDGET = ("INSERT OR REPLACE INTO budgets "
+                  "(username, period, category, budget_amount, alerted, rollover, carried) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SQL_ADD_BUDGET = ("INSERT OR IGNORE INTO budgets "
+                  "(username, period, category, budget_amount, alerted, rollover, carried) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SQL_MARK_ALERTED = ("UPDATE budgets SET alerted = ? WHERE username = ? AND period = ? AND category = ? "
+                    "AND budget_amount = ? AND carried = ? AND alerted < ?")
+# budgets from older versions become monthly budgets without rollover; the
+# yes/no flags from before category budgets become the highest threshold alerted
+SQL_UPGRADE_LEGACY_BUDGETS = ("INSERT INTO budgets (username, period, category, budget_amount, alerted) "
+                              "SELECT username, month, '', budget_amount, "
+                              "CASE WHEN alerted_exceeded = 'yes' THEN 100 WHEN alerted_80 = 'yes' THEN 80 "
+                              "WHEN alerted_50 = 'yes' THEN 50 ELSE 0 END FROM budgets_old")
+SQL_UPGRADE_MONTHLY_BUDGETS = ("INSERT INTO budgets (username, period, category, budget_amount, alerted) "
+                               "SELECT username, month, category, budget_amount, alerted FROM budgets_old")
+SQL_GOALS = ("SELECT username, goal_id, goal_name, target_amount, current_amount, created_on "
+             "FROM savings WHERE username = ? ORDER BY rowid")
+SQL_DELETE_GOALS = "DELETE FROM savings WHERE username = ?"
+SQL_ADD_GOAL = ("INSERT OR REPLACE INTO savings "
+                "(username, goal_id, goal_name, target_amount, current_amount, created_on) "
+                "VALUES (?, ?, ?, ?, ?, ?)")
+RULE_COLUMNS = ("username, rule_id, amount, category, description, payment_mode, schedule, "
+                "start_date, end_date, last_posted, pending")
+SQL_RULES = f"SELECT {RULE_COLUMNS} FROM recurring ORDER BY username, rule_id"
+SQL_USER_RULES = f"SELECT {RULE_COLUMNS} FROM recurring WHERE username = ? ORDER BY rule_id"
+SQL_NEXT_RULE_ID = "SELECT COALESCE(MAX(rule_id), 0) + 1 FROM recurring WHERE username = ?"
+SQL_ADD_RULE = f"INSERT INTO recurring ({RULE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+SQL_DELETE_RULE = "DELETE FROM recurring WHERE username = ? AND rule_id = ?"
+SQL_RULE_POSTED = "UPDATE recurring SET last_posted = ?, pending = '' WHERE username = ? AND rule_id = ?"
+CATEGORY_RULE_COLUMNS = "username, rule_id, pattern, category, payment_mode, min_amount, max_amount"
+SQL_CATEGORY_RULES = f"SELECT {CATEGORY_RULE_COLUMNS} FROM category_rules WHERE username = ? ORDER BY rule_id"
+SQL_ALL_CATEGORY_RULES = f"SELECT {CATEGORY_RULE_COLUMNS} FROM category_rules ORDER BY username, rule_id"
+SQL_NEXT_CATEGORY_RULE_ID = "SELECT COALESCE(MAX(rule_id), 0) + 1 FROM category_rules WHERE username = ?"
+SQL_ADD_CATEGORY_RULE = f"INSERT INTO category_rules ({CATEGORY_RULE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_DELETE_CATEGORY_RULE = "DELETE FROM category_rules WHERE username = ? AND rule_id = ?"
+SQL_EXPENSE_MONTHS = "SELECT DISTINCT month FROM expenses WHERE username = ? ORDER BY month"
+SQL_EXPENSES_IN_MONTH = ("SELECT id, date, amount, category, description, payment_mode "
+                         "FROM expenses WHERE username = ? AND month = ? ORDER BY id")
+SQL_EXPENSES_AFTER = ("SELECT id, date, amount, category, description, payment_mode "
+                      "FROM expenses WHERE username = ? AND month = ? AND id > ? ORDER BY id")
+SQL_GET_EXPENSE = ("SELECT date, amount, category, description, payment_mode "
+                   "FROM expenses WHERE id = ? AND username = ? AND month = ?")
+SQL_ADD_EXPENSE = ("INSERT INTO expenses (username, date, month, amount, category, description, payment_mode) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SQL_UPDATE_EXPENSE = ("UPDATE expenses SET date = ?, month = ?, amount = ?, category = ?, "
+                      "description = ?, payment_mode = ? WHERE id = ? AND username = ?")
+SQL_DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ? AND username = ?"
+# Amounts are REAL columns; totals are summed as integer paise so they come out exact.
+SQL_MONTH_TOTAL = ("SELECT COALESCE(SUM(CAST(ROUND(amount * 100) AS INTEGER)), 0) FROM expenses "
+                   "WHERE username = ? AND month = ?")
+SQL_CATEGORY_TOTALS = ("SELECT category, SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*) FROM expenses "
+                       "WHERE username = ? AND month = ? GROUP BY category")
+SQL_SPENT_BETWEEN = ("SELECT COALESCE(SUM(total), 0) FROM daily_totals "
+                     "WHERE username = ? AND date BETWEEN ? AND ?")
+SQL_CATEGORY_SPENT_BETWEEN = ("SELECT COALESCE(SUM(total), 0) FROM daily_totals "
+                              "WHERE username = ? AND category = ? AND date BETWEEN ? AND ?")
+SQL_SEARCH_TERMS = "SELECT term FROM expense_search_terms WHERE col = ? ORDER BY term"
+SQL_SEARCH_TERMS_FROM = ("SELECT term FROM expense_search_terms WHERE col = ? AND term >= ? AND term < ? "
+                         "ORDER BY term")
+# CROSS JOIN keeps the index lookup outermost rather than every row of the user's
+SQL_SEARCH = ("SELECT e.id, e.date, e.amount FROM expense_search CROSS JOIN expenses e "
+              "ON e.id = expense_search.rowid "
+              "WHERE expense_search MATCH ? AND e.username = ? AND e.date BETWEEN ? AND ?")
+SQL_SEARCH_ROWS = ("SELECT id, date, amount, category, description, payment_mode FROM expenses "
+                   "WHERE username = ? AND date BETWEEN ? AND ? ORDER BY id")
+SQL_ROW_COUNT = "SELECT COALESCE(SUM(count), 0) FROM daily_totals WHERE username = ? AND date BETWEEN ? AND ?"
+# daily_totals for expenses stored before it existed
+SQL_BUILD_DAILY_TOTALS = ("INSERT INTO daily_totals (username, date, category, total, count) "
+                          "SELECT username, date, category, SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*) "
+                          "FROM expenses GROUP BY username, date, category")
+
+
+def _budget(period, category, amount, alerted, rollover, carried):
+    return Budget(period, to_paise(amount), category, alerted, rollover, to_paise(carried))
+
+
+def _budget_values(username, budget):
+    return (username, budget.period, budget.category, amount_value(budget.amount), budget.alerted,
+            int(budget.rollover), amount_value(budget.carried))
+
+
+def _rule(rule_id, amount, category, description, payment_mode, schedule, start, end, last_posted, pending):
+    return RecurringRule(rule_id, to_paise(amount), category, description, payment_mode, schedule,
+                         start, end, last_posted, pending)
+
+
+def _category_rule(rule_id, pattern, category, payment_mode, min_amount, max_amount):
+    return CategoryRule(rule_id, pattern, category, payment_mode,
+                        None if min_amount is None else to_paise(min_amount),
+                        None if max_amount is None else to_paise(max_amount))
+
+
+def _category_rule_values(username, rule):
+    return (username, int(rule.rule_id), rule.pattern, rule.category, rule.payment_mode,
+            None if rule.min_amount is None else amount_value(rule.min_amount),
+            None if rule.max_amount is None else amount_value(rule.max_amount))
+
+
+def _rule_values(username, rule):
+    return (username, int(rule.rule_id), amount_value(rule.amount), rule.category, rule.description,
+            rule.payment_mode, rule.schedule, rule.start, rule.end, rule.last_posted, rule.pending)
+
+
+def _expense_values(username, row):
+    date, amount, category, description, payment = [str(v) for v in row[:5]]
+    return (username, date, expense_month(date), amount_value(to_paise(amount)), category, description, payment)
+
+
+def _same_expense(row, other):
+    """
+    Whether two expense rows hold the same values; amounts are compared as
+    paise, since the database gives them back as floats ("250.0").
+    """
+    row, other = [str(v) for v in row[:5]], [str(v) for v in other[:5]]
+    if row[1] != other[1]:
+        try:
+            if to_paise(row[1]) != to_paise(other[1]):
+                return False
+        except ValueError:
+            return False
+    return row[:1] + row[2:] == other[:1] + other[2:]
+
+
+class _SearchChunk:
+    """
+    A user's expenses in a date range as one search chunk (search.py) over
+    the expense_search index; positions are expense ids.
+    """
+
+    month = None
+
+    def __init__(self, conn, username, first, last):
+        self.conn = conn
+        self.username = username
+        self.first = first
+        self.last = last
+        self.size = conn.execute(SQL_ROW_COUNT, (username, first, last)).fetchone()[0]
+        # narrows each lookup to the user's rows inside the index
+        self._user = " ".join(_fts_string(word) for word in words(username))
+        self._positions = {}
+        self._rows = {}
+
+    def terms(self, field, prefix):
+        if prefix:
+            found = self.conn.execute(SQL_SEARCH_TERMS_FROM, (field, prefix, prefix + "\U0010ffff"))
+        else:
+            found = self.conn.execute(SQL_SEARCH_TERMS, (field,))
+        return [term for term, in found]
+
+    def count(self, field, term):
+        return len(self.positions(field, term))
+
+    def positions(self, field, term):
+        key = (field, term)
+        found = self._positions.get(key)
+        if found is None:
+            match = f"{field} : {_fts_string(term)}"
+            if self._user:
+                match = f"username : ({self._user}) AND {match}"
+            found = self._positions[key] = set()
+            for expense_id, date, amount in self.conn.execute(SQL_SEARCH, (match, self.username,
+                                                                           self.first, self.last)):
+                found.add(expense_id)
+                self._rows[expense_id] = (expense_month(date), expense_id, day_number(date), to_paise(amount))
+        return found
+
+    def rows(self, positions):
+        return {n: self._rows[n] for n in positions}
+
+
+def _fts_string(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SqliteStore:
+    """
+    Same interface as LedgerStore; expenses are addressed by their row id
+    instead of their position in a partition file.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, data_dir, db_path=None):
+        self.data_dir = Path(data_dir)
+        self.db_path = Path(db_path) if db_path else self.data_dir / DB_FILE
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        new_totals = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'").fetchone() is None
+        new_search = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expense_search'").fetchone() is None
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(SEARCH_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+        self._upgrade_budgets()
+        if new_totals:
+            self._build_daily_totals()
+        if new_search and self.full_text:
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.execute("INSERT INTO expense_search (expense_search) VALUES ('rebuild')")
+
+    def close(self):
+        self.conn.close()
+
+    def _upgrade_budgets(self):
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(budgets)")]
+        if "period" in columns:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(budgets)")]
+            if "period" in columns:
+                return
+            self.conn.execute("ALTER TABLE budgets RENAME TO budgets_old")
+            self.conn.execute(BUDGETS_TABLE)
+            self.conn.execute(SQL_UPGRADE_MONTHLY_BUDGETS if "category" in columns else SQL_UPGRADE_LEGACY_BUDGETS)
+            self.conn.execute("DROP TABLE budgets_old")
+
+    def _build_daily_totals(self):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # from scratch: another session may have added expenses since the triggers exist
+            self.conn.execute("DELETE FROM daily_totals")
+            self.conn.execute(SQL_BUILD_DAILY_TOTALS)
+
+    # ---- users ----
+
+    def password_hash(self, username):
+        row = self.conn.execute(SQL_PASSWORD, (username,)).fetchone()
+        return row[0] if row else None
+
+    def user_exists(self, username):
+        return self.password_hash(username) is not None
+
+    def add_user(self, username, hashed, first_name, last_name, age, email):
+        with self.conn:
+            self.conn.execute(SQL_ADD_USER, (username, hashed))
+            self.conn.execute(SQL_ADD_USERDATA, (username, first_name, last_name, str(age), email))
+
+    def usernames(self):
+        return {row[0] for row in self.conn.execute(SQL_USERNAMES)}
+
+    def add_users(self, accounts):
+        """
+        Register (username, hashed, first_name, last_name, age, email) tuples
+        in one transaction; usernames already registered are skipped and returned.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            taken = self.usernames()
+            new = []
+            skipped = []
+            for account in accounts:
+                if account[0] in taken:
+                    skipped.append(account[0])
+                else:
+                    taken.add(account[0])
+                    new.append(account)
+            self.conn.executemany(SQL_ADD_USER, [(u, h) for u, h, *_ in new])
+            self.conn.executemany(SQL_ADD_USERDATA, [(u, f, l, str(a), e) for u, h, f, l, a, e in new])
+        return skipped
+
+    def set_password(self, username, hashed):
+        with self.conn:
+            self.conn.execute(SQL_SET_PASSWORD, (hashed, username))
+
+    # ---- budgets ----
+
+    def budget(self, username, period, category=""):
+        row = self.conn.execute(SQL_BUDGET, (username, period, category)).fetchone()
+        return _budget(*row) if row is not None else None
+
+    def budgets(self, username, period):
+        return [_budget(*row) for row in self.conn.execute(SQL_USER_BUDGETS, (username, period))]
+
+    def user_budgets(self, username):
+        by_period = {}
+        for row in self.conn.execute(SQL_ALL_USER_BUDGETS, (username,)):
+            by_period.setdefault(row[0], []).append(_budget(*row))
+        return by_period
+
+    def month_budgets(self, month):
+        return {row[0]: _budget(*row[1:]) for row in self.conn.execute(SQL_MONTH_BUDGETS, (month,))}
+
+    def put_budget(self, username, budget, replace=True):
+        with self.conn:
+            cur = self.conn.execute(SQL_PUT_BUDGET if replace else SQL_ADD_BUDGET, _budget_values(username, budget))
+        return cur.rowcount > 0
+
+    def mark_alerted(self, username, budget, alerted):
+        with self.conn:
+            cur = self.conn.execute(SQL_MARK_ALERTED, (alerted, username, budget.period, budget.category,
+                                                       amount_value(budget.amount), amount_value(budget.carried),
+                                                       alerted))
+        return cur.rowcount > 0
+
+    # ---- savings goals ----
+
+    def goals(self, username):
+        return [SavingsGoal(goal_id, name, to_paise(target), to_paise(saved), created_on)
+                for _, goal_id, name, target, saved, created_on in self.conn.execute(SQL_GOALS, (username,))]
+
+    def put_goals(self, username, goals_list, default_created_on):
+        with self.conn:
+            self._replace_goals(username, goals_list, default_created_on)
+
+    def modify_goals(self, username, change, default_created_on):
+        """
+        Read, change(goals) and write back the user's goals in one
+        IMMEDIATE transaction, so concurrent sessions are serialized.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            goals = self.goals(username)
+            change(goals)
+            self._replace_goals(username, goals, default_created_on)
+
+    def _replace_goals(self, username, goals_list, default_created_on):
+        self.conn.execute(SQL_DELETE_GOALS, (username,))
+        self.conn.executemany(SQL_ADD_GOAL, [
+            (username, int(g.goal_id), g.name, amount_value(g.target),
+             amount_value(g.saved), g.created_on or default_created_on)
+            for g in goals_list
+        ])
+
+    # ---- recurring expenses ----
+
+    def recurring_rules(self, username=None):
+        if username is None:
+            rows = self.conn.execute(SQL_RULES)
+        else:
+            rows = self.conn.execute(SQL_USER_RULES, (username,))
+        return [(row[0], _rule(*row[1:])) for row in rows]
+
+    def add_rule(self, username, rule):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rule.rule_id = self.conn.execute(SQL_NEXT_RULE_ID, (username,)).fetchone()[0]
+            self.conn.execute(SQL_ADD_RULE, _rule_values(username, rule))
+        return rule.rule_id
+
+    def delete_rule(self, username, rule_id):
+        with self.conn:
+            cur = self.conn.execute(SQL_DELETE_RULE, (username, int(rule_id)))
+        return cur.rowcount > 0
+
+    def post_recurring(self, plan):
+        """
+        Post due occurrences (see LedgerStore.post_recurring); the rows and
+        the rules' new dates are written in one IMMEDIATE transaction, so a
+        run is never left halfway.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            postings = plan(self.recurring_rules())
+            self.conn.executemany(SQL_ADD_EXPENSE, [_expense_values(username, row)
+                                                    for username, _, _, rows in postings for row in rows])
+            self.conn.executemany(SQL_RULE_POSTED, [(through, username, rule.rule_id)
+                                                    for username, rule, through, _ in postings])
+        for username, rule, through, rows in postings:
+            rule.last_posted, rule.pending = through, ""
+        return postings
+
+    # ---- category rules ----
+
+    def category_rules(self, username):
+        return [_category_rule(*row[1:]) for row in self.conn.execute(SQL_CATEGORY_RULES, (username,))]
+
+    def add_category_rule(self, username, rule):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rule.rule_id = self.conn.execute(SQL_NEXT_CATEGORY_RULE_ID, (username,)).fetchone()[0]
+            self.conn.execute(SQL_ADD_CATEGORY_RULE, _category_rule_values(username, rule))
+        return rule.rule_id
+
+    def delete_category_rule(self, username, rule_id):
+        with self.conn:
+            cur = self.conn.execute(SQL_DELETE_CATEGORY_RULE, (username, int(rule_id)))
+        return cur.rowcount > 0
+
+    # ---- expenses ----
+
+    def expense_months(self, username):
+        return [row[0] for row in self.conn.execute(SQL_EXPENSE_MONTHS, (username,))]
+
+    def expense_rows(self, username, month):
+        return [row for _, row in self.month_expenses(username, month)]
+
+    def month_expenses(self, username, month):
+        """
+        (id, row) pairs of one month, oldest first.
+        """
+        for expense_id, date, amount, category, description, payment in \
+                self.conn.execute(SQL_EXPENSES_IN_MONTH, (username, month)):
+            yield expense_id, [date, str(amount), category, description, payment]
+
+    def stream_expenses(self, username, month, after=0):
+        """
+        (id, row) pairs of one month with an id above after, oldest first.
+        """
+        for expense_id, date, amount, category, description, payment in \
+                self.conn.execute(SQL_EXPENSES_AFTER, (username, month, int(after))):
+            yield expense_id, [date, str(amount), category, description, payment]
+
+    def iter_expenses(self, username):
+        """
+        Yield (month, id, row) for every expense of the user, oldest month first.
+        """
+        for month in self.expense_months(username):
+            for expense_id, row in self.month_expenses(username, month):
+                yield month, expense_id, row
+
+    def expense_columns(self, username, month):
+        """
+        One month as colcache.Columns; there is no cache file, the query is the source.
+        """
+        columns = Columns()
+        for expense_id, row in self.month_expenses(username, month):
+            columns.add_row(row + [expense_id], 5)
+        return columns
+
+    @contextmanager
+    def search_chunks(self, username, date_from=None, date_to=None):
+        """
+        The search chunks (search.py) of the user's expenses dated
+        date_from..date_to: one over the full-text index, or without FTS5
+        one per month indexed on the spot.
+        """
+        # as with LedgerStore, undated expenses are searched only when no date is given
+        if date_from or date_to:
+            first, last = date_from or "0000-00-00", date_to or "9999-99-99"
+        else:
+            first, last = "", "\U0010ffff"
+        if self.full_text:
+            yield [_SearchChunk(self.conn, username, first, last)]
+            return
+        chunks = {}
+        for expense_id, date, amount, category, description, payment in \
+                self.conn.execute(SQL_SEARCH_ROWS, (username, first, last)):
+            chunk = chunks.get(expense_month(date))
+            if chunk is None:
+                chunk = chunks[expense_month(date)] = Terms()
+                chunk.month = expense_month(date)
+            chunk.add_row([date, str(amount), category, description, payment, expense_id], 5)
+        yield list(chunks.values())
+
+    def get_expense(self, username, month, expense_id):
+        """
+        One expense's row, or None if the user has no expense with this id
+        in month (as with LedgerStore, where the month names the partition).
+        """
+        try:
+            expense_id = int(expense_id)
+        except ValueError:
+            return None
+        found = self.conn.execute(SQL_GET_EXPENSE, (expense_id, username, month)).fetchone()
+        if found is None:
+            return None
+        date, amount, category, description, payment = found
+        return [date, str(amount), category, description, payment]
+
+    def add_expense(self, username, row):
+        with self.conn:
+            cur = self.conn.execute(SQL_ADD_EXPENSE, _expense_values(username, row))
+        return str(cur.lastrowid)
+
+    def add_expenses(self, username, month, rows):
+        """
+        Store rows in one transaction and return their ids, as strings.
+        """
+        with self.conn:
+            return [str(self.conn.execute(SQL_ADD_EXPENSE, _expense_values(username, row)).lastrowid)
+                    for row in rows]
+
+    def update_expense(self, username, month, expense_id, row, expected=None):
+        """
+        Replace an expense. If expected is given and the stored row no longer
+        equals it, or the expense is gone, ConcurrentUpdateError is raised, as
+        with LedgerStore; the check and the write are one IMMEDIATE transaction.
+        """
+        values = _expense_values(username, row)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._check_expense(username, month, expense_id, expected)
+            self.conn.execute(SQL_UPDATE_EXPENSE, values[1:] + (expense_id, username))
+
+    def delete_expense(self, username, month, expense_id, expected=None):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._check_expense(username, month, expense_id, expected)
+            self.conn.execute(SQL_DELETE_EXPENSE, (expense_id, username))
+
+    def _check_expense(self, username, month, expense_id, expected):
+        current = self.get_expense(username, month, expense_id)
+        if current is None:
+            raise ConcurrentUpdateError("The expense was deleted by another session.")
+        if expected is not None and not _same_expense(current, expected):
+            raise ConcurrentUpdateError("The expense was changed by another session.")
+
+    def monthly_total(self, username, month):
+        """
+        The user's spending in a month, in paise.
+        """
+        return self.conn.execute(SQL_MONTH_TOTAL, (username, month)).fetchone()[0]
+
+    def category_totals(self, username, month):
+        return {category: (total, count) for category, total, count in
+                self.conn.execute(SQL_CATEGORY_TOTALS, (username, month))}
+
+    def spending_between(self, username, first, last, category=None):
+        """
+        The user's spending in paise dated first..last (inclusive), in all
+        categories or one.
+        """
+        if category is None:
+            return self.conn.execute(SQL_SPENT_BETWEEN, (username, first, last)).fetchone()[0]
+        return self.conn.execute(SQL_CATEGORY_SPENT_BETWEEN, (username, category, first, last)).fetchone()[0]
+
+    def has_legacy_expenses(self):
+        return False
+
+
+def import_csv(data_dir, db_path=None):
+    """
+    Copy every csv file in data_dir into the database, replacing what is there.
+    Returns {table: rows imported}.
+    """
+    csv_store = LedgerStore(data_dir)
+    db = SqliteStore(data_dir, db_path)
+    counts = {}
+    conn = db.conn
+    with conn:
+        for table in ("users", "userdata", "expenses", "budgets", "savings", "recurring", "category_rules"):
+            conn.execute(f"DELETE FROM {table}")
+
+        users = [(r["username"], r["password"]) for r in csv_store.table("password.csv").records
+                 if r is not None and r["username"]]
+        conn.executemany("INSERT OR REPLACE INTO users (username, password) VALUES (?, ?)", users)
+        counts["users"] = len(users)
+
+        userdata = [(r["Username"], r["First Name"], r["Last Name"], r["Age"], r["Email"])
+                    for r in csv_store.table("userdata.csv").records if r is not None]
+        conn.executemany(SQL_ADD_USERDATA, userdata)
+        counts["userdata"] = len(userdata)
+
+        budgets = [_budget_values(r["username"], Budget(r["period"], r["budget_amount"], r["category"], r["alerted"],
+                                                         r["rollover"], r["carried"]))
+                   for r in csv_store.table("budget.csv").records if r is not None]
+        conn.executemany(SQL_PUT_BUDGET, budgets)
+        counts["budgets"] = len(budgets)
+
+        goals = [(r["username"], r["goal_id"], r["goal_name"], amount_value(r["target_amount"]),
+                  amount_value(r["current_amount"]), r["created_on"])
+                 for r in csv_store.table("savings.csv").records if r is not None]
+        conn.executemany(SQL_ADD_GOAL, goals)
+        counts["savings"] = len(goals)
+
+        rules = [_rule_values(username, rule) for username, rule in csv_store.recurring_rules()]
+        conn.executemany(SQL_ADD_RULE, rules)
+        counts["recurring"] = len(rules)
+
+        category_rules = [_category_rule_values(r["username"], CategoryRule(
+                              r["rule_id"], r["pattern"], r["category"], r["payment_mode"],
+                              r["min_amount"], r["max_amount"]))
+                          for r in csv_store.table("category_rules.csv").records if r is not None]
+        conn.executemany(SQL_ADD_CATEGORY_RULE, category_rules)
+        counts["category_rules"] = len(category_rules)
+
+        expenses = 0
+        for username in csv_store.expense_users():
+            for month in csv_store.expense_months(username):
+                table = csv_store.table(partition_name(username, month))
+                values = [
+                    (username, r["date"], expense_month(r["date"]), amount_value(r["amount"]),
+                     r["category"], r["description"], r["payment_mode"])
+                    for r in table.records if r is not None
+                ]
+                conn.executemany(SQL_ADD_EXPENSE, values)
+                expenses += len(values)
+        counts["expenses"] = expenses
+
+    if csv_store.has_legacy_expenses():
+        print("Note: expenses.csv has not been migrated to per-user files yet and was not imported.")
+    db.close()
+    return counts
+
+
+def export_csv(data_dir, db_path=None):
+    """
+    Write the database back out as the csv files LedgerStore reads,
+    replacing them. Everything is read from the database first; the
+    expenses folder is then cleared just before the partitions are written,
+    so partitions of expenses no longer in the database and their
+    .idx/.cols/.terms and totals.json sidecars don't outlive the export.
+    FileNotFoundError, with nothing touched, if the database doesn't exist.
+    Returns {file: rows written}.
+    """
+    db_file = Path(db_path) if db_path else Path(data_dir) / DB_FILE
+    if not db_file.is_file():
+        raise FileNotFoundError(f"There is no database at {db_file}; nothing was exported.")
+    db = SqliteStore(data_dir, db_path)
+    conn = db.conn
+    files = {}
+
+    files["password.csv"] = [list(r) for r in conn.execute("SELECT username, password FROM users ORDER BY rowid")]
+    files["userdata.csv"] = [[f, l, a, e, u] for u, f, l, a, e in conn.execute(
+        "SELECT username, first_name, last_name, age, email FROM userdata ORDER BY rowid")]
+    files["budget.csv"] = [
+        [u, p, c, format_amount(to_paise(a)), "yes" if r else "no", format_amount(to_paise(carried)), str(al)]
+        for u, p, c, a, r, carried, al in conn.execute(
+            "SELECT username, period, category, budget_amount, rollover, carried, alerted "
+            "FROM budgets ORDER BY rowid")]
+    files["savings.csv"] = [list(r) for r in conn.execute(
+        "SELECT username, goal_id, goal_name, target_amount, current_amount, created_on "
+        "FROM savings ORDER BY rowid")]
+    files["recurring.csv"] = [rule.to_row(username) for username, rule in db.recurring_rules()]
+    files["category_rules.csv"] = [_category_rule(*row[1:]).to_row(row[0])
+                                   for row in conn.execute(SQL_ALL_CATEGORY_RULES)]
+
+    partitions = {}
+    for (username,) in conn.execute("SELECT DISTINCT username FROM expenses").fetchall():
+        for month in db.expense_months(username):
+            # partition ids are numbered per month, not taken from the database
+            partitions[partition_name(username, month)] = [
+                row + [str(i)] for i, row in enumerate(db.expense_rows(username, month), start=1)]
+    db.close()
+
+    csv_store = LedgerStore(data_dir)
+    counts = {}
+    for name, rows in files.items():
+        csv_store.write_rows(name, rows)
+        counts[name] = len(rows)
+    shutil.rmtree(Path(data_dir) / EXPENSE_DIR, ignore_errors=True)
+    for name, rows in partitions.items():
+        csv_store.write_rows(name, rows)
+    counts["expenses"] = sum(len(rows) for rows in partitions.values())
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m personal_finance.sqlite_store",
+        description="Copy data between the csv files and the SQLite database."
+    )
+    parser.add_argument("direction", choices=["import", "export"],
+                        help="import: csv -> database, export: database -> csv")
+    parser.add_argument("--data-dir", default=str(Path.home() / ".personal_finance_data"))
+    parser.add_argument("--db", default=None, help=f"database file (default: <data-dir>/{DB_FILE})")
+    args = parser.parse_args(argv)
+
+    if args.direction == "import":
+        counts = import_csv(args.data_dir, args.db)
+    else:
+        try:
+            counts = export_csv(args.data_dir, args.db)
+        except FileNotFoundError as e:
+            raise SystemExit(str(e))
+    for name, n in counts.items():
+        print(f"{name}: {n}")
+
+
+if __name__ == "__main__":
+    main()
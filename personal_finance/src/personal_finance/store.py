@@ -0,0 +1,1298 @@
+import csv
+import locale
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from personal_finance import journal
+from personal_finance.colcache import INVALID_DAY, ColumnCache, day_number
+from personal_finance.config import get_setting
+from personal_finance.fileio import file_signature, fsync_file, locked
+from personal_finance.models import Budget, CategoryRule, RecurringRule, SavingsGoal, format_amount, to_paise
+from personal_finance.rowindex import RowIndex, iter_records, parse_line
+from personal_finance.termindex import TermCache, Terms
+from personal_finance.totals import SpendingIndex
+
+
+PASSWORD_HEADER = ["username", "password"]
+USERDATA_HEADER = ["First Name", "Last Name", "Age", "Email", "Username"]
+EXPENSE_HEADER = ["date", "amount", "category", "description", "payment_mode"]
+# period is a week, month, quarter or year (budgets.py); category is empty
+# for a budget on all of the period's spending; rollover is yes/no and
+# carried the amount brought over from the period before; alerted is the
+# highest alert threshold (percent) already shown for the budget.
+BUDGET_HEADER = ["username", "period", "category", "budget_amount", "rollover", "carried", "alerted"]
+# budget.csv before category budgets, with one yes/no column per fixed threshold
+LEGACY_BUDGET_HEADER = ["username", "month", "budget_amount", "alerted_50", "alerted_80", "alerted_exceeded"]
+# budget.csv with category budgets but only monthly ones
+MONTHLY_BUDGET_HEADER = ["username", "month", "category", "budget_amount", "alerted"]
+SAVINGS_HEADER = ["username", "goal_id", "goal_name", "target_amount", "current_amount", "created_on"]
+# recurring expense rules (recurring.py); end, last_posted and pending are
+# YYYY-MM-DD dates or empty
+RECURRING_HEADER = ["username", "rule_id", "amount", "category", "description", "payment_mode",
+                    "schedule", "start", "end", "last_posted", "pending"]
+# automatic category rules (categorize.py); payment_mode and the amounts are
+# empty when the rule doesn't limit them
+CATEGORY_RULE_HEADER = ["username", "rule_id", "pattern", "category", "payment_mode", "min_amount", "max_amount"]
+# Expense partitions add a stable id to every row. The store hands rows in
+# and out without it (EXPENSE_HEADER layout) and passes the id as the key.
+PARTITION_HEADER = EXPENSE_HEADER + ["id"]
+
+# Expenses are stored per user and per month as expenses/<user>/<YYYY-MM>.csv.
+# expenses.csv is the old shared ledger, kept only until it is migrated.
+EXPENSE_DIR = "expenses"
+EXPENSE_PARTITION = "expenses/<user>/<month>.csv"
+LEGACY_EXPENSE_FILE = "expenses.csv"
+UNDATED_PARTITION = "undated"
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+HEADERS = {
+    "password.csv": PASSWORD_HEADER,
+    "userdata.csv": USERDATA_HEADER,
+    "expenses.csv": EXPENSE_HEADER,
+    "budget.csv": BUDGET_HEADER,
+    "savings.csv": SAVINGS_HEADER,
+    "recurring.csv": RECURRING_HEADER,
+    "category_rules.csv": CATEGORY_RULE_HEADER,
+    EXPENSE_PARTITION: PARTITION_HEADER,
+}
+
+# Columns that identify a row for journal upserts/deletes. Tables not listed
+# here (the legacy expenses.csv) are keyed by the row's position in the base file.
+KEY_COLUMNS = {
+    "password.csv": [0],
+    "budget.csv": [0, 1, 2],
+    "savings.csv": [0, 1],
+    "recurring.csv": [0, 1],
+    "category_rules.csv": [0, 1],
+    EXPENSE_PARTITION: [5],
+}
+
+DEFAULT_JOURNAL_MAX_BYTES = 64 * 1024
+
+# What open() uses by default, which is how every data file is read and
+# written; appends encode rows themselves to know their byte lengths.
+TEXT_ENCODING = locale.getpreferredencoding(False)
+
+# Appends of more rows than this drop the cached table instead of parsing
+# every new row into it; it is reloaded from disk when next needed.
+CACHE_APPEND_LIMIT = 1000
+
+# Optimistic attempts at a read-modify-write before falling back to
+# computing it under the lock.
+MAX_RETRIES = 4
+
+# Columns that are converted when a file is loaded; everything else stays
+# str. Amounts become integer paise (models.py).
+CONVERTERS = {
+    "expenses.csv": {"amount": to_paise},
+    EXPENSE_PARTITION: {"amount": to_paise},
+    "budget.csv": {"budget_amount": to_paise, "rollover": lambda value: value == "yes",
+                   "carried": lambda value: to_paise(value or 0), "alerted": lambda value: int(value or 0)},
+    "savings.csv": {"goal_id": int, "target_amount": to_paise, "current_amount": to_paise},
+    "recurring.csv": {"rule_id": int, "amount": to_paise},
+    "category_rules.csv": {"rule_id": int, "min_amount": lambda value: to_paise(value) if value else None,
+                           "max_amount": lambda value: to_paise(value) if value else None},
+}
+
+
+class _CsvLines(list):
+    """
+    File-like target for csv.writer that keeps each written row as one string.
+    """
+
+    def write(self, text):
+        self.append(text)
+
+
+class ConcurrentUpdateError(Exception):
+    """
+    Another session changed the data this write was based on.
+    """
+
+
+def table_kind(name):
+    """
+    The file name whose header and converters apply to a table; all expense
+    partitions share EXPENSE_PARTITION.
+    """
+    if name.startswith(EXPENSE_DIR + "/"):
+        return EXPENSE_PARTITION
+    return name
+
+
+def user_dir(username):
+    return f"{EXPENSE_DIR}/{quote(username, safe='')}"
+
+
+def expense_month(date):
+    """
+    Partition key for an expense date: its YYYY-MM prefix.
+    """
+    month = date[:7]
+    return month if _MONTH_RE.match(month) else UNDATED_PARTITION
+
+
+def partition_name(username, month):
+    return f"{user_dir(username)}/{month}.csv"
+
+
+def expense_id(month, key):
+    """
+    The id users see for an expense: its month and its key within the month.
+    """
+    return f"{month}/{key}"
+
+
+def split_expense_id(value):
+    """
+    (month, key) from an expense id; ValueError if it isn't one.
+    """
+    month, sep, key = str(value).partition("/")
+    if not sep or not key or (month != UNDATED_PARTITION and not _MONTH_RE.match(month)):
+        raise ValueError(f"'{value}' is not an expense id (like 2024-05/17)")
+    return month, key
+
+
+def parse_record(header, converters, row):
+    """
+    Turn a raw csv row into a dict with typed values, or None if it can't be parsed.
+    Short rows are padded with empty strings the same way DictReader does.
+    """
+    if not row:
+        return None
+    record = {}
+    for i, name in enumerate(header):
+        value = row[i] if i < len(row) else ""
+        convert = converters.get(name)
+        if convert is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                return None
+        record[name] = value
+    return record
+
+
+class Table:
+    """
+    In-memory copy of one csv file with its journal applied.
+
+    rows holds the raw string rows (header excluded) so untouched rows are
+    written back exactly as they were read; records holds the typed dict for
+    each row, or None where the row could not be parsed; keys holds the
+    journal key of each row.
+    """
+
+    def __init__(self, name, header, signature):
+        self.name = name
+        self.header = header
+        self.signature = signature
+        self.rows = []
+        self.records = []
+        self.keys = []
+        # rows physically in the base file, deleted ones included
+        self.base_count = 0
+        self._converters = CONVERTERS.get(table_kind(name), {})
+        self._key_columns = KEY_COLUMNS.get(table_kind(name))
+        self._positions = None
+
+    def key_for(self, row):
+        if self._key_columns is None:
+            return None
+        return tuple(row[i] if i < len(row) else "" for i in self._key_columns)
+
+    def add(self, row, key=None):
+        """
+        Add a row; without an explicit key it is a row of the base file.
+        """
+        if key is None:
+            key = self.key_for(row)
+            if key is None:
+                key = (str(self.base_count),)
+            self.base_count += 1
+        self.rows.append(row)
+        self.records.append(parse_record(self.header, self._converters, row))
+        self.keys.append(key)
+        if self._positions is not None:
+            self._positions.setdefault(key, []).append(len(self.rows) - 1)
+
+    def find(self, key):
+        """
+        Positions of the rows with this key.
+        """
+        if self._positions is None:
+            self._positions = {}
+            for i, k in enumerate(self.keys):
+                self._positions.setdefault(k, []).append(i)
+        return self._positions.get(key, [])
+
+    def apply(self, entries):
+        """
+        Apply journal entries (op, key, row) in order.
+        """
+        deleted = False
+        for op, key, row in entries:
+            positions = [i for i in self.find(key) if self.rows[i] is not None]
+            if op == journal.UPSERT:
+                if positions:
+                    record = parse_record(self.header, self._converters, row)
+                    for i in positions:
+                        self.rows[i] = row
+                        self.records[i] = record
+                else:
+                    self.add(row, key)
+            else:
+                for i in positions:
+                    self.rows[i] = None
+                    deleted = True
+        if deleted:
+            keep = [i for i, row in enumerate(self.rows) if row is not None]
+            self.rows = [self.rows[i] for i in keep]
+            self.records = [self.records[i] for i in keep]
+            self.keys = [self.keys[i] for i in keep]
+            self._positions = None
+
+
+class LedgerStore:
+    """
+    Single read/write layer over the csv files in the data directory.
+
+    Each file is parsed once per session and kept as a Table. Every access
+    stats the file and its journal and reloads them only if an mtime or size
+    changed, so edits made by another process are still picked up. Writes go
+    through the store so the cached copy stays current without a reread.
+
+    Appends go straight to the file. Changes to existing rows are appended
+    to the file's journal, and the journal is compacted into the file once it
+    grows past journal_max_bytes.
+
+    Every write holds the file's advisory lock and re-reads the table under
+    it if another process got there first, so concurrent sessions don't lose
+    each other's appends. Writes that depend on what was read first go
+    through modify(), which retries when the file changed in between.
+
+    Expense partitions also keep a byte-offset row index (rowindex.py), so
+    appending, reading, editing or deleting one expense by id doesn't parse
+    the whole partition, and a columnar cache (colcache.py) that totals and
+    reports read instead of the csv.
+    """
+
+    backend = "csv"
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self._tables = {}
+        self._indexes = {}
+        self._local = threading.local()
+        self.journal_max_bytes = int(get_setting(
+            self.data_dir, "journal_max_bytes",
+            "PERSONAL_FINANCE_JOURNAL_MAX_BYTES", DEFAULT_JOURNAL_MAX_BYTES
+        ))
+
+    def path(self, name):
+        return self.data_dir / name
+
+    @contextmanager
+    def lock(self, name):
+        """
+        Hold a file's lock. Re-entering it on the same thread is a no-op, so
+        helpers can lock without knowing whether their caller already does.
+        """
+        held = self._local.__dict__.setdefault("held", set())
+        if name in held:
+            yield
+            return
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with locked(path):
+            held.add(name)
+            try:
+                yield
+            finally:
+                held.discard(name)
+
+    # ---- generic table access ----
+
+    def signature(self, name):
+        """
+        Signatures of a file and its journal; changes whenever either changes.
+        """
+        path = self.path(name)
+        return (file_signature(path), file_signature(journal.journal_path(path)))
+
+    def table(self, name):
+        signature = self.signature(name)
+        cached = self._tables.get(name)
+        if cached is not None and cached.signature == signature:
+            return cached
+
+        path = self.path(name)
+        if journal.needs_recovery(path):
+            with self.lock(name):
+                journal.recover(path)
+            signature = self.signature(name)
+        kind = table_kind(name)
+        table = Table(name, list(HEADERS.get(kind, [])), signature)
+        if signature[0] is not None:
+            with open(path, "r", newline="") as f:
+                reader = csv.reader(f)
+                first = next(reader, None)
+                if kind == EXPENSE_PARTITION and first == EXPENSE_HEADER:
+                    return self._upgrade_partition(name)
+                if kind == "budget.csv" and first in (LEGACY_BUDGET_HEADER, MONTHLY_BUDGET_HEADER):
+                    return self._upgrade_budgets()
+                if first is not None and not table.header:
+                    table.header = first
+                for row in reader:
+                    table.add(row)
+        if signature[1] is not None:
+            table.apply(journal.read_journal(path, len(table.header)))
+        self._tables[name] = table
+        return table
+
+    def _current_table(self, name):
+        """
+        The cached table if it still matches the file, without loading anything.
+        """
+        cached = self._tables.get(name)
+        if cached is not None and cached.signature == self.signature(name):
+            return cached
+        return None
+
+    def _check_partition(self, name):
+        """
+        Upgrade an expense partition to the id layout if it predates it,
+        reading only its first line.
+        """
+        try:
+            with open(self.path(name), "r", newline="") as f:
+                first = next(csv.reader(f), None)
+        except FileNotFoundError:
+            return
+        if first == EXPENSE_HEADER:
+            self._upgrade_partition(name)
+
+    def _upgrade_partition(self, name):
+        """
+        Give an expense partition written before rows had ids an id column,
+        numbering its rows (journal applied) from 1.
+        """
+        with self.lock(name):
+            path = self.path(name)
+            with open(path, "r", newline="") as f:
+                reader = csv.reader(f)
+                if next(reader, None) != EXPENSE_HEADER:
+                    return self.table(name)
+                old = Table(LEGACY_EXPENSE_FILE, EXPENSE_HEADER, None)
+                for row in reader:
+                    old.add(row)
+            old.apply(journal.read_journal(path, len(EXPENSE_HEADER)))
+            rows = [(row + [""] * 5)[:5] + [str(i)] for i, row in enumerate(old.rows, start=1)]
+            self._write_rows(name, rows)
+            return self.table(name)
+
+    def _upgrade_budgets(self):
+        """
+        Rewrite a budget.csv from an older version: budgets from before
+        category budgets become whole-month ones with their yes/no flags
+        turned into the highest threshold alerted, and every monthly budget
+        gets a period and no rollover.
+        """
+        name = "budget.csv"
+        with self.lock(name):
+            path = self.path(name)
+            with open(path, "r", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header not in (LEGACY_BUDGET_HEADER, MONTHLY_BUDGET_HEADER):
+                    return self.table(name)
+                old = Table(name, header, None)
+                # journal entries of an old layout are keyed by its own columns
+                old._key_columns = [0, 1] if header == LEGACY_BUDGET_HEADER else [0, 1, 2]
+                for row in reader:
+                    old.add(row)
+            old.apply(journal.read_journal(path, len(header)))
+            rows = []
+            for row in old.rows:
+                if header == LEGACY_BUDGET_HEADER:
+                    username, month, amount, alerted_50, alerted_80, alerted_exceeded = (row + [""] * 6)[:6]
+                    category = ""
+                    alerted = 100 if alerted_exceeded == "yes" else 80 if alerted_80 == "yes" \
+                        else 50 if alerted_50 == "yes" else 0
+                else:
+                    username, month, category, amount, alerted = (row + [""] * 5)[:5]
+                rows.append([username, month, category, amount, "no", "0.00", str(alerted or 0)])
+            self._tables.pop(name, None)
+            self._write_rows(name, rows)
+            return self.table(name)
+
+    def append_rows(self, name, rows):
+        """
+        Append rows to a file (writing the header first if the file is new)
+        and to the cached table.
+        """
+        with self.lock(name):
+            self._append_rows(name, rows)
+
+    def write_rows(self, name, rows):
+        """
+        Replace every data row of a file, discarding its journal.
+        """
+        with self.lock(name):
+            self._write_rows(name, rows)
+
+    def change_rows(self, name, entries):
+        """
+        Record (op, key, row) changes to existing rows in the file's journal
+        and apply them to the cached table.
+        """
+        with self.lock(name):
+            self._change_rows(name, entries)
+
+    def upsert_rows(self, name, rows):
+        rows = [[str(v) for v in row] for row in rows]
+        with self.lock(name):
+            table = self.table(name)
+            self._change_rows(name, [(journal.UPSERT, table.key_for(row), row) for row in rows])
+
+    def modify(self, name, compute):
+        """
+        Optimistic read-modify-write. compute(table) returns the journal
+        entries to record; it runs without the lock and is re-run against a
+        fresh copy if the file changed before the lock was taken. Under heavy
+        contention the last attempt computes while holding the lock, so the
+        write always goes through.
+        """
+        for attempt in range(MAX_RETRIES):
+            table = self.table(name)
+            seen = table.signature
+            entries = compute(table)
+            with self.lock(name):
+                if self.signature(name) == seen:
+                    if entries:
+                        self._change_rows(name, entries)
+                    return
+            time.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+
+        with self.lock(name):
+            entries = compute(self.table(name))
+            if entries:
+                self._change_rows(name, entries)
+
+    def compact(self, name):
+        """
+        Fold a file's journal into a new copy of the file.
+        """
+        with self.lock(name):
+            self._write_rows(name, self.table(name).rows)
+
+    # The helpers below expect the caller to hold the file's lock.
+
+    def _recover(self, name):
+        path = self.path(name)
+        if journal.needs_recovery(path):
+            journal.recover(path)
+
+    def _append_rows(self, name, rows):
+        """
+        Append rows without loading the table. Returns the byte offset the
+        rows were written at and the byte length of each row.
+        """
+        self._recover(name)
+        cached = self._current_table(name)
+        path = self.path(name)
+        kind = table_kind(name)
+        rows = [[str(v) for v in row] for row in rows]
+
+        lines = _CsvLines()
+        writer = csv.writer(lines)
+        base = file_signature(path)
+        if base is None or base[1] == 0:
+            writer.writerow(cached.header if cached is not None else HEADERS.get(kind, []))
+        header_lines = len(lines)
+        writer.writerows(rows)
+        data = "".join(lines).encode(TEXT_ENCODING)
+        with open(path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            fsync_file(f)
+
+        if data.isascii():
+            lengths = [len(line) for line in lines]
+        else:
+            lengths = [len(line.encode(TEXT_ENCODING)) for line in lines]
+        offset += sum(lengths[:header_lines])
+        lengths = lengths[header_lines:]
+
+        if cached is None or len(rows) > CACHE_APPEND_LIMIT:
+            self._tables.pop(name, None)
+        else:
+            for row in rows:
+                cached.add(row)
+            cached.signature = self.signature(name)
+        return offset, lengths
+
+    def _write_rows(self, name, rows):
+        kind = table_kind(name)
+        cached = self._tables.get(name)
+        header = cached.header if cached is not None else list(HEADERS.get(kind, []))
+        rows = [[str(v) for v in row] for row in rows]
+        journal.compact(self.path(name), header, rows)
+
+        fresh = Table(name, header, None)
+        for row in rows:
+            fresh.add(row)
+        fresh.signature = self.signature(name)
+        self._tables[name] = fresh
+        if kind == EXPENSE_PARTITION:
+            self._row_index(name).rebuild()
+
+    def _change_rows(self, name, entries):
+        """
+        Journal the entries; the cached table is updated if it is loaded and
+        current, but not loaded just for this.
+        """
+        self._recover(name)
+        cached = self._current_table(name)
+        path = self.path(name)
+        entries = [(op, key, [str(v) for v in row] if row is not None else None)
+                   for op, key, row in entries]
+        journal.append_journal(path, entries)
+        if cached is not None:
+            cached.apply(entries)
+            cached.signature = self.signature(name)
+        else:
+            self._tables.pop(name, None)
+        size = file_signature(journal.journal_path(path))
+        if size is not None and size[1] > self.journal_max_bytes:
+            self._write_rows(name, self.table(name).rows)
+
+    def _row_index(self, name):
+        return RowIndex(self.path(name), len(EXPENSE_HEADER), TEXT_ENCODING)
+
+    # ---- users ----
+
+    def password_hash(self, username):
+        """
+        The user's stored password hash, or None. Looked up through the
+        table's key positions, which are built once per load of password.csv.
+        """
+        table = self.table("password.csv")
+        for i in table.find((username,)):
+            record = table.records[i]
+            if record is not None:
+                return record["password"]
+        return None
+
+    def user_exists(self, username):
+        return self.password_hash(username) is not None
+
+    def add_user(self, username, hashed, first_name, last_name, age, email):
+        self.append_rows("password.csv", [[username, hashed]])
+        self.append_rows("userdata.csv", [[first_name, last_name, age, email, username]])
+
+    def usernames(self):
+        """
+        Set of every registered username.
+        """
+        return {r["username"] for r in self.table("password.csv").records if r is not None}
+
+    def add_users(self, accounts):
+        """
+        Register (username, hashed, first_name, last_name, age, email) tuples
+        with one append to each file. Usernames that are already registered
+        are left alone and returned.
+        """
+        with self.lock("password.csv"), self.lock("userdata.csv"):
+            taken = self.usernames()
+            new = []
+            skipped = []
+            for account in accounts:
+                if account[0] in taken:
+                    skipped.append(account[0])
+                else:
+                    taken.add(account[0])
+                    new.append(account)
+            if new:
+                self._append_rows("password.csv", [[u, h] for u, h, *_ in new])
+                self._append_rows("userdata.csv", [[f, l, a, e, u] for u, h, f, l, a, e in new])
+        return skipped
+
+    def set_password(self, username, hashed):
+        self.upsert_rows("password.csv", [[username, hashed]])
+
+    # ---- budgets ----
+
+    def budget(self, username, period, category=""):
+        """
+        The user's Budget for a period (and category), or None.
+        """
+        table = self.table("budget.csv")
+        positions = table.find((username, period, category))
+        record = table.records[positions[-1]] if positions else None
+        return _budget(record) if record is not None else None
+
+    def budgets(self, username, period):
+        """
+        Every Budget the user has for a period: the one for all spending
+        first, then one per category.
+        """
+        return self.user_budgets(username).get(period, [])
+
+    def user_budgets(self, username):
+        """
+        {period: [Budget]} of every budget the user has, ordered as budgets()
+        orders them, in one pass.
+        """
+        by_period = {}
+        for record in self.table("budget.csv").records:
+            if record is not None and record["username"] == username:
+                by_period.setdefault(record["period"], []).append(_budget(record))
+        for found in by_period.values():
+            found.sort(key=lambda b: (b.category != "", b.category))
+        return by_period
+
+    def month_budgets(self, month):
+        """
+        {username: Budget} of every whole-month budget for month, in one pass.
+        """
+        budgets = {}
+        for record in self.table("budget.csv").records:
+            if record is not None and record["period"] == month and not record["category"]:
+                budgets[record["username"]] = _budget(record)
+        return budgets
+
+    def put_budget(self, username, budget, replace=True):
+        """
+        Write a budget. Without replace it is only added if the user has
+        none for its period and category yet; returns whether it was written.
+        """
+        new_row = _budget_row(username, budget, budget.alerted)
+        if replace:
+            self.upsert_rows("budget.csv", [new_row])
+            return True
+        done = []
+
+        def compute(table):
+            done.clear()
+            if any(table.records[i] is not None for i in table.find(table.key_for(new_row))):
+                return []
+            done.append(True)
+            return [(journal.UPSERT, table.key_for(new_row), new_row)]
+
+        self.modify("budget.csv", compute)
+        return bool(done)
+
+    def mark_alerted(self, username, budget, alerted):
+        """
+        Record that alerts up to alerted percent were shown for budget, unless
+        the budget was changed or removed since it was read. Returns whether
+        it was recorded.
+        """
+        done = []
+
+        def compute(table):
+            done.clear()
+            positions = table.find((username, budget.period, budget.category))
+            record = table.records[positions[-1]] if positions else None
+            if record is None or record["budget_amount"] != budget.amount \
+                    or record["carried"] != budget.carried or record["alerted"] >= alerted:
+                return []
+            done.append(True)
+            row = _budget_row(username, budget, alerted)
+            return [(journal.UPSERT, table.key_for(row), row)]
+
+        self.modify("budget.csv", compute)
+        return bool(done)
+
+    # ---- savings goals ----
+
+    def goals(self, username):
+        """
+        The user's SavingsGoals, in file order.
+        """
+        return [_goal(r) for r in self.table("savings.csv").records
+                if r is not None and r["username"] == username]
+
+    def put_goals(self, username, goals_list, default_created_on):
+        """
+        Make goals_list (SavingsGoals) the user's complete set of goals.
+        """
+        self.modify("savings.csv", lambda table: _goal_entries(
+            table, username, goals_list, default_created_on))
+
+    def modify_goals(self, username, change, default_created_on):
+        """
+        Read the user's goals, let change(goals) edit the list in place and
+        write the result, retrying if another session changed savings.csv
+        in between.
+        """
+        def compute(table):
+            goals = [_goal(r) for r in table.records if r is not None and r["username"] == username]
+            change(goals)
+            return _goal_entries(table, username, goals, default_created_on)
+
+        self.modify("savings.csv", compute)
+
+    # ---- recurring expenses ----
+
+    def recurring_rules(self, username=None):
+        """
+        (username, RecurringRule) for every rule, or every rule of username.
+        """
+        return [(r["username"], _rule(r)) for r in self.table("recurring.csv").records
+                if r is not None and (username is None or r["username"] == username)]
+
+    def add_rule(self, username, rule):
+        """
+        Store a new rule under the user's next free id, which is returned.
+        """
+        def compute(table):
+            ids = [r["rule_id"] for r in table.records if r is not None and r["username"] == username]
+            rule.rule_id = max(ids, default=0) + 1
+            row = rule.to_row(username)
+            return [(journal.UPSERT, table.key_for(row), row)]
+
+        self.modify("recurring.csv", compute)
+        return rule.rule_id
+
+    def delete_rule(self, username, rule_id):
+        """
+        Remove one of the user's rules; False if there was no such rule.
+        """
+        done = []
+
+        def compute(table):
+            done.clear()
+            key = (username, str(rule_id))
+            if not any(table.records[i] is not None for i in table.find(key)):
+                return []
+            done.append(True)
+            return [(journal.DELETE, key, None)]
+
+        self.modify("recurring.csv", compute)
+        return bool(done)
+
+    def post_recurring(self, plan):
+        """
+        Post due occurrences. plan(rules) gets every (username, rule) and
+        returns (username, rule, through, rows) for the rules to post: the
+        ledger rows to add and the date the rule is then posted up to. Runs
+        are serialized by the rules file's lock. Each rule is first marked
+        pending up to through, then all rows are appended with one write per
+        user and month, then the rules are marked posted; returns the
+        postings.
+        """
+        name = "recurring.csv"
+        with self.lock(name):
+            postings = plan(self.recurring_rules())
+            if not postings:
+                return postings
+            for username, rule, through, rows in postings:
+                rule.pending = through
+            self.upsert_rows(name, [rule.to_row(username) for username, rule, _, _ in postings])
+            months = {}
+            for username, rule, through, rows in postings:
+                for row in rows:
+                    months.setdefault((username, expense_month(row[0])), []).append(row)
+            for (username, month), rows in months.items():
+                self.add_expenses(username, month, rows)
+            for username, rule, through, rows in postings:
+                rule.last_posted, rule.pending = through, ""
+            self.upsert_rows(name, [rule.to_row(username) for username, rule, _, _ in postings])
+        return postings
+
+    # ---- category rules ----
+
+    def category_rules(self, username):
+        """
+        The user's CategoryRules, oldest first.
+        """
+        rules = [_category_rule(r) for r in self.table("category_rules.csv").records
+                 if r is not None and r["username"] == username]
+        return sorted(rules, key=lambda rule: rule.rule_id)
+
+    def add_category_rule(self, username, rule):
+        """
+        Store a new category rule under the user's next free id, which is returned.
+        """
+        def compute(table):
+            ids = [r["rule_id"] for r in table.records if r is not None and r["username"] == username]
+            rule.rule_id = max(ids, default=0) + 1
+            row = rule.to_row(username)
+            return [(journal.UPSERT, table.key_for(row), row)]
+
+        self.modify("category_rules.csv", compute)
+        return rule.rule_id
+
+    def delete_category_rule(self, username, rule_id):
+        """
+        Remove one of the user's category rules; False if there was no such rule.
+        """
+        done = []
+
+        def compute(table):
+            done.clear()
+            key = (username, str(rule_id))
+            if not any(table.records[i] is not None for i in table.find(key)):
+                return []
+            done.append(True)
+            return [(journal.DELETE, key, None)]
+
+        self.modify("category_rules.csv", compute)
+        return bool(done)
+
+    # ---- expenses ----
+
+    def expense_users(self):
+        """
+        Usernames that have an expense directory.
+        """
+        try:
+            names = os.listdir(self.path(EXPENSE_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted(unquote(n) for n in names if os.path.isdir(self.path(f"{EXPENSE_DIR}/{n}")))
+
+    def expense_months(self, username):
+        """
+        Months that have an expense partition for the user, oldest first.
+        """
+        try:
+            names = os.listdir(self.path(user_dir(username)))
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-4] for n in names if n.endswith(".csv"))
+
+    def expense_rows(self, username, month):
+        return [row[:5] for row in self.table(partition_name(username, month)).rows]
+
+    def month_expenses(self, username, month):
+        """
+        (key, row) pairs of one month partition, in file order; key is the
+        expense's id within the month.
+        """
+        table = self.table(partition_name(username, month))
+        return ((key[0], row[:5]) for key, row in zip(table.keys, table.rows))
+
+    def stream_expenses(self, username, month, after=0):
+        """
+        Yield (key, row) for the month's expenses whose id is above after, in
+        id order, reading the partition from the first such row onwards
+        instead of loading the table. Memory stays bounded by the journal.
+
+        The journal, the start offset and the file's size are taken under the
+        lock; rows appended while the caller is still reading are left for
+        the next call.
+        """
+        name = partition_name(username, month)
+        path = self.path(name)
+        with self.lock(name):
+            self._check_partition(name)
+            self._recover(name)
+            # latest journalled state of each key: its row, or None if deleted
+            changes = {}
+            for op, key, row in journal.read_journal(path, len(PARTITION_HEADER)):
+                changes[key[0]] = row[:5] if op == journal.UPSERT else None
+            row_index = self._row_index(name)
+            row_index.ensure()
+            start = None
+            for row_id in range(after + 1, row_index.next_id()):
+                start = row_index.locate(row_id)
+                if start is not None:
+                    break
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                f = None
+            end = file_signature(path)[1] if f is not None else 0
+
+        if f is not None and start is not None:
+            with f:
+                f.seek(start[0])
+                for offset, data in iter_records(f):
+                    if start[0] + offset >= end:
+                        break
+                    row = parse_line(data, TEXT_ENCODING)
+                    if len(row) < len(PARTITION_HEADER):
+                        continue
+                    key = row[5]
+                    if key in changes:
+                        row = changes.pop(key)
+                        if row is None:
+                            continue
+                    yield key, row[:5]
+        elif f is not None:
+            f.close()
+        # ids that only exist in the journal
+        for key, row in changes.items():
+            if row is not None and key.isdigit() and int(key) > after:
+                yield key, row
+
+    def expense_columns(self, username, month):
+        """
+        One month's expenses as colcache.Columns (typed columns, amounts in
+        paise), from the partition's columnar cache with the journal applied.
+        """
+        name = partition_name(username, month)
+        path = self.path(name)
+        with self.lock(name):
+            self._check_partition(name)
+            self._recover(name)
+            columns = ColumnCache(path, len(EXPENSE_HEADER), TEXT_ENCODING).load()
+            columns.apply(journal.read_journal(path, len(PARTITION_HEADER)), len(EXPENSE_HEADER))
+        return columns
+
+    @contextmanager
+    def search_chunks(self, username, date_from=None, date_to=None):
+        """
+        The search chunks (search.py) of the user's expenses dated
+        date_from..date_to (YYYY-MM-DD, either may be None): each month
+        partition's .terms index, brought up to date first, and its
+        journal's rows indexed in memory, which hide the rows they replace.
+        """
+        first_day = day_number(date_from) if date_from else None
+        last_day = day_number(date_to) if date_to else None
+        files = []
+        chunks = []
+        try:
+            for month in self.expense_months(username):
+                if _MONTH_RE.match(month):
+                    if (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+                        continue
+                    whole = (not date_from or f"{month}-01" >= date_from) and (not date_to or f"{month}-31" <= date_to)
+                else:
+                    whole = not (date_from or date_to)
+                name = partition_name(username, month)
+                path = self.path(name)
+                with self.lock(name):
+                    self._check_partition(name)
+                    self._recover(name)
+                    cache = TermCache(path, len(EXPENSE_HEADER), TEXT_ENCODING)
+                    cache.update()
+                    entries = journal.read_journal(path, len(PARTITION_HEADER))
+                    index = cache.open()
+                files.append(index)
+                latest = {}
+                for op, key, row in entries:
+                    latest[key[0]] = row
+                changed = {int(key) for key in latest if key.isdigit()}
+                overlay = Terms()
+                for row in latest.values():
+                    if row is not None:
+                        overlay.add_row(row, len(EXPENSE_HEADER))
+                for chunk in index.chunks + [overlay]:
+                    chunk.month = month
+                    hidden = changed if chunk is not overlay else ()
+                    if whole:
+                        chunk.restrict(changed=hidden)
+                    else:
+                        chunk.restrict(first_day, last_day, hidden)
+                    chunks.append(chunk)
+            yield chunks
+        finally:
+            for index in files:
+                index.close()
+
+    def get_expense(self, username, month, key):
+        """
+        One expense's row, read through the row index, or None if there is
+        no expense with this key.
+        """
+        name = partition_name(username, month)
+        with self.lock(name):
+            self._check_partition(name)
+            return self._find_expense(name, str(key))
+
+    def iter_expenses(self, username):
+        """
+        Yield (month, key, row) for every expense of the user, in file order.
+        key identifies the row for get_expense/update_expense/delete_expense.
+        """
+        for month in self.expense_months(username):
+            for key, row in self.month_expenses(username, month):
+                yield month, key, row
+
+    def spending_index(self, username, month):
+        """
+        The user's spending index with the given month up to date. Only that
+        month's partition is reread, and only if the index was built from a
+        different version of it.
+
+        Writers update the index while holding the partition's lock. Two
+        sessions saving the sidecar at once can drop each other's months,
+        but a month is always checked against its partition's signature
+        before use, so a dropped month is simply rebuilt.
+        """
+        index = self._indexes.get(username)
+        if index is None:
+            index = SpendingIndex(self.path(f"{user_dir(username)}/totals.json"))
+            self._indexes[username] = index
+
+        name = partition_name(username, month)
+        signature = self.signature(name)
+        if index.source(month) == signature:
+            return index
+        if index.load() and index.source(month) == signature:
+            return index
+
+        index.rebuild_month(month, _index_entries(self.expense_columns(username, month)), signature)
+        index.path.parent.mkdir(parents=True, exist_ok=True)
+        index.save()
+        return index
+
+    def add_expense(self, username, row):
+        """
+        Store one expense and return its key.
+        """
+        month = expense_month(str(row[0]))
+        return self.add_expenses(username, month, [row])[0]
+
+    def add_expenses(self, username, month, rows):
+        """
+        Append rows that all belong to one month partition in a single write.
+        Returns the keys given to them.
+        """
+        name = partition_name(username, month)
+        with self.lock(name):
+            self._check_partition(name)
+            index = self.spending_index(username, month)
+            row_index = self._row_index(name)
+            first = row_index.next_id()
+            keys = [str(first + i) for i in range(len(rows))]
+            rows = [[str(v) for v in row[:5]] + [key] for row, key in zip(rows, keys)]
+            offset, lengths = self._append_rows(name, rows)
+            row_index.record(first, offset, lengths)
+            # keep a search index current once there is one
+            terms = TermCache(self.path(name), len(EXPENSE_HEADER), TEXT_ENCODING)
+            if terms.exists():
+                terms.update()
+            for row in rows:
+                try:
+                    amount = to_paise(row[1])
+                except ValueError:
+                    continue
+                index.add(month, row[2], amount, _day(row[0]))
+            index.set_source(month, self.signature(name))
+            index.save()
+        return keys
+
+    def update_expense(self, username, month, key, row, expected=None):
+        """
+        Replace the expense with this key (from iter_expenses) in a month partition.
+        If expected is given and the stored row no longer equals it (another
+        session edited, deleted or compacted it), ConcurrentUpdateError is raised.
+        """
+        self._change_expense(username, month, (journal.UPSERT, key, row), expected)
+
+    def delete_expense(self, username, month, key, expected=None):
+        self._change_expense(username, month, (journal.DELETE, key, None), expected)
+
+    def _change_expense(self, username, month, entry, expected):
+        op, key, row = entry
+        key = str(key)
+        name = partition_name(username, month)
+        converters = CONVERTERS[EXPENSE_PARTITION]
+        with self.lock(name):
+            self._check_partition(name)
+            index = self.spending_index(username, month)
+            current = self._find_expense(name, key)
+            if expected is not None and current != [str(v) for v in expected]:
+                raise ConcurrentUpdateError("The expense was changed by another session.")
+            if current is not None:
+                old = parse_record(EXPENSE_HEADER, converters, current)
+                if old is not None:
+                    index.remove(month, old["category"], old["amount"], _day(old["date"]))
+            if op == journal.UPSERT:
+                row = [str(v) for v in row[:5]] + [key]
+            self._change_rows(name, [(op, (key,), row)])
+            if op == journal.UPSERT:
+                new = parse_record(EXPENSE_HEADER, converters, row)
+                if new is not None:
+                    index.add(month, new["category"], new["amount"], _day(new["date"]))
+            index.set_source(month, self.signature(name))
+            index.save()
+
+    def _find_expense(self, name, key):
+        """
+        Current row (without the id) of the expense with this key: from the
+        cached table if it is current, else the journal's latest entry for
+        the key, else the base file through the row index.
+        """
+        table = self._current_table(name)
+        if table is not None:
+            positions = table.find((key,))
+            return table.rows[positions[-1]][:5] if positions else None
+
+        path = self.path(name)
+        for op, k, row in reversed(journal.read_journal(path, len(PARTITION_HEADER))):
+            if k == (key,):
+                return row[:5] if op == journal.UPSERT else None
+        try:
+            row_id = int(key)
+        except ValueError:
+            return None
+        row = self._row_index(name).read_row(row_id)
+        return row[:5] if row is not None else None
+
+    def monthly_total(self, username, month):
+        """
+        The user's spending in a month, in paise.
+        """
+        return self.spending_index(username, month).month_total(month)
+
+    def category_totals(self, username, month):
+        """
+        {category: (paise, count)} for one month.
+        """
+        return self.spending_index(username, month).category_totals(month)
+
+    def spending_between(self, username, first, last, category=None):
+        """
+        The user's spending in paise dated first..last (YYYY-MM-DD,
+        inclusive), in all categories or one. Whole months come from their
+        totals and part months from their day totals, so once those are built
+        the cost depends on the number of months, not of expenses.
+        """
+        first_day, last_day = day_number(first), day_number(last)
+        total = 0
+        year, month_number = int(first[:4]), int(first[5:7])
+        while (year, month_number) <= (int(last[:4]), int(last[5:7])):
+            month = f"{year:04d}-{month_number:02d}"
+            year, month_number = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+            if self.signature(partition_name(username, month)) == (None, None):
+                continue
+            index = self.spending_index(username, month)
+            next_month = f"{year:04d}-{month_number:02d}-01"
+            if first <= f"{month}-01" and day_number(next_month) - 1 <= last_day:
+                if category is None:
+                    total += index.month_total(month)
+                else:
+                    total += index.category_totals(month).get(category, (0, 0))[0]
+            else:
+                if not index.has_days(month):
+                    index.rebuild_days(month, _index_entries(self.expense_columns(username, month)))
+                month_first = max(first_day, day_number(f"{month}-01"))
+                month_last = min(last_day, day_number(next_month) - 1)
+                total += index.days_total(month, month_first, month_last, category)
+        return total
+
+    def has_legacy_expenses(self):
+        table = self.table(LEGACY_EXPENSE_FILE)
+        return bool(table.rows)
+
+    def legacy_expense_owners(self):
+        """
+        The usernames in the shared expenses.csv's username column, or None
+        if it has no such column (files written by the app never do).
+        """
+        header = self._legacy_expense_header()
+        if "username" not in header:
+            return None
+        column = header.index("username")
+        return {row[column] for row in self.table(LEGACY_EXPENSE_FILE).rows if len(row) > column and row[column]}
+
+    def _legacy_expense_header(self):
+        try:
+            with open(self.path(LEGACY_EXPENSE_FILE), "r", newline="") as f:
+                return next(csv.reader(f), None) or EXPENSE_HEADER
+        except FileNotFoundError:
+            return EXPENSE_HEADER
+
+    def migrate_legacy_expenses(self, username=None):
+        """
+        One-time move of the shared expenses.csv into per-user partitions;
+        the file is kept as expenses.csv.migrated. Rows go to the user in
+        their username column if the file has one, otherwise to username.
+        Raises ValueError, moving nothing, if a row has neither. Returns
+        {user: rows moved}.
+        """
+        with self.lock(LEGACY_EXPENSE_FILE):
+            table = self.table(LEGACY_EXPENSE_FILE)
+            header = self._legacy_expense_header()
+            if "username" in header:
+                owner = header.index("username")
+                fields = [header.index(name) if name in header else None for name in EXPENSE_HEADER]
+            else:
+                owner, fields = None, range(len(EXPENSE_HEADER))
+
+            by_user = {}
+            for row in table.rows:
+                if not row:
+                    continue
+                user = (row[owner] if owner is not None and owner < len(row) else "") or username
+                if not user:
+                    raise ValueError("expenses.csv has rows that name no user.")
+                values = [row[i] if i is not None and i < len(row) else "" for i in fields]
+                by_user.setdefault(user, {}).setdefault(expense_month(values[0]), []).append(values)
+
+            for user, by_month in by_user.items():
+                for month, rows in by_month.items():
+                    self.add_expenses(user, month, rows)
+
+            if table.signature[0] is not None:
+                os.replace(self.path(LEGACY_EXPENSE_FILE), self.path(LEGACY_EXPENSE_FILE + ".migrated"))
+                self._tables.pop(LEGACY_EXPENSE_FILE, None)
+        return {user: sum(len(rows) for rows in by_month.values()) for user, by_month in by_user.items()}
+
+
+def _index_entries(columns):
+    """
+    (category, paise, day) for every row of a month's columns, the way the
+    spending index is built.
+    """
+    names = columns.category_names
+    for c, paise, day in zip(columns.categories, columns.amounts, columns.days):
+        yield names[c], paise, day if day != INVALID_DAY else None
+
+
+def _day(date):
+    """
+    The spending index's day bucket for a date, or None if it isn't one.
+    """
+    day = day_number(str(date))
+    return day if day != INVALID_DAY else None
+
+
+def _budget(record):
+    return Budget(record["period"], record["budget_amount"], record["category"], record["alerted"],
+                  record["rollover"], record["carried"])
+
+
+def _budget_row(username, budget, alerted):
+    return [username, budget.period, budget.category, format_amount(budget.amount),
+            "yes" if budget.rollover else "no", format_amount(budget.carried), str(alerted)]
+
+
+def _rule(record):
+    return RecurringRule(record["rule_id"], record["amount"], record["category"], record["description"],
+                         record["payment_mode"], record["schedule"], record["start"], record["end"],
+                         record["last_posted"], record["pending"])
+
+
+def _category_rule(record):
+    return CategoryRule(record["rule_id"], record["pattern"], record["category"], record["payment_mode"],
+                        record["min_amount"], record["max_amount"])
+
+
+def _goal(record):
+    return SavingsGoal(record["goal_id"], record["goal_name"], record["target_amount"],
+                       record["current_amount"], record["created_on"])
+
+
+def _goal_entries(table, username, goals_list, default_created_on):
+    """
+    Journal entries that turn the user's goals in savings.csv into goals_list.
+    """
+    rows = [g.to_row(username, default_created_on) for g in goals_list]
+    keep = {table.key_for(row) for row in rows}
+    entries = [(journal.DELETE, key, None) for key in dict.fromkeys(table.keys)
+               if key[0] == username and key not in keep]
+    entries.extend((journal.UPSERT, table.key_for(row), row) for row in rows)
+    return entries
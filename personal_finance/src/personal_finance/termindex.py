@@ -0,0 +1,369 @@
+"""
+Inverted index of expense partitions, for search (search.py).
+
+<partition>.terms lists, for every word of the rows' descriptions and
+categories, the rows it occurs in. Like the .cols cache it is a header
+followed by chunks and is kept in step with the csv file the same way
+(colcache.ColumnCache, whose header it shares): rows appended to the file
+are indexed as one more chunk, and anything else rebuilds it.
+
+    chunk    row count, posting count, then for each field its word
+             count and the byte length of its words, then
+             ids        int64   the row's expense id
+             days       int32   colcache.day_number of its date
+             amounts    int64   amount in paise
+             postings   int32   row numbers within the chunk, grouped by word
+             and for each field (description, category):
+             firsts     int32   where each word's postings start
+             counts     int32   how many postings each word has
+             words      utf-8   the words, sorted, one per line
+
+A search maps the file and reads the word lists and only the postings and
+rows of the words it looks up. Rows whose amount isn't a number are
+left out, as in the .cols cache. The journal isn't covered: the store
+indexes its rows separately (Terms) and hides the rows they replace.
+"""
+import bisect
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from array import array
+
+from personal_finance.colcache import HEADER, INVALID_DAY, MAX_CHUNKS, ColumnCache, day_number, tail_crc
+from personal_finance.models import to_paise
+
+MAGIC = b"PFTERM01"
+CHUNK = struct.Struct("<qqqqqq")
+FIELDS = ("description", "category")
+# where each field is in an expense row
+FIELD_COLUMNS = {"description": 3, "category": 2}
+_WORD_RE = re.compile(r"[^\W_]+")
+_ID = struct.Struct("<q")
+_DAY = struct.Struct("<i")
+
+
+def words(text):
+    """
+    The lower-case words of text, with accents taken off, in order.
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _WORD_RE.findall(text)
+
+
+def _prefixed(sorted_words, prefix):
+    """
+    The words of a sorted list that start with prefix.
+    """
+    if not prefix:
+        return sorted_words
+    start = bisect.bisect_left(sorted_words, prefix)
+    return sorted_words[start:bisect.bisect_left(sorted_words, prefix + "\U0010ffff", start)]
+
+
+class _Chunk:
+    """
+    What both kinds of chunk share: the search chunk interface (search.py)
+    over _postings() and _row(), and the rows to hide from it.
+    """
+
+    month = None
+
+    def __init__(self):
+        self.hidden = set()
+        self._positions = {}
+
+    @property
+    def size(self):
+        return len(self) - len(self.hidden)
+
+    def restrict(self, first_day=None, last_day=None, changed=()):
+        """
+        Leave out rows dated outside first_day..last_day (day numbers) and
+        rows whose id is in changed.
+        """
+        if first_day is None and last_day is None and not changed:
+            return
+        low = INVALID_DAY + 1 if first_day is None else first_day
+        high = 2 ** 31 - 1 if last_day is None else last_day
+        ids, days = self._column("ids"), self._column("days")
+        self.hidden = {n for n in range(len(ids)) if ids[n] in changed or not low <= days[n] <= high}
+        self._positions.clear()
+
+    def count(self, field, term):
+        return len(self.positions(field, term))
+
+    def positions(self, field, term):
+        key = (field, term)
+        found = self._positions.get(key)
+        if found is None:
+            found = self._positions[key] = set(self._postings(field, term)) - self.hidden
+        return found
+
+    def rows(self, positions):
+        found = {}
+        for n in positions:
+            row_id, day, amount = self._row(n)
+            found[n] = (self.month, str(row_id), day, amount)
+        return found
+
+
+class Terms(_Chunk):
+    """
+    Rows indexed in memory: id, day and amount columns, and for each field
+    {word: array of row numbers}.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ids = array("q")
+        self.days = array("i")
+        self.amounts = array("q")
+        self.words = {field: {} for field in FIELDS}
+        self._days = {}
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_row(self, row, id_column):
+        """
+        Index a csv row (date, amount, category, description, mode, ..., id).
+        Returns False, adding nothing, if the amount or id doesn't parse.
+        """
+        if len(row) <= id_column:
+            return False
+        try:
+            paise = to_paise(row[1])
+            row_id = int(row[id_column])
+        except ValueError:
+            return False
+        day = self._days.get(row[0])
+        if day is None:
+            day = self._days[row[0]] = day_number(row[0])
+        number = len(self.ids)
+        self.ids.append(row_id)
+        self.days.append(day)
+        self.amounts.append(paise)
+        for field in FIELDS:
+            postings = self.words[field]
+            for word in dict.fromkeys(words(row[FIELD_COLUMNS[field]])):
+                found = postings.get(word)
+                if found is None:
+                    found = postings[word] = array("i")
+                found.append(number)
+        self._sorted.clear()
+        return True
+
+    def extend(self, other):
+        """
+        Add other's rows after these.
+        """
+        base = len(self)
+        self.ids.extend(other.ids)
+        self.days.extend(other.days)
+        self.amounts.extend(other.amounts)
+        for field in FIELDS:
+            postings = self.words[field]
+            for word, rows in other.words[field].items():
+                postings.setdefault(word, array("i")).extend(n + base for n in rows)
+        self._sorted.clear()
+
+    def terms(self, field, prefix):
+        found = self._sorted.get(field)
+        if found is None:
+            found = self._sorted[field] = sorted(self.words[field])
+        return _prefixed(found, prefix)
+
+    def _column(self, name):
+        return getattr(self, name)
+
+    def _postings(self, field, term):
+        return self.words[field].get(term, ())
+
+    def _row(self, n):
+        return self.ids[n], self.days[n], self.amounts[n]
+
+
+class TermChunk(_Chunk):
+    """
+    One chunk of a .terms file, read from its mapping as needed.
+    """
+
+    def __init__(self, mm, offset):
+        super().__init__()
+        self.mm = mm
+        rows, postings, *sizes = CHUNK.unpack_from(mm, offset)
+        self.length = rows
+        self._ids = offset + CHUNK.size
+        self._days = self._ids + 8 * rows
+        self._amounts = self._days + 4 * rows
+        self._postings_at = self._amounts + 8 * rows
+        offset = self._postings_at + 4 * postings
+        # field -> (words, firsts, counts)
+        self.dictionary = {}
+        for field, count, size in zip(FIELDS, sizes[0::2], sizes[1::2]):
+            firsts = array("i", mm[offset:offset + 4 * count])
+            counts = array("i", mm[offset + 4 * count:offset + 8 * count])
+            offset += 8 * count
+            text = mm[offset:offset + size].decode("utf-8")
+            offset += size
+            self.dictionary[field] = (text.split("\n") if text else [], firsts, counts)
+        self.end = offset
+
+    def __len__(self):
+        return self.length
+
+    def terms(self, field, prefix):
+        return _prefixed(self.dictionary[field][0], prefix)
+
+    def _find(self, field, term):
+        found, firsts, counts = self.dictionary[field]
+        i = bisect.bisect_left(found, term)
+        if i < len(found) and found[i] == term:
+            return firsts[i], counts[i]
+        return 0, 0
+
+    def count(self, field, term):
+        if self.hidden:
+            return super().count(field, term)
+        return self._find(field, term)[1]
+
+    def _postings(self, field, term):
+        first, count = self._find(field, term)
+        start = self._postings_at + 4 * first
+        return array("i", self.mm[start:start + 4 * count])
+
+    def _column(self, name):
+        if name == "ids":
+            return array("q", self.mm[self._ids:self._days])
+        return array("i", self.mm[self._days:self._amounts])
+
+    def _row(self, n):
+        return (_ID.unpack_from(self.mm, self._ids + 8 * n)[0],
+                _DAY.unpack_from(self.mm, self._days + 4 * n)[0],
+                _ID.unpack_from(self.mm, self._amounts + 8 * n)[0])
+
+    def load(self):
+        """
+        The chunk's rows as Terms, for merging chunks.
+        """
+        terms = Terms()
+        terms.ids = self._column("ids")
+        terms.days = self._column("days")
+        terms.amounts = array("q", self.mm[self._amounts:self._postings_at])
+        for field in FIELDS:
+            found, firsts, counts = self.dictionary[field]
+            for word, first, count in zip(found, firsts, counts):
+                start = self._postings_at + 4 * first
+                terms.words[field][word] = array("i", self.mm[start:start + 4 * count])
+        return terms
+
+
+class TermFile:
+    """
+    A .terms file mapped for reading; close() when done with its chunks.
+    """
+
+    def __init__(self, path):
+        self.chunks = []
+        self._mm = None
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            end = HEADER.unpack(f.read(HEADER.size))[-1]
+            if end <= HEADER.size:
+                return
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = HEADER.size
+        while offset < end:
+            chunk = TermChunk(self._mm, offset)
+            self.chunks.append(chunk)
+            offset = chunk.end
+
+    def close(self):
+        self.chunks = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class TermCache(ColumnCache):
+    """
+    The .terms index of one partition csv file (see ColumnCache for the
+    arguments).
+    """
+
+    magic = MAGIC
+    suffix = ".terms"
+
+    def exists(self):
+        return os.path.exists(self.cache_path)
+
+    def update(self):
+        """
+        Index the rows appended to the csv file since the index was written,
+        or rebuild it if the file changed any other way. The caller holds
+        the partition's lock.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        header = self._read_header()
+        if header is not None:
+            mtime_ns, size, inode, tail, chunks, end = header
+            if (mtime_ns, size, inode) == (st.st_mtime_ns, st.st_size, st.st_ino):
+                return
+            if inode == st.st_ino and size <= st.st_size and tail_crc(self.path, size) == tail:
+                added = Terms()
+                self._parse(added, size)
+                if chunks + 1 > MAX_CHUNKS:
+                    terms = self._read()
+                    terms.extend(added)
+                    self._write(terms, st)
+                else:
+                    self._write_chunk(added, header, st)
+                return
+        terms = Terms()
+        self._parse(terms, 0)
+        self._write(terms, st)
+
+    def open(self):
+        """
+        The index's chunks, mapped; the caller closes the TermFile.
+        """
+        return TermFile(self.cache_path)
+
+    def _read(self):
+        terms = Terms()
+        index = self.open()
+        try:
+            for chunk in index.chunks:
+                terms.extend(chunk.load())
+        finally:
+            index.close()
+        return terms
+
+    def _chunk_bytes(self, terms):
+        postings = array("i")
+        sizes = []
+        parts = []
+        for field in FIELDS:
+            found = sorted(terms.words[field])
+            firsts, counts = array("i"), array("i")
+            for word in found:
+                rows = terms.words[field][word]
+                firsts.append(len(postings))
+                counts.append(len(rows))
+                postings.extend(rows)
+            text = "\n".join(found).encode("utf-8")
+            sizes.extend([len(found), len(text)])
+            parts.extend([firsts.tobytes(), counts.tobytes(), text])
+        return b"".join([CHUNK.pack(len(terms), len(postings), *sizes), terms.ids.tobytes(),
+                         terms.days.tobytes(), terms.amounts.tobytes(), postings.tobytes()] + parts)
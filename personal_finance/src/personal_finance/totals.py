@@ -0,0 +1,186 @@
+import json
+import os
+
+from personal_finance.fileio import file_signature
+
+
+# Bumped whenever the meaning of the stored totals changes; a sidecar with
+# another version is ignored and rebuilt.
+VERSION = 2
+
+
+class SpendingIndex:
+    """
+    Running spending totals (integer paise) for one user's expenses, keyed by (month, category).
+
+    The index is persisted as a json sidecar in the user's expense directory
+    together with the store signature of each monthly partition it was built
+    from. A month whose partition no longer matches its recorded signature is
+    stale and gets rebuilt from that partition alone; otherwise writes keep it
+    current with add()/remove().
+
+    Months can also carry totals per day, so that any range of dates is
+    totalled from at most a month's worth of buckets. These are only kept in
+    memory: they are built from the month's columns the first time a range
+    needs them (rebuild_days) and then kept current like the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # month -> {category: [total, count]}
+        self.months = {}
+        # month -> {day (colcache.day_number) -> {category: [total, count]}}, for
+        # the months whose days have been built
+        self.days = {}
+        # month -> store signature of the partition the totals came from
+        self.sources = {}
+        self._signature = None
+
+    def load(self):
+        """
+        Read the sidecar from disk if it changed. Returns False if it is missing or unreadable.
+        """
+        signature = file_signature(self.path)
+        if signature is None:
+            return False
+        if signature == self._signature:
+            return True
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != VERSION:
+                return False
+            months = {}
+            for month, category, total, count in data["totals"]:
+                months.setdefault(month, {})[category] = [total, count]
+            sources = {month: _as_signature(sig) for month, sig in data["sources"]}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        self.months = months
+        # another session changed the sidecar, and so perhaps partitions
+        self.days = {}
+        self.sources = sources
+        self._signature = signature
+        return True
+
+    def save(self):
+        totals = []
+        for month, categories in self.months.items():
+            for category, (total, count) in categories.items():
+                totals.append([month, category, total, count])
+        sources = [[month, sig] for month, sig in self.sources.items()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": VERSION, "totals": totals, "sources": sources}, f)
+        os.replace(tmp_path, self.path)
+        self._signature = file_signature(self.path)
+
+    def source(self, month):
+        return self.sources.get(month)
+
+    def set_source(self, month, signature):
+        if signature is None:
+            self.sources.pop(month, None)
+        else:
+            self.sources[month] = signature
+
+    def rebuild_month(self, month, entries, signature):
+        """
+        entries: iterable of (category, paise, day) for every row of the
+        month's partition; day is None for a date that can't be parsed.
+        """
+        self.months.pop(month, None)
+        self.days[month] = {}
+        for category, amount, day in entries:
+            self.add(month, category, amount, day)
+        self.set_source(month, signature)
+
+    def has_days(self, month):
+        return month in self.days
+
+    def rebuild_days(self, month, entries):
+        """
+        Build a month's day totals from the same entries as rebuild_month().
+        """
+        by_day = self.days[month] = {}
+        for category, amount, day in entries:
+            if day is not None:
+                _add(by_day.setdefault(day, {}), category, amount)
+
+    def add(self, month, category, amount, day=None):
+        _add(self.months.setdefault(month, {}), category, amount)
+        by_day = self.days.get(month)
+        if day is not None and by_day is not None:
+            _add(by_day.setdefault(day, {}), category, amount)
+
+    def remove(self, month, category, amount, day=None):
+        if _remove(self.months.get(month), category, amount) and not self.months[month]:
+            del self.months[month]
+        by_day = self.days.get(month)
+        if day is not None and by_day is not None:
+            if _remove(by_day.get(day), category, amount) and not by_day[day]:
+                del by_day[day]
+
+    def month_total(self, month):
+        categories = self.months.get(month, {})
+        return sum(total for total, count in categories.values())
+
+    def month_count(self, month):
+        categories = self.months.get(month, {})
+        return sum(count for total, count in categories.values())
+
+    def category_totals(self, month):
+        """
+        {category: (total, count)} for one month.
+        """
+        categories = self.months.get(month, {})
+        return {c: (t, n) for c, (t, n) in categories.items()}
+
+    def days_total(self, month, first_day, last_day, category=None):
+        """
+        Spending of the month's partition dated first_day..last_day (day
+        numbers, inclusive), in all categories or one; needs the month's
+        day totals (has_days).
+        """
+        total = 0
+        by_day = self.days.get(month, {})
+        for day in range(first_day, last_day + 1):
+            categories = by_day.get(day)
+            if not categories:
+                continue
+            if category is None:
+                total += sum(t for t, n in categories.values())
+            elif category in categories:
+                total += categories[category][0]
+        return total
+
+
+def _add(categories, category, amount):
+    bucket = categories.setdefault(category, [0, 0])
+    bucket[0] += amount
+    bucket[1] += 1
+
+
+def _remove(categories, category, amount):
+    """
+    Take one row out of a {category: [total, count]} bucket; True if the
+    bucket's last row for the category went.
+    """
+    if not categories or category not in categories:
+        return False
+    bucket = categories[category]
+    bucket[0] -= amount
+    bucket[1] -= 1
+    if bucket[1] <= 0:
+        del categories[category]
+        return True
+    return False
+
+
+def _as_signature(value):
+    """
+    Turn a signature read back from json (nested lists) into the tuples the store compares against.
+    """
+    if isinstance(value, list):
+        return tuple(_as_signature(v) for v in value)
+    return value
@@ -0,0 +1,207 @@
+"""
+Paged, filtered views over one user's expenses.
+
+A page is located from per-month counts of matching rows rather than by
+reading every row before it. The counts come from the spending index (rows
+per month and category) whenever the filter allows; a month the index can't
+answer for is counted over the store's parsed columns instead of its csv
+text. Showing a deep page then reads only the month partitions that page
+covers.
+"""
+from personal_finance.colcache import INVALID_DAY, day_number
+from personal_finance.store import UNDATED_PARTITION
+
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class ExpenseFilter:
+    """
+    Date range (inclusive YYYY-MM-DD bounds), category and payment mode to
+    match expenses against; None matches anything. Category and mode are
+    compared case-insensitively.
+    """
+
+    def __init__(self, date_from=None, date_to=None, category=None, payment_mode=None):
+        self.date_from = date_from or None
+        self.date_to = date_to or None
+        self.category = category.strip().lower() if category else None
+        self.payment_mode = payment_mode.strip().lower() if payment_mode else None
+
+    def is_empty(self):
+        return not (self.date_from or self.date_to or self.category or self.payment_mode)
+
+    def describe(self):
+        parts = []
+        if self.date_from or self.date_to:
+            parts.append(f"dates {self.date_from or '...'} to {self.date_to or '...'}")
+        if self.category:
+            parts.append(f"category {self.category}")
+        if self.payment_mode:
+            parts.append(f"mode {self.payment_mode}")
+        return ", ".join(parts) or "no filters"
+
+    def months(self, months):
+        """
+        The partitions (YYYY-MM or undated) that can hold matching rows.
+        """
+        if not (self.date_from or self.date_to):
+            return list(months)
+        low = self.date_from[:7] if self.date_from else ""
+        high = self.date_to[:7] if self.date_to else "9999-99"
+        return [m for m in months if m != UNDATED_PARTITION and low <= m <= high]
+
+    def covers(self, month):
+        """
+        True if every date in month is inside the date range.
+        """
+        if self.date_from and self.date_from > month + "-01":
+            return False
+        if self.date_to and self.date_to < month + "-31":
+            return False
+        return True
+
+    def matches(self, row):
+        if len(row) < 5:
+            return False
+        date, amount, category, description, mode = row[:5]
+        if self.date_from and date < self.date_from:
+            return False
+        if self.date_to and date > self.date_to:
+            return False
+        if self.category and category.strip().lower() != self.category:
+            return False
+        if self.payment_mode and mode.strip().lower() != self.payment_mode:
+            return False
+        return True
+
+
+class ExpensePager:
+    """
+    Pages of the user's expenses matching a filter, oldest month first.
+    Entries are (number, month, key, row) with number counting from 1
+    across the whole filtered view.
+    """
+
+    def __init__(self, store, username, expense_filter=None, page_size=DEFAULT_PAGE_SIZE):
+        self.store = store
+        self.username = username
+        self.filter = expense_filter or ExpenseFilter()
+        self.page_size = max(1, page_size)
+        self.months = self.filter.months(store.expense_months(username))
+        self._counts = {}
+        self._loaded = {}
+
+    def _index_count(self, month):
+        """
+        Matching rows in month according to the spending index, or None if
+        the index can't tell (mode filter, month cut by the date range).
+        """
+        if self.filter.payment_mode or month == UNDATED_PARTITION:
+            return None
+        if not self.filter.covers(month):
+            return None
+        totals = self.store.category_totals(self.username, month)
+        if self.filter.category:
+            return sum(n for c, (t, n) in totals.items() if c.strip().lower() == self.filter.category)
+        return sum(n for t, n in totals.values())
+
+    def count(self, month):
+        count = self._counts.get(month)
+        if count is None:
+            count = self._index_count(month)
+            if count is None:
+                count = self._column_count(month)
+            self._counts[month] = count
+        return count
+
+    def _column_count(self, month):
+        """
+        Matching rows in month, counted over the store's expense columns.
+        """
+        columns = self.store.expense_columns(self.username, month)
+        tests = []
+        if self.filter.category:
+            wanted = {i for i, name in enumerate(columns.category_names)
+                      if name.strip().lower() == self.filter.category}
+            tests.append((columns.categories, wanted.__contains__))
+        if self.filter.payment_mode:
+            wanted = {i for i, name in enumerate(columns.mode_names)
+                      if name.strip().lower() == self.filter.payment_mode}
+            tests.append((columns.modes, wanted.__contains__))
+        if self.filter.date_from or self.filter.date_to:
+            low = day_number(self.filter.date_from) if self.filter.date_from else INVALID_DAY + 1
+            high = day_number(self.filter.date_to) if self.filter.date_to else 2 ** 31 - 1
+            tests.append((columns.days, lambda day: low <= day <= high))
+        if not tests:
+            return len(columns)
+        return sum(1 for values in zip(*(column for column, test in tests))
+                   if all(test(v) for (column, test), v in zip(tests, values)))
+
+    def _load(self, month):
+        """
+        Matching (key, row) pairs of one month; only the months of the
+        current page are kept.
+        """
+        entries = self._loaded.get(month)
+        if entries is None:
+            entries = [(key, row) for key, row in self.store.month_expenses(self.username, month)
+                       if self.filter.matches(row)]
+            self._loaded[month] = entries
+            # the index only counts rows with a valid amount; trust what was read
+            self._counts[month] = len(entries)
+        return entries
+
+    def total(self, exact=True):
+        """
+        Number of matching expenses. With exact=False, None is returned
+        instead of reading months the index can't count.
+        """
+        total = 0
+        for month in self.months:
+            if month not in self._counts and not exact:
+                count = self._index_count(month)
+                if count is None:
+                    return None
+                self._counts[month] = count
+            total += self.count(month)
+        return total
+
+    def page_count(self, exact=True):
+        total = self.total(exact)
+        if total is None:
+            return None
+        return max(1, -(-total // self.page_size))
+
+    def entries(self, start=0, limit=None):
+        """
+        Yield (number, month, key, row) for matches from position start on,
+        skipping whole months by their counts.
+        """
+        position = 0
+        for month in self.months:
+            if limit is not None and limit <= 0:
+                return
+            count = self.count(month)
+            if position + count <= start:
+                position += count
+                continue
+            loaded = self._load(month)
+            skip = max(0, start - position)
+            for key, row in loaded[skip:]:
+                if limit is not None:
+                    if limit <= 0:
+                        return
+                    limit -= 1
+                skip += 1
+                yield position + skip, month, key, row
+            position += len(loaded)
+
+    def page(self, number):
+        """
+        Entries on page number (from 1); an empty list past the end.
+        """
+        if number < 1:
+            return []
+        self._loaded.clear()
+        return list(self.entries((number - 1) * self.page_size, self.page_size))
@@ -0,0 +1,93 @@
+"""
+Budget periods, rollover and the budget.csv upgrade.
+"""
+import pytest
+
+from personal_finance import alerts
+from personal_finance.budgets import BudgetEngine, period_for, period_kind, period_range
+from personal_finance.models import Budget
+from personal_finance.monthend import run_month_end
+from personal_finance.store import BUDGET_HEADER, LedgerStore
+
+
+def rollover_ledger(tmp_path):
+    store = LedgerStore(tmp_path)
+    engine = BudgetEngine(store)
+    engine.set_budget("amy", "2024-05", 100000, rollover=True)
+    store.add_expense("amy", ["2024-05-03", "600.00", "Food", "Groceries", "UPI"])
+    return store, engine
+
+
+def test_rollover_is_worked_out_on_read(tmp_path):
+    store, engine = rollover_ledger(tmp_path)
+    budget = engine.budget("amy", "2024-07")
+    assert (budget.period, budget.carried) == ("2024-07", 140000)
+    assert [b.period for b in engine.in_effect("amy", "2024-07-15") if not b.category] == ["2024-07"]
+    assert store.budget("amy", "2024-06") is None and store.budget("amy", "2024-07") is None
+
+    # nothing stored, so a late expense in May still changes the carry
+    store.add_expense("amy", ["2024-05-20", "100.00", "Food", "Dinner", "Card"])
+    assert engine.budget("amy", "2024-07").carried == 130000
+
+
+def test_alert_stores_the_rolled_over_budget(tmp_path):
+    store, engine = rollover_ledger(tmp_path)
+    store.add_expense("amy", ["2024-06-02", "1500.00", "Bills", "Rent", "Card"])
+    messages = alerts.check_budgets(store, "amy", [("2024-06-02", "Bills")], [50, 80, 100])
+    assert messages
+    stored = store.budget("amy", "2024-06")
+    assert (stored.carried, stored.alerted) == (40000, 100)
+    assert alerts.check_budgets(store, "amy", [("2024-06-02", "Bills")], [50, 80, 100]) == []
+
+
+def test_month_end_stores_the_rolled_over_budget(tmp_path):
+    (tmp_path / "password.csv").write_text("username,password\namy,x\n")
+    store, engine = rollover_ledger(tmp_path)
+    run_month_end(store, tmp_path, "2024-06", tmp_path / "out", workers=1)
+    assert store.budget("amy", "2024-06").carried == 40000
+    store.add_expense("amy", ["2024-05-20", "100.00", "Food", "Dinner", "Card"])
+    assert engine.budget("amy", "2024-06").carried == 40000
+
+
+def test_in_effect_reads_the_budgets_once(tmp_path, monkeypatch):
+    store, engine = rollover_ledger(tmp_path)
+    store.put_budget("amy", Budget("2024", 1000000))
+    store.put_budget("amy", Budget("2024-Q2", 300000, "Food"))
+    calls = []
+    user_budgets = store.user_budgets
+    monkeypatch.setattr(store, "user_budgets", lambda username: calls.append(username) or user_budgets(username))
+    found = engine.in_effect("amy", "2024-06-10")
+    assert [(b.period, b.category) for b in found] == [("2024-06", ""), ("2024-Q2", "Food"), ("2024", "")]
+    assert calls == ["amy"]
+
+
+def test_legacy_budget_header_is_upgraded(tmp_path):
+    (tmp_path / "budget.csv").write_text(
+        "username,month,budget_amount,alerted_50,alerted_80,alerted_exceeded\n"
+        "amy,2024-05,1000.00,yes,yes,no\n"
+        "bob,2024-05,500.00,no,no,no\n")
+    store = LedgerStore(tmp_path)
+    budget = store.budget("amy", "2024-05")
+    assert (budget.amount, budget.alerted, budget.rollover) == (100000, 80, False)
+    assert store.budget("bob", "2024-05").alerted == 0
+    assert (tmp_path / "budget.csv").read_text().splitlines()[0] == ",".join(BUDGET_HEADER)
+
+
+def test_monthly_budget_header_is_upgraded(tmp_path):
+    (tmp_path / "budget.csv").write_text(
+        "username,month,category,budget_amount,alerted\n"
+        "amy,2024-05,,1000.00,50\n"
+        "amy,2024-05,Food,300.00,0\n")
+    store = LedgerStore(tmp_path)
+    assert [(b.category, b.amount, b.alerted) for b in store.budgets("amy", "2024-05")] == \
+        [("", 100000, 50), ("Food", 30000, 0)]
+
+
+def test_iso_week_ranges():
+    assert period_range("2024-W01") == ("2024-01-01", "2024-01-07")
+    assert period_range("2021-W01") == ("2021-01-04", "2021-01-10")
+    assert period_range("2020-W53") == ("2020-12-28", "2021-01-03")
+    assert period_for("2021-01-02", "week") == "2020-W53"
+    for bad in ("2021-W53", "2024-W00"):
+        with pytest.raises(ValueError):
+            period_kind(bad)
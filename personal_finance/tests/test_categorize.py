@@ -0,0 +1,121 @@
+"""
+Category rules, the learned guess, and how an import treats guessed rows.
+"""
+import io
+
+import pytest
+
+from personal_finance.categorize import (MIN_CONFIDENCE, MIN_TRAINING_ROWS, NO_SUGGESTION, SOURCE_HISTORY,
+                                         CategoryModel, Categorizer, RuleMatcher, check_rule, normalize)
+from personal_finance.importer import import_expenses
+from personal_finance.models import CategoryRule
+from personal_finance.store import LedgerStore
+
+HEADER = "date,amount,category,description,payment_mode\n"
+
+
+def ids(matcher, description):
+    return [rule.rule_id for rule in matcher.matching(normalize(description))]
+
+
+def test_patterns_match_whole_words_in_order():
+    matcher = RuleMatcher([CategoryRule(1, "amazon", "Shopping"), CategoryRule(2, "amazon*", "Shopping"),
+                           CategoryRule(3, "mobile recharge", "Bills"), CategoryRule(4, "Café", "Food")])
+    assert ids(matcher, "AMAZONPAY INDIA") == [2]
+    assert ids(matcher, "Amazon order 123") == [1, 2]
+    assert ids(matcher, "recharge mobile") == []
+    assert ids(matcher, "Jio MOBILE  Recharge") == [3]
+    assert ids(matcher, "cafe coffee day") == [4]
+
+
+def test_every_rule_starting_at_the_same_word_is_found():
+    # the compiled alternation stops at the first group; the newer rules are checked again
+    matcher = RuleMatcher([CategoryRule(1, "amazon*", "Shopping"), CategoryRule(2, "amazon pay", "Bills"),
+                           CategoryRule(3, "pay", "Other"), CategoryRule(4, "amazonpay", "Wallet")])
+    assert ids(matcher, "amazon pay later") == [1, 2, 3]
+    assert ids(matcher, "amazonpay") == [1, 4]
+
+
+def test_rules_without_words_are_left_out():
+    matcher = RuleMatcher([CategoryRule(1, "** --", "Other"), CategoryRule(2, "uber", "Travel")])
+    assert ids(matcher, "uber trip") == [2]
+    assert RuleMatcher([]).matching("uber") == ()
+    with pytest.raises(ValueError):
+        check_rule(CategoryRule(1, "** --", "Other"))
+    with pytest.raises(ValueError):
+        check_rule(CategoryRule(1, "uber", "Travel", min_amount=500, max_amount=100))
+
+
+def test_oldest_matching_rule_wins():
+    categorizer = Categorizer([CategoryRule(1, "uber", "Travel"), CategoryRule(2, "eats", "Food")])
+    # rule order counts, not where in the description the words are
+    assert categorizer.suggest("Eats by Uber") == ("Travel", 1)
+    assert categorizer.suggest("uber eats") == ("Travel", 1)
+    assert categorizer.suggest("eats") == ("Food", 2)
+    assert categorizer.suggest("ola ride") == NO_SUGGESTION
+
+
+def test_mode_and_amount_limits_pass_to_the_next_rule():
+    categorizer = Categorizer([CategoryRule(1, "amazon*", "Groceries", "UPI", max_amount=50000),
+                               CategoryRule(2, "amazon*", "Electronics", min_amount=500000),
+                               CategoryRule(3, "amazon*", "Shopping")])
+    assert categorizer.category("AmazonPay", "upi", 20000) == "Groceries"
+    assert categorizer.category("AmazonPay", "UPI", 50000) == "Groceries"
+    assert categorizer.category("AmazonPay", "UPI", 50001) == "Shopping"
+    assert categorizer.category("AmazonPay", "Card", 20000) == "Shopping"
+    assert categorizer.category("Amazon", "Card", 500000) == "Electronics"
+
+
+def train(store, food, travel):
+    for n in range(food):
+        store.add_expense("amy", [f"2024-05-{n % 28 + 1:02d}", "250.00", "Food", f"SWIGGY {81000 + n}", "UPI"])
+    for n in range(travel):
+        store.add_expense("amy", [f"2024-05-{n % 28 + 1:02d}", "400.00", "Travel", "Uber trip", "Card"])
+    return CategoryModel.train(store, "amy")
+
+
+def test_no_guess_from_too_little_history(tmp_path):
+    model = train(LedgerStore(tmp_path), MIN_TRAINING_ROWS - 6, 5)
+    assert len(model) == MIN_TRAINING_ROWS - 1
+    # the model alone would guess; the categorizer doesn't use it yet
+    assert model.guess(["swiggy"], "UPI", 8)[0] == "Food"
+    assert Categorizer(model=model).suggest("SWIGGY 90211", "UPI", 25000) == NO_SUGGESTION
+
+
+def test_guess_from_history(tmp_path):
+    model = train(LedgerStore(tmp_path), MIN_TRAINING_ROWS - 5, 5)
+    categorizer = Categorizer(model=model)
+    # order numbers are left out, so a new one gets the same guess
+    assert categorizer.suggest("SWIGGY 90211", "UPI", 25000) == ("Food", SOURCE_HISTORY)
+    assert categorizer.suggest("uber", "Card", 40000) == ("Travel", SOURCE_HISTORY)
+    assert categorizer.suggest("Zomato", "UPI", 25000) == NO_SUGGESTION
+    # a rule comes before the guess
+    ruled = Categorizer([CategoryRule(7, "swiggy", "Takeaway")], model)
+    assert ruled.suggest("SWIGGY 90211", "UPI", 25000) == ("Takeaway", 7)
+
+
+def test_unsure_guess_is_not_suggested(tmp_path):
+    store = LedgerStore(tmp_path)
+    for n in range(MIN_TRAINING_ROWS):
+        category = "Food" if n % 2 else "Travel"
+        store.add_expense("amy", ["2024-05-01", "100.00", category, "Paytm", "UPI"])
+    model = CategoryModel.train(store, "amy")
+    category, confidence = model.guess(["paytm"], "UPI", 7)
+    assert confidence < MIN_CONFIDENCE
+    assert Categorizer(model=model).suggest("paytm", "UPI", 10000) == NO_SUGGESTION
+
+
+def test_reimported_guessed_rows_are_duplicates(tmp_path):
+    store = LedgerStore(tmp_path)
+    statement = HEADER + "2024-05-01,120.00,,AMAZONPAY 1234,UPI\n2024-05-02,99.00,Food,Tea,UPI\n"
+    first = import_expenses(store, "amy", io.StringIO(statement),
+                            categorizer=Categorizer([CategoryRule(1, "amazon*", "Shopping")]))
+    assert (first.imported, first.categorized) == (2, 1)
+    assert sorted(row[2] for row in store.expense_rows("amy", "2024-05")) == ["Food", "Shopping"]
+
+    # the rule is gone, so the guess now differs, but the row is still the same expense
+    again = import_expenses(store, "amy", io.StringIO(statement), categorizer=Categorizer())
+    assert (again.imported, again.duplicates) == (0, 2)
+    # without a categorizer the empty category is Other, a different expense
+    plain = import_expenses(store, "amy", io.StringIO(statement))
+    assert (plain.imported, plain.duplicates) == (1, 1)
@@ -0,0 +1,81 @@
+"""
+The .cols columnar cache of expense partitions.
+"""
+import os
+
+from personal_finance import colcache
+from personal_finance.colcache import ColumnCache
+from personal_finance.store import PARTITION_HEADER
+
+
+def write_rows(path, rows, mode="a"):
+    with open(path, mode) as f:
+        if mode == "w":
+            f.write(",".join(PARTITION_HEADER) + "\n")
+        for i, amount, category in rows:
+            f.write(f"2024-05-{i % 28 + 1:02d},{amount},{category},Item {i},UPI,{i}\n")
+
+
+def cached(path):
+    columns = ColumnCache(path, 5).load()
+    names = columns.category_names
+    return [(i, names[c], a) for i, c, a in zip(columns.ids, columns.categories, columns.amounts)]
+
+
+def chunk_count(path):
+    return ColumnCache(path, 5)._read_header()[4]
+
+
+def test_growth_adds_a_chunk_and_dictionaries_span_chunks(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_rows(path, [(1, "10.00", "Food"), (2, "20.00", "Travel")], "w")
+    assert cached(path) == [(1, "Food", 1000), (2, "Travel", 2000)]
+    write_rows(path, [(3, "30.00", "Bills"), (4, "5.50", "Food")])
+    assert len(cached(path)) == 4
+    write_rows(path, [(5, "1.00", "Bills")])  # a name first seen in the chunk before
+    assert cached(path) == [(1, "Food", 1000), (2, "Travel", 2000), (3, "Bills", 3000), (4, "Food", 550),
+                            (5, "Bills", 100)]
+    assert chunk_count(path) == 3
+    # read back from the file alone, not from anything kept in memory
+    assert cached(path)[2:] == [(3, "Bills", 3000), (4, "Food", 550), (5, "Bills", 100)]
+
+
+def test_chunks_are_merged_past_the_limit(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_rows(path, [(1, "1.00", "Food")], "w")
+    cached(path)
+    for i in range(2, colcache.MAX_CHUNKS + 2):
+        write_rows(path, [(i, f"{i}.00", f"Cat{i % 3}")])
+        cached(path)
+    assert chunk_count(path) == 1
+    assert [row[0] for row in cached(path)] == list(range(1, colcache.MAX_CHUNKS + 2))
+
+
+def test_rewrite_in_place_is_rebuilt(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_rows(path, [(1, "10.00", "Food"), (2, "20.00", "Travel")], "w")
+    cached(path)
+    # same inode and longer, but the bytes the cache covers changed
+    write_rows(path, [(1, "99.00", "Food"), (2, "20.00", "Travel"), (3, "1.00", "Food")], "w")
+    assert cached(path) == [(1, "Food", 9900), (2, "Travel", 2000), (3, "Food", 100)]
+    assert chunk_count(path) == 1
+
+
+def test_same_size_and_mtime_with_new_inode_is_rebuilt(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_rows(path, [(1, "10.00", "Food")], "w")
+    cached(path)
+    st = os.stat(path)
+    other = tmp_path / "new.csv"
+    write_rows(other, [(1, "90.00", "Food")], "w")
+    os.utime(other, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(other, path)
+    assert cached(path) == [(1, "Food", 9000)]
+
+
+def test_garbled_cache_is_rebuilt(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_rows(path, [(1, "10.00", "Food")], "w")
+    cached(path)
+    colcache.cache_path(path).write_bytes(b"junk")
+    assert cached(path) == [(1, "Food", 1000)]
@@ -0,0 +1,70 @@
+"""
+An edit or delete based on a row another session has since changed fails
+the same way on both backends.
+"""
+import pytest
+
+from personal_finance.sqlite_store import SqliteStore
+from personal_finance.store import ConcurrentUpdateError, LedgerStore
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "csv":
+        yield LedgerStore(tmp_path)
+    else:
+        db = SqliteStore(tmp_path)
+        yield db
+        db.close()
+
+
+def first_expense(store, username, month):
+    return next(iter(store.month_expenses(username, month)))
+
+
+def test_update_with_current_row(store):
+    store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    key, row = first_expense(store, "amy", "2024-05")
+    store.update_expense("amy", "2024-05", key, ["2024-05-01", "300.00", "Food", "Lunch", "UPI"], expected=row)
+    assert store.get_expense("amy", "2024-05", key)[2:] == ["Food", "Lunch", "UPI"]
+    _, row = first_expense(store, "amy", "2024-05")
+    assert float(row[1]) == 300.0
+
+
+def test_update_after_another_edit_fails(store):
+    store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    key, row = first_expense(store, "amy", "2024-05")
+    store.update_expense("amy", "2024-05", key, ["2024-05-01", "260.00", "Food", "Lunch", "UPI"])
+    with pytest.raises(ConcurrentUpdateError):
+        store.update_expense("amy", "2024-05", key, ["2024-05-01", "1.00", "Food", "x", "UPI"], expected=row)
+    _, now = first_expense(store, "amy", "2024-05")
+    assert float(now[1]) == 260.0
+
+
+def test_delete_after_another_edit_fails(store):
+    store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    key, row = first_expense(store, "amy", "2024-05")
+    store.update_expense("amy", "2024-05", key, ["2024-05-01", "250.00", "Food", "Dinner", "UPI"])
+    with pytest.raises(ConcurrentUpdateError):
+        store.delete_expense("amy", "2024-05", key, expected=row)
+    assert store.get_expense("amy", "2024-05", key) is not None
+
+
+def test_edit_after_another_delete_fails(store):
+    store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    key, row = first_expense(store, "amy", "2024-05")
+    store.delete_expense("amy", "2024-05", key, expected=row)
+    with pytest.raises(ConcurrentUpdateError):
+        store.update_expense("amy", "2024-05", key, ["2024-05-01", "1.00", "Food", "x", "UPI"], expected=row)
+    assert store.get_expense("amy", "2024-05", key) is None
+
+
+def test_two_sessions(tmp_path):
+    first, second = SqliteStore(tmp_path), SqliteStore(tmp_path)
+    first.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    key, row = first_expense(first, "amy", "2024-05")
+    first.update_expense("amy", "2024-05", key, ["2024-05-01", "99.00", "Food", "Lunch", "UPI"], expected=row)
+    with pytest.raises(ConcurrentUpdateError):
+        second.delete_expense("amy", "2024-05", key, expected=row)
+    first.close()
+    second.close()
@@ -0,0 +1,41 @@
+"""
+Exports, full and incremental.
+"""
+import csv
+
+from personal_finance import main as app
+from personal_finance.exporter import export_expenses, watermark_path
+from personal_finance.store import LedgerStore
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_incremental_appends_new_rows(tmp_path):
+    store = LedgerStore(tmp_path)
+    store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    output = tmp_path / "out.csv"
+    assert export_expenses(store, "amy", output, incremental=True)["rows"] == 1
+    store.add_expense("amy", ["2024-05-02", "40.00", "Travel", "Metro", "Card"])
+    result = export_expenses(store, "amy", output, incremental=True)
+    assert (result["rows"], result["appended"]) == (1, True)
+    assert [r[4] for r in read_csv(output)[1:]] == ["Lunch", "Metro"]
+
+
+def test_menu_export_is_full(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    store = app.get_store()
+    key = store.add_expense("amy", ["2024-05-01", "250.00", "Food", "Lunch", "UPI"])
+    store.add_expense("amy", ["2024-05-02", "40.00", "Travel", "Metro", "Card"])
+    app.export_expenses("amy")
+    store.update_expense("amy", "2024-05", key, ["2024-05-01", "250.00", "Food", "Dinner", "UPI"])
+    store.delete_expense("amy", "2024-05", "2")
+    app.export_expenses("amy")
+
+    output = tmp_path / "exported_expenses_amy.csv"
+    assert [r[4] for r in read_csv(output)[1:]] == ["Dinner"]
+    assert not watermark_path(output).exists()
+    assert "successfully exported" in capsys.readouterr().out
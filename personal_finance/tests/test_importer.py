@@ -0,0 +1,50 @@
+"""
+Bulk expense import and the import command.
+"""
+import io
+import json
+
+from personal_finance import main as app
+from personal_finance.cli import run
+from personal_finance.importer import import_expenses
+from personal_finance.store import LedgerStore
+
+HEADER = "date,amount,category,description,payment_mode\n"
+TWO_TEAS = "2024-05-01,10.00,Food,Tea,UPI\n2024-05-01,10.00,Food,Tea,UPI\n"
+
+
+def test_identical_rows_are_counted_not_collapsed(tmp_path):
+    store = LedgerStore(tmp_path)
+    result = import_expenses(store, "amy", io.StringIO(HEADER + TWO_TEAS))
+    assert (result.imported, result.duplicates) == (2, 0)
+
+    # the same statement again adds nothing; one more identical row adds one
+    again = import_expenses(store, "amy", io.StringIO(HEADER + TWO_TEAS + "2024-05-01,10.00,Food,Tea,UPI\n"))
+    assert (again.imported, again.duplicates) == (1, 2)
+    assert len(store.expense_rows("amy", "2024-05")) == 3
+
+
+def test_dedupe_off_imports_everything(tmp_path):
+    store = LedgerStore(tmp_path)
+    import_expenses(store, "amy", io.StringIO(HEADER + TWO_TEAS))
+    result = import_expenses(store, "amy", io.StringIO(HEADER + TWO_TEAS), dedupe=False)
+    assert (result.imported, result.duplicates) == (2, 0)
+
+
+def test_command_prints_counts_and_sends_bad_rows_to_stderr(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    (tmp_path / "password.csv").write_text("username,password\namy,x\n")
+    statement = tmp_path / "statement.csv"
+    statement.write_text(HEADER + TWO_TEAS + "yesterday,5,Food,Tea,UPI\n")
+
+    assert run(["import", str(statement), "--user", "amy", "--no-categorize"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == {"read": 3, "imported": 2, "duplicates": 0, "skipped": 1, "categorized": 0,
+                               "dry_run": False}
+    assert err.startswith("line 4: ")
+
+    assert run(["import", str(statement), "--user", "amy", "--format", "text"]) == 0
+    out, err = capsys.readouterr()
+    assert out.startswith("Read 3 rows: 0 imported, 2 duplicates skipped, 1 invalid.")
+    assert "line 4" in err and "line 4" not in out
@@ -0,0 +1,89 @@
+"""
+Row changes journaled next to the csv files, and compaction crashes.
+"""
+import os
+
+import pytest
+
+from personal_finance import journal
+from personal_finance.store import LedgerStore, partition_name
+
+ROWS = [["2024-05-01", "250.00", "Food", "Lunch", "UPI"],
+        ["2024-05-02", "40.00", "Travel", "Metro", "Card"],
+        ["2024-05-03", "99.00", "Bills", "Phone", "Card"]]
+NAME = partition_name("amy", "2024-05")
+
+
+def edited_ledger(tmp_path):
+    """
+    A partition with one row edited and one deleted, both still in the journal.
+    """
+    store = LedgerStore(tmp_path)
+    keys = store.add_expenses("amy", "2024-05", ROWS)
+    store.update_expense("amy", "2024-05", keys[0], ["2024-05-01", "275.00", "Food", "Lunch", "UPI"])
+    store.delete_expense("amy", "2024-05", keys[1])
+    return store
+
+
+EDITED = [["2024-05-01", "275.00", "Food", "Lunch", "UPI"], ["2024-05-03", "99.00", "Bills", "Phone", "Card"]]
+
+
+def test_journal_is_replayed_by_a_new_session(tmp_path):
+    store = edited_ledger(tmp_path)
+    path = store.path(NAME)
+    assert journal.journal_path(path).exists()
+    assert len(path.read_text().splitlines()) == 4  # the base file still has every row
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == EDITED
+
+
+def test_torn_journal_line_is_skipped(tmp_path):
+    store = edited_ledger(tmp_path)
+    path = store.path(NAME)
+    with open(journal.journal_path(path), "a") as f:
+        f.write('U,["3"],2024-05-03,1')  # cut short by a crash, no newline
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == EDITED
+
+    # the next change starts on a line of its own
+    journal.append_journal(path, [(journal.DELETE, ("3",), None)])
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == EDITED[:1]
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.parametrize("step", [1, 2])
+def test_interrupted_compaction_is_recovered(tmp_path, monkeypatch, step):
+    # step 1: crash before the journal is retired (old base + journal win);
+    # step 2: after it is retired but before the new base is moved in (new base wins)
+    store = edited_ledger(tmp_path)
+    path = store.path(NAME)
+    replace = os.replace
+    calls = []
+
+    def crashing_replace(src, dst):
+        calls.append(src)
+        if len(calls) == step:
+            raise Crash()
+        replace(src, dst)
+
+    monkeypatch.setattr(journal.os, "replace", crashing_replace)
+    with pytest.raises(Crash):
+        store.compact(NAME)
+    monkeypatch.undo()
+    assert journal.needs_recovery(path)
+
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == EDITED
+    assert not journal.needs_recovery(path)
+    assert not [p for p in path.parent.iterdir() if p.name.endswith((".compact", ".done"))]
+
+
+def test_leftover_retired_journal_is_dropped(tmp_path):
+    store = edited_ledger(tmp_path)
+    store.compact(NAME)
+    path = store.path(NAME)
+    assert not journal.journal_path(path).exists()
+    # crash after the new base was moved in, before the retired journal was removed
+    path.with_name(path.name + ".journal.done").write_text('D,["1"]\n')
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == EDITED
+    assert not journal.needs_recovery(path)
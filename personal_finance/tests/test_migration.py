@@ -0,0 +1,53 @@
+"""
+Moving the shared expenses.csv of older versions into per-user ledgers.
+"""
+import pytest
+
+from personal_finance import main as app
+from personal_finance.store import LedgerStore
+
+ROWS = "2024-05-01,250.00,Food,Lunch,UPI\n2024-06-02,40.00,Travel,Metro,Card\n"
+
+
+def test_rows_go_to_the_named_user(tmp_path):
+    (tmp_path / "expenses.csv").write_text("date,amount,category,description,payment_mode\n" + ROWS)
+    store = LedgerStore(tmp_path)
+    assert store.legacy_expense_owners() is None
+    assert store.migrate_legacy_expenses("amy") == {"amy": 2}
+    assert not store.has_legacy_expenses()
+    assert (tmp_path / "expenses.csv.migrated").exists()
+    assert store.expense_rows("amy", "2024-06") == [["2024-06-02", "40.00", "Travel", "Metro", "Card"]]
+
+
+def test_owner_column_is_used(tmp_path):
+    (tmp_path / "expenses.csv").write_text(
+        "username,date,amount,category,description,payment_mode\n"
+        "amy,2024-05-01,250.00,Food,Lunch,UPI\n"
+        "bob,2024-05-02,40.00,Travel,Metro,Card\n"
+        ",2024-05-03,10.00,Food,Tea,Cash\n")
+    store = LedgerStore(tmp_path)
+    assert store.legacy_expense_owners() == {"amy", "bob"}
+    assert store.migrate_legacy_expenses("carl") == {"amy": 1, "bob": 1, "carl": 1}
+    assert store.expense_rows("bob", "2024-05") == [["2024-05-02", "40.00", "Travel", "Metro", "Card"]]
+
+
+def test_unowned_rows_need_a_user(tmp_path):
+    (tmp_path / "expenses.csv").write_text("date,amount,category,description,payment_mode\n" + ROWS)
+    store = LedgerStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.migrate_legacy_expenses()
+    assert store.has_legacy_expenses()
+    assert store.expense_months("amy") == []
+
+
+def test_login_asks_first(tmp_path, monkeypatch):
+    (tmp_path / "expenses.csv").write_text("date,amount,category,description,payment_mode\n" + ROWS)
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    app.migrate_legacy_expenses("amy")
+    assert app.get_store().has_legacy_expenses()
+
+    monkeypatch.setattr("builtins.input", lambda prompt: "y")
+    app.migrate_legacy_expenses("amy")
+    assert app.get_store().expense_months("amy") == ["2024-05", "2024-06"]
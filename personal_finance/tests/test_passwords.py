@@ -0,0 +1,65 @@
+"""
+Password hashes and their upgrade on login.
+"""
+import hashlib
+
+import pytest
+
+from personal_finance import main as app
+from personal_finance import passwords
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    monkeypatch.setenv("PERSONAL_FINANCE_PASSWORD_SCHEME", "scrypt")
+    monkeypatch.setenv("PERSONAL_FINANCE_PASSWORD_COST", "11")
+    return tmp_path
+
+
+def test_legacy_sha256_is_rehashed_on_login(data_dir):
+    (data_dir / "password.csv").write_text(
+        "username,password\namy," + hashlib.sha256(b"Secret#1").hexdigest() + "\n")
+    assert not app.check_password("amy", "wrong")
+    assert len(app.get_store().password_hash("amy")) == 64
+
+    assert app.check_password("amy", "Secret#1")
+    upgraded = app.get_store().password_hash("amy")
+    assert upgraded.startswith("scrypt$11$")
+    assert not passwords.needs_rehash(upgraded, "scrypt", 11)
+    assert app.check_password("amy", "Secret#1")
+    assert app.get_store().password_hash("amy") == upgraded  # nothing more to upgrade
+
+
+def test_lower_cost_is_raised_on_login(data_dir):
+    (data_dir / "password.csv").write_text(
+        "username,password\namy," + passwords.hash_password("Secret#1", "scrypt", 10) + "\n")
+    assert app.check_password("amy", "Secret#1")
+    assert app.get_store().password_hash("amy").startswith("scrypt$11$")
+
+
+def test_hash_forms_verify():
+    for scheme, cost in (("scrypt", 10), ("pbkdf2_sha256", 100000)):
+        hashed = passwords.hash_password("Secret#1", scheme, cost)
+        assert passwords.verify_password("Secret#1", hashed)
+        assert not passwords.verify_password("Secret#2", hashed)
+    assert not passwords.verify_password("Secret#1", "garbled$hash")
+    assert passwords.needs_rehash("garbled$hash")
+
+
+def test_costs_out_of_range_are_refused():
+    assert passwords.check_cost("scrypt", "12") == 12
+    for scheme, cost in (("scrypt", 1024), ("scrypt", 40), ("scrypt", 9), ("pbkdf2_sha256", 1000),
+                         ("scrypt", "lots"), ("md5", 12)):
+        with pytest.raises(ValueError):
+            passwords.check_cost(scheme, cost)
+    with pytest.raises(ValueError, match="10 to 20"):
+        passwords.hash_password("Secret#1", "scrypt", 1024)
+
+
+def test_bad_setting_is_reported_at_startup(data_dir, monkeypatch, capsys):
+    monkeypatch.setenv("PERSONAL_FINANCE_PASSWORD_COST", "1024")
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("the menu started"))
+    assert app.interactive() == 1
+    assert "out of range" in capsys.readouterr().err
@@ -0,0 +1,42 @@
+"""
+The provision command.
+"""
+import json
+
+import pytest
+
+from personal_finance import main as app
+from personal_finance.cli import run
+
+USERS = ("username,password,first_name,last_name,age,email\n"
+         "bobby,Secret#123x,Bobby,Lee,30,bobby@example.com\n"
+         "x,y,,,,\n")
+
+
+def test_counts_go_to_stdout_and_rejected_rows_to_stderr(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    users = tmp_path / "users.csv"
+    users.write_text(USERS)
+
+    assert run(["provision", str(users), "--workers", "1", "--cost", "10"]) == 1
+    out, err = capsys.readouterr()
+    assert json.loads(out) == {"read": 2, "created": 1, "rejected": 1, "raced": 0, "dry_run": False}
+    assert err.startswith("line 3: ")
+    assert app.username_exists("bobby")
+
+    assert run(["provision", str(users), "--workers", "1", "--dry-run", "--format", "text"]) == 1
+    out, err = capsys.readouterr()
+    assert out.startswith("Read 2 users:") and "line 3" in err and "line 3" not in out
+
+
+def test_cost_out_of_range_is_a_usage_error(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    users = tmp_path / "users.csv"
+    users.write_text(USERS)
+    with pytest.raises(SystemExit) as exit:
+        run(["provision", str(users), "--workers", "1", "--cost", "1024"])
+    assert exit.value.code == 2
+    assert "argument --cost" in capsys.readouterr().err
+    assert not app.username_exists("bobby")
@@ -0,0 +1,70 @@
+"""
+Posting recurring expenses, and finishing a run that was cut short.
+"""
+import json
+
+import pytest
+
+from personal_finance import main as app
+from personal_finance import recurring
+from personal_finance.cli import run
+from personal_finance.models import RecurringRule
+from personal_finance.store import LedgerStore
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(app, "_store", None)
+    (tmp_path / "password.csv").write_text("username,password\namy,x\n")
+    return tmp_path
+
+
+def test_run_due_alerts_budgets_of_the_posting_dates(data_dir, capsys):
+    run(["budget", "set", "--user", "amy", "--month", "2024-05", "--amount", "100"])
+    run(["recurring", "add", "--user", "amy", "--amount", "150", "--schedule", "monthly:1",
+         "--start", "2024-05-01"])
+    capsys.readouterr()
+    assert run(["run-due", "--user", "amy", "--date", "2024-06-15"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out)["expenses"] == 2
+    assert "exceeded" in err.lower()
+
+
+class Crash(Exception):
+    pass
+
+
+def interrupted_run(store, monkeypatch, months_written):
+    """
+    run_due() cut short after it appended months_written of the months it posts.
+    """
+    add_expenses = store.add_expenses
+    written = []
+
+    def crashing_add(username, month, rows):
+        if len(written) == months_written:
+            raise Crash()
+        written.append(month)
+        return add_expenses(username, month, rows)
+
+    monkeypatch.setattr(store, "add_expenses", crashing_add)
+    with pytest.raises(Crash):
+        recurring.run_due(store, "2024-07-20")
+    monkeypatch.undo()
+
+
+@pytest.mark.parametrize("months_written", [0, 1, 2])
+def test_interrupted_run_is_finished_without_duplicates(tmp_path, monkeypatch, months_written):
+    store = LedgerStore(tmp_path)
+    store.add_rule("amy", RecurringRule(None, 1500000, "Bills", "Rent", "Card", "monthly:1", "2024-05-01"))
+    interrupted_run(store, monkeypatch, months_written)
+    assert store.recurring_rules("amy")[0][1].pending == "2024-07-20"
+
+    result = recurring.run_due(store, "2024-07-20")
+    assert result["expenses"] == 3 - months_written
+    months = {month: store.expense_rows("amy", month) for month in ("2024-05", "2024-06", "2024-07")}
+    assert [len(rows) for rows in months.values()] == [1, 1, 1]
+    _, rule = store.recurring_rules("amy")[0]
+    assert (rule.last_posted, rule.pending) == ("2024-07-20", "")
+    assert recurring.run_due(store, "2024-07-20")["expenses"] == 0
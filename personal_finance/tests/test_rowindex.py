@@ -0,0 +1,56 @@
+"""
+The .idx row index of expense partitions.
+"""
+import os
+
+from personal_finance.rowindex import RowIndex
+from personal_finance.store import PARTITION_HEADER, LedgerStore, partition_name
+
+HEADER = ",".join(PARTITION_HEADER) + "\n"
+
+
+def write_partition(path, rows):
+    path.write_text(HEADER + "".join(f"2024-05-0{i},{amount},Food,{text},UPI,{i}\n" for i, amount, text in rows))
+
+
+def test_rows_are_found_by_id(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_partition(path, [(1, "10.00", "Tea"), (2, "20.00", "Lunch"), (4, "40.00", "Dinner")])
+    index = RowIndex(path, 5)
+    assert index.read_row(2) == ["2024-05-02", "20.00", "Food", "Lunch", "UPI", "2"]
+    assert index.read_row(3) is None and index.read_row(9) is None
+    assert index.next_id() == 5
+
+
+def test_stale_index_is_rebuilt_and_keeps_the_next_id(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_partition(path, [(1, "10.00", "Tea"), (2, "20.00", "Lunch"), (3, "30.00", "Dinner")])
+    index = RowIndex(path, 5)
+    assert index.read_row(3)[3] == "Dinner"
+    write_partition(path, [(1, "10.00", "Tea"), (2, "21.00", "Brunch")])  # size changes
+    assert index.read_row(2)[3] == "Brunch"
+    assert index.read_row(3) is None
+    assert index.next_id() == 4  # a deleted id isn't handed out again
+
+
+def test_wrong_slot_with_unchanged_signature_is_noticed(tmp_path):
+    path = tmp_path / "2024-05.csv"
+    write_partition(path, [(1, "10.00", "Tea"), (2, "20.00", "Pie")])
+    index = RowIndex(path, 5)
+    index.ensure()
+    st = os.stat(path)
+    # same size and mtime, rows swapped: the header can't tell
+    path.write_text(HEADER + "2024-05-02,20.00,Food,Pie,UPI,2\n2024-05-01,10.00,Food,Tea,UPI,1\n")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert index.is_current()
+    assert index.read_row(1)[3] == "Tea"
+    assert index.read_row(2)[3] == "Pie"
+
+
+def test_quoted_newlines_and_appends(tmp_path):
+    store = LedgerStore(tmp_path)
+    keys = store.add_expenses("amy", "2024-05", [["2024-05-01", "10.00", "Food", "two\nlines", "UPI"]])
+    keys += store.add_expenses("amy", "2024-05", [["2024-05-02", "20.00", "Food", "after", "UPI"]])
+    index = RowIndex(store.path(partition_name("amy", "2024-05")), 5)
+    assert index.is_current()
+    assert [index.read_row(int(key))[3] for key in keys] == ["two\nlines", "after"]
@@ -0,0 +1,114 @@
+"""
+Search ranks and filters the same way over the CSV term index, SQLite's
+full-text table, and SQLite without FTS5.
+"""
+import pytest
+
+from personal_finance.search import search_expenses
+from personal_finance.sqlite_store import SqliteStore
+from personal_finance.store import LedgerStore, partition_name
+
+ROWS = [
+    ["2024-03-02", "120.00", "Food", "Coffee beans", "UPI"],
+    ["2024-03-05", "80.00", "Food", "Coffeehouse snack", "Cash"],
+    ["2024-04-10", "450.00", "Travel", "Taxi to airport", "Card"],
+    ["2024-04-12", "60.00", "Food", "Cofee with Sam", "UPI"],
+    ["2024-05-01", "2000.00", "Rent", "Rent May", "Bank"],
+]
+
+
+@pytest.fixture(params=["csv", "sqlite", "sqlite-no-fts"])
+def store(request, tmp_path):
+    if request.param == "csv":
+        store = LedgerStore(tmp_path)
+    else:
+        store = SqliteStore(tmp_path)
+        # the per-month in-memory index used when SQLite lacks FTS5
+        store.full_text = request.param == "sqlite"
+    for row in ROWS:
+        store.add_expense("amy", row)
+    store.add_expense("bob", ["2024-03-03", "99.00", "Food", "Coffee beans", "UPI"])
+    if request.param == "csv":
+        # fold the journals so the rows are read from the .terms files
+        for month in ("2024-03", "2024-04", "2024-05"):
+            store.compact(partition_name("amy", month))
+    yield store
+    if request.param != "csv":
+        store.close()
+
+
+def descriptions(found):
+    return [row[3] for score, eid, row in found["results"]]
+
+
+def test_exact_before_prefix(store):
+    found = search_expenses(store, "amy", "coffee")
+    assert descriptions(found) == ["Coffee beans", "Coffeehouse snack"]
+    assert found["matches"] == 2
+    assert found["results"][0][0] > found["results"][1][0]
+
+
+def test_typo_only_when_nothing_else_matches(store):
+    # both are prefix matches, so the misspelt "Cofee" isn't tried; newest first
+    assert descriptions(search_expenses(store, "amy", "coffe")) == ["Coffeehouse snack", "Coffee beans"]
+    assert descriptions(search_expenses(store, "amy", "taxy")) == ["Taxi to airport"]
+    assert search_expenses(store, "amy", "zzzz")["results"] == []
+
+
+def test_description_before_category(store):
+    found = search_expenses(store, "amy", "food")
+    # equal scores: the newest expense first
+    assert descriptions(found) == ["Cofee with Sam", "Coffeehouse snack", "Coffee beans"]
+    store.add_expense("amy", ["2024-01-15", "300.00", "Groceries", "Food hall", "Card"])
+    found = search_expenses(store, "amy", "food")
+    assert descriptions(found)[0] == "Food hall"
+
+
+def test_undated_expenses_rank_last_among_equals(store):
+    store.add_expense("amy", ["someday", "10.00", "Food", "Coffee pods", "Cash"])
+    found = search_expenses(store, "amy", "pods coffee")
+    assert descriptions(found) == ["Coffee pods"]
+    found = search_expenses(store, "amy", "food")
+    assert descriptions(found)[-1] == "Coffee pods"
+    assert len(found["results"]) == 4
+    found = search_expenses(store, "amy", "coffee", date_from="2024-01-01")
+    assert "Coffee pods" not in descriptions(found)
+
+
+def test_other_users_rows_are_not_searched(store):
+    found = search_expenses(store, "bob", "coffee")
+    assert [row[2:4] for score, eid, row in found["results"]] == [["Food", "Coffee beans"]]
+    assert found["matches"] == 1
+    assert search_expenses(store, "carl", "coffee")["results"] == []
+
+
+def test_date_limits(store):
+    found = search_expenses(store, "amy", "food", date_from="2024-03-05", date_to="2024-04-30")
+    assert descriptions(found) == ["Cofee with Sam", "Coffeehouse snack"]
+    found = search_expenses(store, "amy", "food", date_to="2024-03-04")
+    assert descriptions(found) == ["Coffee beans"]
+
+
+def test_amount_limits(store):
+    found = search_expenses(store, "amy", "food", min_amount=7000, max_amount=12000)
+    assert sorted(descriptions(found)) == ["Coffee beans", "Coffeehouse snack"]
+    assert found["matches"] == 2
+    found = search_expenses(store, "amy", "food", max_amount=5999)
+    assert found["results"] == []
+
+
+def test_edited_and_deleted_rows_drop_out(store):
+    for key, row in list(store.month_expenses("amy", "2024-03")):
+        if row[3] == "Coffee beans":
+            store.update_expense("amy", "2024-03", key, ["2024-03-02", "120.00", "Food", "Tea leaves", "UPI"])
+        else:
+            store.delete_expense("amy", "2024-03", key)
+    # with no exact or prefix match left, the typo match is all there is
+    assert descriptions(search_expenses(store, "amy", "coffee")) == ["Cofee with Sam"]
+    assert descriptions(search_expenses(store, "amy", "tea")) == ["Tea leaves"]
+    assert descriptions(search_expenses(store, "amy", "snack")) == []
+
+
+def test_empty_query_is_refused(store):
+    with pytest.raises(ValueError):
+        search_expenses(store, "amy", "  -- ")
@@ -0,0 +1,78 @@
+"""
+SqliteStore behaves like LedgerStore where callers depend on it, and the
+two formats copy into each other.
+"""
+import pytest
+
+from personal_finance.models import Budget
+from personal_finance.sqlite_store import SqliteStore, export_csv, import_csv
+from personal_finance.store import LedgerStore, partition_name
+
+ROWS = [["2024-05-01", "250.00", "Food", "Lunch", "UPI"], ["2024-05-02", "40.00", "Travel", "Metro", "Card"]]
+
+
+def test_add_expenses_returns_ids(tmp_path):
+    db = SqliteStore(tmp_path)
+    keys = db.add_expenses("amy", "2024-05", ROWS)
+    assert len(keys) == 2
+    assert [db.get_expense("amy", "2024-05", key)[3] for key in keys] == ["Lunch", "Metro"]
+    db.close()
+
+
+def test_get_expense_checks_month(tmp_path):
+    db = SqliteStore(tmp_path)
+    key = db.add_expense("amy", ROWS[0])
+    assert db.get_expense("amy", "2024-05", key) is not None
+    assert db.get_expense("amy", "2024-06", key) is None
+    assert db.get_expense("bob", "2024-05", key) is None
+    assert db.get_expense("amy", "2024-05", "x") is None
+    db.close()
+
+
+def test_export_replaces_stale_partitions(tmp_path):
+    csv_store = LedgerStore(tmp_path)
+    csv_store.add_user("amy", "hash", "Amy", "Lee", "30", "amy@example.com")
+    csv_store.add_expenses("amy", "2024-04", [["2024-04-03", "10.00", "Food", "Tea", "Cash"]])
+    csv_store.add_expenses("amy", "2024-05", ROWS)
+    csv_store.monthly_total("amy", "2024-04")
+    assert import_csv(tmp_path)["expenses"] == 3
+
+    db = SqliteStore(tmp_path)
+    april = next(iter(db.month_expenses("amy", "2024-04")))
+    db.delete_expense("amy", "2024-04", april[0])
+    db.close()
+    export_csv(tmp_path)
+
+    fresh = LedgerStore(tmp_path)
+    assert fresh.expense_months("amy") == ["2024-05"]
+    assert not fresh.path(partition_name("amy", "2024-04")).exists()
+    assert fresh.monthly_total("amy", "2024-04") == 0
+    assert fresh.monthly_total("amy", "2024-05") == 29000
+
+
+def test_user_budgets_match(tmp_path):
+    csv_store = LedgerStore(tmp_path)
+    db = SqliteStore(tmp_path)
+    for store in (csv_store, db):
+        store.put_budget("amy", Budget("2024-05", 30000, "Food"))
+        store.put_budget("amy", Budget("2024-05", 100000))
+        store.put_budget("amy", Budget("2024", 1000000))
+        store.put_budget("bob", Budget("2024-05", 5000))
+
+    def layout(store):
+        return {period: [(b.category, b.amount) for b in found] for period, found in store.user_budgets("amy").items()}
+
+    assert layout(db) == layout(csv_store) == {"2024-05": [("", 100000), ("Food", 30000)], "2024": [("", 1000000)]}
+    db.close()
+
+
+def test_export_without_a_database_touches_nothing(tmp_path):
+    store = LedgerStore(tmp_path)
+    store.add_expenses("amy", "2024-05", ROWS)
+    (tmp_path / "password.csv").write_text("username,password\namy,x\n")
+    with pytest.raises(FileNotFoundError):
+        export_csv(tmp_path, tmp_path / "missing.db")
+    assert not (tmp_path / "missing.db").exists()
+    assert not (tmp_path / "finance.db").exists()
+    assert LedgerStore(tmp_path).expense_rows("amy", "2024-05") == ROWS
+    assert "amy" in (tmp_path / "password.csv").read_text()
@@ -0,0 +1,20 @@
+"""
+What starting the entry point imports.
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+def loaded_after(code):
+    out = subprocess.run([sys.executable, "-c", code + "; import sys; print(' '.join(sys.modules))"],
+                         env={"PYTHONPATH": str(SRC)}, capture_output=True, text=True, check=True).stdout
+    return set(out.split())
+
+
+def test_commands_load_search_and_viewer_only_when_used():
+    loaded = loaded_after("from personal_finance.cli import build_parser; build_parser()")
+    assert "personal_finance.cli" in loaded
+    assert not loaded & {"personal_finance.search", "personal_finance.viewer", "personal_finance.passwords"}